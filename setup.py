@@ -53,6 +53,11 @@ setup(
     },
     install_requires=[
     ],
+    entry_points={
+        'console_scripts': [
+            'lucidity = lucidity.cli:main'
+        ]
+    },
     tests_require=['pytest >= 2.3.5'],
     cmdclass={
         'test': PyTest
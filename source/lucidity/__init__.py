@@ -6,4 +6,6 @@ from ._version import __version__
 
 from .core import *
 from .template import Template, Resolver
-from .schema import Schema
\ No newline at end of file
+from .schema import Schema
+from .overlay import OverlaySchema
+from .cache import Cache
@@ -0,0 +1,10 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import sys
+
+from .cli import main
+
+
+sys.exit(main())
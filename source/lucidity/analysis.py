@@ -0,0 +1,448 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Static analysis of template patterns.'''
+
+import re
+import sre_parse
+import sre_constants
+
+from . import syntax
+from .error import ParseError
+from .template import _may_match_separator, _backtracking_risks
+from .corpus import Generator
+
+# Whether each placeholder expression is self contained. Expressions are
+# few compared to the pairs of templates analysed, so results are kept.
+_self_contained_cache = {}
+
+
+def mutually_exclusive(template_a, template_b):
+    '''Return whether no path can be parsed by both templates.
+
+    The check is conservative. True is only returned when it can be shown
+    from the expanded patterns that the templates cannot both match, for
+    example because they start with different literal text. False means the
+    templates may overlap.
+
+    '''
+    if template_a is template_b:
+        return False
+
+    literals_a = _literals(template_a)
+    literals_b = _literals(template_b)
+
+    # Literal text at an anchored start must agree.
+    if _anchored_start(template_a) and _anchored_start(template_b):
+        prefix_a = literals_a[0]
+        prefix_b = literals_b[0]
+        if not (prefix_a.startswith(prefix_b) or prefix_b.startswith(prefix_a)):
+            return True
+
+    # Literal text at an anchored end must agree. As '$' also matches before
+    # a trailing newline, only compare literals without newlines.
+    if _anchored_end(template_a) and _anchored_end(template_b):
+        suffix_a = literals_a[-1]
+        suffix_b = literals_b[-1]
+        if '\n' not in suffix_a and '\n' not in suffix_b:
+            if not (
+                suffix_a.endswith(suffix_b) or suffix_b.endswith(suffix_a)
+            ):
+                return True
+
+    # Paths split into segments at separators must agree segment by segment.
+    if _segments_exclusive(template_a, template_b):
+        return True
+
+    return False
+
+
+def backtracking_risks(template):
+    '''Return list of descriptions of backtracking risks in *template*.
+
+    Risks are parts of the expanded pattern that can make a failing parse
+    take time polynomial or exponential in the length of the path, such as
+    an expression able to match a separator next to another placeholder
+    matching some of the same characters.
+
+    Parsing with such a template first checks that the literal text of the
+    pattern appears in the path in order, which rejects most non matching
+    paths quickly. Paths containing the literal text can still be slow.
+
+    '''
+    return _backtracking_risks(template._tokens(template.expanded_pattern()))
+
+
+class ExclusionGraph(object):
+    '''Templates that provably cannot match the same path as each other.
+
+    Rows of the graph are computed on first use so that only templates that
+    actually match pay for the analysis. Call :meth:`build` to compute the
+    whole graph up front.
+
+    The graph reflects the expanded patterns at the time each row is
+    computed and should be discarded if templates or references change.
+
+    '''
+
+    def __init__(self, templates):
+        '''Initialise graph for *templates*.'''
+        super(ExclusionGraph, self).__init__()
+        self.templates = list(templates)
+        self._rows = {}
+
+    def exclusive(self, template):
+        '''Return set of templates that cannot match a path *template* does.'''
+        row = self._rows.get(template)
+        if row is None:
+            row = self._rows[template] = frozenset(
+                other for other in self.templates
+                if mutually_exclusive(template, other)
+            )
+
+        return row
+
+    def excludes(self, template, other):
+        '''Return whether *template* and *other* cannot match the same path.
+
+        A row already computed for either template is used in preference to
+        analysing the pair again.
+
+        '''
+        row = self._rows.get(template)
+        if row is not None:
+            return other in row
+
+        row = self._rows.get(other)
+        if row is not None:
+            return template in row
+
+        return mutually_exclusive(template, other)
+
+    def build(self):
+        '''Compute exclusions for every pair of templates.'''
+        rows = dict((template, set()) for template in self.templates)
+        for index, template in enumerate(self.templates):
+            for other in self.templates[index + 1:]:
+                if mutually_exclusive(template, other):
+                    rows[template].add(other)
+                    rows[other].add(template)
+
+        self._rows = dict(
+            (template, frozenset(row)) for template, row in rows.items()
+        )
+
+    def overlapping_pairs(self):
+        '''Return list of template pairs not shown to be exclusive.
+
+        Pairs are ordered as in :attr:`templates`.
+
+        '''
+        pairs = []
+        for index, template in enumerate(self.templates):
+            row = self.exclusive(template)
+            for other in self.templates[index + 1:]:
+                if other not in row:
+                    pairs.append((template, other))
+
+        return pairs
+
+    def ambiguous_pairs(self, samples=100, seed=0):
+        '''Return list of template pairs shown to match a common path.
+
+        For each pair not shown to be exclusive, paths are generated from
+        each template using a :py:class:`~lucidity.corpus.Generator` seeded
+        with *seed*, up to *samples* per template, until one is found that
+        both templates parse.
+
+        Return ``(template_a, template_b, path)`` for each pair where such a
+        witness *path* was found.
+
+        '''
+        generator = Generator(self.templates, seed=seed)
+        ambiguous = []
+        for template_a, template_b in self.overlapping_pairs():
+            witness = _witness(generator, template_a, template_b, samples)
+            if witness is None:
+                witness = _witness(generator, template_b, template_a, samples)
+
+            if witness is not None:
+                ambiguous.append((template_a, template_b, witness))
+
+        return ambiguous
+
+
+def ambiguous_pairs(templates, samples=100, seed=0):
+    '''Return list of pairs in *templates* shown to match a common path.
+
+    See :meth:`ExclusionGraph.ambiguous_pairs` for details.
+
+    '''
+    return ExclusionGraph(templates).ambiguous_pairs(
+        samples=samples, seed=seed
+    )
+
+
+def _witness(generator, source, target, samples):
+    '''Return path generated from *source* that *target* parses, or None.'''
+    for _ in range(samples):
+        try:
+            path = source.format(generator.data(source))
+            source.parse(path)
+            target.parse(path)
+        except (ParseError, ValueError):
+            continue
+
+        return path
+
+    return None
+
+
+def _segments_exclusive(template_a, template_b):
+    '''Return whether segments of templates show they cannot both match.
+
+    Only templates anchored at the start are compared. Patterns are split
+    into segments at literal separators, with comparison stopping at the
+    first placeholder whose expression could match a separator or depends on
+    surrounding text.
+
+    '''
+    if not (_anchored_start(template_a) and _anchored_start(template_b)):
+        return False
+
+    segments_a, bounded_a = _segments(template_a)
+    segments_b, bounded_b = _segments(template_b)
+
+    # Compare number of segments a matching path must have.
+    minimum_a = len(segments_a)
+    minimum_b = len(segments_b)
+    if bounded_a and minimum_a < minimum_b:
+        return True
+    if bounded_b and minimum_b < minimum_a:
+        return True
+
+    for segment_a, segment_b in zip(segments_a, segments_b):
+        if _segment_exclusive(segment_a, segment_b):
+            return True
+
+    return False
+
+
+def _segments(template):
+    '''Return ``(segments, bounded)`` for *template*.
+
+    Each segment is a tuple of ``(tokens, end)`` where *tokens* is a tuple of
+    ``(literal, expression)`` pairs with exactly one of the two set. *end*
+    describes what follows the segment: ``'separator'``, ``'end'`` for the
+    end of the path (optionally followed by a newline) or None if unknown.
+
+    *bounded* is True if a matching path must have exactly as many segments
+    as returned.
+
+    The result is compiled once per expanded pattern along with the other
+    artefacts of *template*.
+
+    '''
+    return template._compile(
+        'segments', lambda pattern: _construct_segments(template, pattern)
+    )
+
+
+def _construct_segments(template, expanded_pattern):
+    '''Return ``(segments, bounded)`` for *expanded_pattern* of *template*.'''
+    anchored_end = _anchored_end(template)
+    segments = [[]]
+    for literal, placeholder in syntax.parse(expanded_pattern).components:
+        parts = literal.split('/')
+        if parts[0]:
+            segments[-1].append((parts[0], None))
+        for part in parts[1:]:
+            segments.append([])
+            if part:
+                segments[-1].append((part, None))
+
+        if placeholder is None:
+            continue
+
+        expression = placeholder.regular_expression(
+            template._default_placeholder_expression
+        )
+
+        if not _self_contained(expression):
+            return tuple(
+                [(tuple(tokens), 'separator') for tokens in segments[:-1]] +
+                [(tuple(segments[-1]), None)]
+            ), False
+
+        segments[-1].append((None, expression))
+
+    result = [(tuple(tokens), 'separator') for tokens in segments[:-1]]
+    result.append((tuple(segments[-1]), 'end' if anchored_end else None))
+    return tuple(result), anchored_end
+
+
+def _segment_exclusive(segment_a, segment_b):
+    '''Return whether no path segment can match both segments.'''
+    tokens_a, end_a = segment_a
+    tokens_b, end_b = segment_b
+
+    for (tokens, end), (other_tokens, other_end) in (
+        (segment_a, segment_b), (segment_b, segment_a)
+    ):
+        text = _literal_text(tokens)
+        if text is None or end is None:
+            continue
+
+        # Segment is fixed text so test it against other segment directly.
+        candidates = [text]
+        if end == 'end':
+            candidates.append(text + '\n')
+
+        regex = _segment_regex(other_tokens, other_end)
+        if regex is None:
+            return False
+
+        return not any(regex.match(candidate) for candidate in candidates)
+
+    prefix_a = _literal_prefix(tokens_a)
+    prefix_b = _literal_prefix(tokens_b)
+    if not (prefix_a.startswith(prefix_b) or prefix_b.startswith(prefix_a)):
+        return True
+
+    if end_a == 'separator' and end_b == 'separator':
+        suffix_a = _literal_prefix(reversed(tokens_a))
+        suffix_b = _literal_prefix(reversed(tokens_b))
+        if not (suffix_a.endswith(suffix_b) or suffix_b.endswith(suffix_a)):
+            return True
+
+    return False
+
+
+def _literal_text(tokens):
+    '''Return text of *tokens* if all literal, otherwise None.'''
+    if any(literal is None for literal, _ in tokens):
+        return None
+
+    return ''.join(literal for literal, _ in tokens)
+
+
+def _literal_prefix(tokens):
+    '''Return literal text of *tokens* before the first placeholder.'''
+    prefix = []
+    for literal, _ in tokens:
+        if literal is None:
+            break
+        prefix.append(literal)
+
+    return ''.join(prefix)
+
+
+def _segment_regex(tokens, end):
+    '''Return compiled regex matching a path segment for *tokens*.
+
+    Return None if the expressions cannot be combined.
+
+    '''
+    expression = ''.join(
+        re.escape(literal) if literal is not None
+        else '(?:{0})'.format(placeholder)
+        for literal, placeholder in tokens
+    )
+    if end == 'separator':
+        expression += '\\Z'
+    elif end == 'end':
+        expression += '\\n?\\Z'
+
+    try:
+        return re.compile(expression)
+    except re.error:
+        return None
+
+
+def _self_contained(expression):
+    '''Return whether *expression* is independent of surrounding text.
+
+    An expression is self contained when it cannot match a separator and
+    has no anchors, lookarounds or group references.
+
+    '''
+    contained = _self_contained_cache.get(expression)
+    if contained is None:
+        contained = _self_contained_cache[expression] = (
+            _construct_self_contained(expression)
+        )
+
+    return contained
+
+
+def _construct_self_contained(expression):
+    '''Return whether *expression* is independent of surrounding text.'''
+    if _may_match_separator(expression):
+        return False
+
+    try:
+        parsed = sre_parse.parse(expression)
+    except (sre_constants.error, TypeError):
+        return False
+
+    return _subpattern_self_contained(parsed)
+
+
+def _subpattern_self_contained(subpattern):
+    '''Return whether parsed *subpattern* is independent of surroundings.'''
+    for opcode, argument in subpattern:
+        opcode = str(opcode).upper()
+
+        if opcode in ('AT', 'ASSERT', 'ASSERT_NOT', 'GROUPREF'):
+            return False
+
+        if opcode in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT',
+                      'SUBPATTERN'):
+            if not _subpattern_self_contained(argument[-1]):
+                return False
+
+        elif opcode == 'BRANCH':
+            for branch in argument[1]:
+                if not _subpattern_self_contained(branch):
+                    return False
+
+    return True
+
+
+def _literals(template):
+    '''Return literal text of *template* split around placeholders.
+
+    The first item is the text before the first placeholder and the last
+    item the text after the last placeholder.
+
+    '''
+    return template._compile('literals', _construct_literals)
+
+
+def _construct_literals(expanded_pattern):
+    '''Return literal text of *expanded_pattern* split around placeholders.'''
+    literals = []
+    trailing = ''
+    for literal, placeholder in syntax.parse(expanded_pattern).components:
+        if placeholder is None:
+            trailing = literal
+        else:
+            literals.append(literal)
+
+    literals.append(trailing)
+    return tuple(literals)
+
+
+def _anchored_start(template):
+    '''Return whether *template* is anchored at the start.'''
+    return template.anchor is not None and bool(
+        template.anchor & template.ANCHOR_START
+    )
+
+
+def _anchored_end(template):
+    '''Return whether *template* is anchored at the end.'''
+    return template.anchor is not None and bool(
+        template.anchor & template.ANCHOR_END
+    )
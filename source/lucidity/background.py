@@ -0,0 +1,335 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Background operations for event driven applications.
+
+Discovery, schema loading and large parse jobs can take long enough to stall
+an event loop. The functions here run them in a background thread and return
+a :class:`Task` or :class:`ParseJob` that the loop can poll, attach a
+callback to or cancel, without blocking.
+
+'''
+
+import sys
+import Queue
+import threading
+from itertools import islice
+
+from .core import discover_templates as _discover_templates, parse_iter
+from .batch import BatchParser
+from .schema import Schema
+
+
+class Cancelled(Exception):
+    '''Raise when the result of a cancelled operation is requested.'''
+
+
+class Task(object):
+    '''Result of a function running in a background thread.
+
+    The interface follows that of :py:class:`concurrent.futures.Future` so
+    that tasks can be adapted to event loops that integrate with futures.
+
+    '''
+
+    def __init__(self, function, *args, **kwargs):
+        '''Start calling *function* with *args* and *kwargs*.'''
+        super(Task, self).__init__()
+        self._function = function
+        self._args = args
+        self._kwargs = kwargs
+
+        self._lock = threading.Lock()
+        self._finished = threading.Event()
+        self._callbacks = []
+        self._cancelled = False
+        self._result = None
+        self._exception_info = None
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        '''Call function and store outcome.'''
+        try:
+            result = self._function(*self._args, **self._kwargs)
+        except Exception:
+            self._finish(None, sys.exc_info())
+        else:
+            self._finish(result, None)
+
+    def _finish(self, result, exception_info):
+        '''Store outcome and call callbacks unless already cancelled.'''
+        with self._lock:
+            if self._finished.is_set():
+                return
+
+            self._result = result
+            self._exception_info = exception_info
+            self._finished.set()
+            callbacks = self._callbacks
+            self._callbacks = []
+
+        for callback in callbacks:
+            callback(self)
+
+    def cancel(self):
+        '''Cancel task and return whether it was cancelled.
+
+        A running function cannot be interrupted, but its outcome is
+        discarded. A task that has already finished cannot be cancelled.
+
+        '''
+        with self._lock:
+            if self._finished.is_set():
+                return self._cancelled
+
+            self._cancelled = True
+
+        self._finish(None, None)
+        return True
+
+    def cancelled(self):
+        '''Return whether task was cancelled.'''
+        return self._cancelled
+
+    def running(self):
+        '''Return whether task is still running.'''
+        return not self._finished.is_set()
+
+    def done(self):
+        '''Return whether task finished or was cancelled.'''
+        return self._finished.is_set()
+
+    def result(self, timeout=None):
+        '''Return result, waiting up to *timeout* seconds for it.
+
+        Raise :exc:`Cancelled` if the task was cancelled, any exception
+        raised by the function, or :exc:`RuntimeError` if the result is not
+        available within *timeout*.
+
+        '''
+        if not self._finished.wait(timeout):
+            raise RuntimeError('Task did not finish within timeout.')
+
+        if self._cancelled:
+            raise Cancelled('Task was cancelled.')
+
+        if self._exception_info is not None:
+            exception_type, exception, traceback = self._exception_info
+            raise exception_type, exception, traceback  #@IgnorePep8
+
+        return self._result
+
+    def exception(self, timeout=None):
+        '''Return exception raised by the function, or None.
+
+        Raise :exc:`Cancelled` if the task was cancelled or
+        :exc:`RuntimeError` if it does not finish within *timeout* seconds.
+
+        '''
+        if not self._finished.wait(timeout):
+            raise RuntimeError('Task did not finish within timeout.')
+
+        if self._cancelled:
+            raise Cancelled('Task was cancelled.')
+
+        if self._exception_info is not None:
+            return self._exception_info[1]
+
+        return None
+
+    def add_done_callback(self, callback):
+        '''Call *callback* with the task once it is done.
+
+        *callback* is called immediately if the task is already done, and
+        otherwise from the background thread. Event loops should hand over
+        to their own thread from the callback.
+
+        '''
+        with self._lock:
+            if not self._finished.is_set():
+                self._callbacks.append(callback)
+                return
+
+        callback(self)
+
+
+class ParseJob(object):
+    '''Parse many paths in a background thread.
+
+    Results are produced in batches and held in a bounded queue, so the
+    producer pauses if results are not consumed and memory use stays
+    bounded. Results can be taken without blocking using :meth:`poll`, for
+    instance from a timer in a user interface, or by iterating the job.
+
+    '''
+
+    def __init__(self, paths, templates, batch_size=1000, all_matches=False,
+                 max_batches=16):
+        '''Start parsing *paths* against *templates*.
+
+        If *all_matches* is False then results are ``(path, data, template)``
+        for the first template matching each path, with *data* and *template*
+        None if no template matched. Otherwise results are
+        ``(path, matches)`` where *matches* is a list of ``(data, template)``.
+
+        *batch_size* is the number of paths parsed between checks for
+        cancellation, and *max_batches* the number of batches held before
+        the producer pauses.
+
+        '''
+        super(ParseJob, self).__init__()
+        self.batch_size = batch_size
+        self.all_matches = all_matches
+
+        self._queue = Queue.Queue(max_batches)
+        self._cancel = threading.Event()
+        self._exhausted = False
+        self._task = Task(self._produce, iter(paths), list(templates))
+
+    def _produce(self, paths, templates):
+        '''Put batches of results parsed from *paths* onto the queue.'''
+        parser = None
+        if not self.all_matches:
+            parser = BatchParser(templates)
+
+        try:
+            while not self._cancel.is_set():
+                batch = list(islice(paths, self.batch_size))
+                if not batch:
+                    break
+
+                results = []
+                for path in batch:
+                    if parser is None:
+                        results.append(
+                            (path, list(parse_iter(path, templates)))
+                        )
+                        continue
+
+                    for data, template in parser.parse_iter(path):
+                        results.append((path, data, template))
+                        break
+                    else:
+                        results.append((path, None, None))
+
+                if not self._put(results):
+                    break
+
+        finally:
+            self._put(None)
+
+    def _put(self, item):
+        '''Put *item* on queue and return whether it was put.
+
+        Give up if the job is cancelled while waiting for space.
+
+        '''
+        while True:
+            if self._cancel.is_set() and item is not None:
+                return False
+
+            try:
+                self._queue.put(item, timeout=0.05)
+            except Queue.Full:
+                if item is None and self._cancel.is_set():
+                    return False
+
+                continue
+
+            return True
+
+    def __iter__(self):
+        '''Yield results, waiting for each batch to be parsed.
+
+        Raise any exception that stopped parsing.
+
+        '''
+        while True:
+            batch = self._get(True)
+            if batch is None:
+                break
+
+            for result in batch:
+                yield result
+
+    def poll(self):
+        '''Return list of results parsed so far and not yet taken.
+
+        Never blocks. Raise any exception that stopped parsing.
+
+        '''
+        results = []
+        while True:
+            batch = self._get(False)
+            if not batch:
+                break
+
+            results.extend(batch)
+
+        return results
+
+    def _get(self, block):
+        '''Return next batch from queue, or None when none available.'''
+        if self._exhausted:
+            return None
+
+        while True:
+            try:
+                batch = self._queue.get(block, 0.05)
+            except Queue.Empty:
+                if not block or self._cancel.is_set():
+                    return None
+
+                continue
+
+            break
+
+        if batch is None:
+            self._exhausted = True
+            if not self._cancel.is_set():
+                self._task.result()
+
+        return batch
+
+    def cancel(self):
+        '''Stop parsing after the current batch.'''
+        self._cancel.set()
+        return True
+
+    def cancelled(self):
+        '''Return whether job was cancelled.'''
+        return self._cancel.is_set()
+
+    def done(self):
+        '''Return whether all results have been produced.'''
+        return self._task.done()
+
+    def add_done_callback(self, callback):
+        '''Call *callback* with the job once parsing has stopped.'''
+        self._task.add_done_callback(lambda task: callback(self))
+
+
+def discover_templates(paths=None, recursive=True):
+    '''Return :class:`Task` discovering templates in the background.
+
+    See :py:func:`~lucidity.discover_templates` for details of the
+    arguments.
+
+    '''
+    return Task(_discover_templates, paths, recursive=recursive)
+
+
+def load_schema(filepath):
+    '''Return :class:`Task` loading a YAML schema at *filepath*.'''
+    return Task(Schema.from_yaml, filepath)
+
+
+def parse_many(paths, templates, batch_size=1000, all_matches=False):
+    '''Return :class:`ParseJob` parsing *paths* against *templates*.'''
+    return ParseJob(
+        paths, templates, batch_size=batch_size, all_matches=all_matches
+    )
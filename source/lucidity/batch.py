@@ -0,0 +1,177 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Batch parsing of many related paths.'''
+
+from collections import OrderedDict
+
+from .error import ParseError
+
+
+class BatchParser(object):
+    '''Parse many paths reusing work for shared directory prefixes.
+
+    Listings of paths are typically sorted so consecutive paths share the
+    same directory. Where a template qualifies, its pattern is split at the
+    last separator and the directory part is matched once per distinct
+    directory prefix. The result, either the placeholders bound or that the
+    template is not viable, is memoized so that sibling paths only need the
+    remaining tail of the pattern matched.
+
+    Templates that do not qualify, such as those not anchored at the start or
+    with placeholder expressions able to match a separator, are matched in
+    full. Results are identical to :py:meth:`~lucidity.template.Template.parse`
+    in either case.
+
+    Templates are compiled when the parser is created so changes to
+    referenced templates after that point are not reflected.
+
+    '''
+
+    def __init__(self, templates, size=64):
+        '''Initialise with *templates* in the order they should be tried.
+
+        *size* is the number of directory prefixes memoized per template.
+
+        '''
+        super(BatchParser, self).__init__()
+        self.templates = list(templates)
+        self.size = size
+
+        self._plans = []
+        for template in self.templates:
+            split = template._split_regular_expressions()
+            if split is None:
+                self._plans.append(
+                    _Plan(template, template._regular_expression())
+                )
+            else:
+                self._plans.append(_Plan(template, None, *split))
+
+    def parse(self, path):
+        '''Return ``(data, template)`` for first template matching *path*.
+
+        Raise :py:class:`~lucidity.error.ParseError` if *path* is not
+        parsable by any of the templates.
+
+        '''
+        for result in self.parse_iter(path):
+            return result
+
+        raise ParseError(
+            'Path {0!r} did not match any of the supplied template patterns.'
+            .format(path)
+        )
+
+    def parse_iter(self, path):
+        '''Yield ``(data, template)`` for each template matching *path*.'''
+        separators = []
+        for plan in self._plans:
+            template = plan.template
+
+            if plan.regex is not None:
+                match = plan.regex.search(path)
+                if not match:
+                    continue
+
+                groups = match.groupdict()
+
+            else:
+                # Locate separator that the pattern split at.
+                while len(separators) < plan.count:
+                    start = separators[-1] + 1 if separators else 0
+                    index = path.find('/', start)
+                    if index == -1:
+                        break
+
+                    separators.append(index)
+
+                if len(separators) < plan.count:
+                    continue
+
+                cut = separators[plan.count - 1]
+                directory_groups = plan.directory_groups(
+                    path[:cut], self.size
+                )
+                if directory_groups is None:
+                    continue
+
+                match = plan.tail.match(path, cut + 1)
+                if not match:
+                    continue
+
+                groups = dict(directory_groups)
+                groups.update(match.groupdict())
+
+            try:
+                data = template._extract(groups)
+            except ParseError:
+                continue
+
+            yield (data, template)
+
+
+class _Plan(object):
+    '''Compiled matching state for a template in a :class:`BatchParser`.'''
+
+    __slots__ = (
+        'template', 'regex', 'count', 'directory', 'tail', 'memo', 'last'
+    )
+
+    def __init__(self, template, regex, count=None, directory=None,
+                 tail=None):
+        '''Initialise plan for *template*.
+
+        Either *regex* should be the full compiled expression, or *count*,
+        *directory* and *tail* the split expressions.
+
+        '''
+        self.template = template
+        self.regex = regex
+        self.count = count
+        self.directory = directory
+        self.tail = tail
+        self.memo = OrderedDict()
+        self.last = (None, None)
+
+    def directory_groups(self, prefix, size):
+        '''Return groups matched by directory *prefix* or None if not viable.
+
+        Results are memoized for up to *size* prefixes.
+
+        '''
+        last_prefix, groups = self.last
+        if prefix == last_prefix:
+            return groups
+
+        try:
+            groups = self.memo.pop(prefix)
+        except KeyError:
+            match = self.directory.match(prefix)
+            groups = match.groupdict() if match else None
+
+            if len(self.memo) >= size:
+                self.memo.popitem(last=False)
+
+        self.memo[prefix] = groups
+        self.last = (prefix, groups)
+        return groups
+
+
+def parse_many(paths, templates, size=64):
+    '''Parse *paths* against *templates* and yield first match for each.
+
+    Yield ``(path, data, template)`` for each path in order, with *data* and
+    *template* set to None if no template matched.
+
+    See :class:`BatchParser` for details.
+
+    '''
+    parser = BatchParser(templates, size=size)
+    for path in paths:
+        for data, template in parser.parse_iter(path):
+            yield (path, data, template)
+            break
+        else:
+            yield (path, None, None)
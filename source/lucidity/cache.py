@@ -0,0 +1,179 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Memoization of parse and format results.'''
+
+import time
+from collections import OrderedDict
+
+
+class Cache(object):
+    '''Bounded least recently used cache with optional expiry.
+
+    Counters for :attr:`hits`, :attr:`misses` and :attr:`evictions` are
+    maintained for monitoring effectiveness.
+
+    '''
+
+    def __init__(self, maxsize=1024, ttl=None, timer=time.time):
+        '''Initialise cache holding up to *maxsize* entries.
+
+        If *ttl* is set then entries expire that many seconds after being
+        stored, as measured by *timer*.
+
+        '''
+        super(Cache, self).__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries = OrderedDict()
+
+    def __repr__(self):
+        '''Return unambiguous representation of cache.'''
+        return (
+            '{0}(maxsize={1!r}, ttl={2!r}, size={3}, hits={4}, misses={5}, '
+            'evictions={6})'.format(
+                self.__class__.__name__, self.maxsize, self.ttl, len(self),
+                self.hits, self.misses, self.evictions
+            )
+        )
+
+    def __len__(self):
+        '''Return number of stored entries, including any expired.'''
+        return len(self._entries)
+
+    def info(self):
+        '''Return dictionary of counters and size.'''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self),
+            'maxsize': self.maxsize
+        }
+
+    def clear(self, prefix=None):
+        '''Remove all entries, leaving counters unchanged.
+
+        If *prefix* is set then only entries with tuple keys starting with
+        the items of *prefix* are removed, so that users sharing the cache
+        can each clear their own entries.
+
+        '''
+        if prefix is None:
+            self._entries.clear()
+            return
+
+        size = len(prefix)
+        for key in [
+            key for key in self._entries
+            if isinstance(key, tuple) and key[:size] == prefix
+        ]:
+            del self._entries[key]
+
+    def get(self, key):
+        '''Return ``(found, value)`` for *key*.
+
+        A found entry is marked as most recently used.
+
+        '''
+        try:
+            expiry, value = self._entries.pop(key)
+        except KeyError:
+            self.misses += 1
+            return False, None
+
+        if expiry is not None and self.timer() >= expiry:
+            self.misses += 1
+            return False, None
+
+        self._entries[key] = (expiry, value)
+        self.hits += 1
+        return True, value
+
+    def set(self, key, value):
+        '''Store *value* for *key* evicting least recently used entries.'''
+        expiry = None
+        if self.ttl is not None:
+            expiry = self.timer() + self.ttl
+
+        self._entries.pop(key, None)
+        self._entries[key] = (expiry, value)
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def call(self, key, function, errors=()):
+        '''Return result of *function* memoized under *key*.
+
+        If *key* is not cached then *function* is called with no arguments
+        and the result stored. Exceptions of the types in *errors* are also
+        stored and raised again on later calls for *key*.
+
+        A copy of cached dictionaries, lists and tuples is returned so that
+        callers cannot modify cached results.
+
+        If *key* is not hashable then *function* is called without caching.
+
+        '''
+        try:
+            found, value = self.get(key)
+        except TypeError:
+            return function()
+
+        if not found:
+            try:
+                value = (True, function())
+            except errors as exception:
+                value = (False, (type(exception), exception.args))
+
+            self.set(key, value)
+
+        success, result = value
+        if not success:
+            exception_type, arguments = result
+            raise exception_type(*arguments)
+
+        return _copy(result)
+
+
+def canonical(data):
+    '''Return hashable canonical form of nested *data*.
+
+    Dictionaries are converted to sorted tuples of items and lists to tuples
+    so that equal data produces equal keys regardless of ordering.
+
+    Raise :exc:`TypeError` if *data* contains unhashable values.
+
+    '''
+    if isinstance(data, dict):
+        return (dict, tuple(sorted(
+            (key, canonical(value)) for key, value in data.items()
+        )))
+
+    if isinstance(data, (list, tuple)):
+        return (type(data), tuple(canonical(value) for value in data))
+
+    hash(data)
+    return data
+
+
+def _copy(value):
+    '''Return copy of nested containers in *value*.'''
+    if isinstance(value, dict):
+        return dict((key, _copy(item)) for key, item in value.items())
+
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+
+    if isinstance(value, tuple):
+        return tuple(_copy(item) for item in value)
+
+    return value
@@ -0,0 +1,418 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Command line interface for streaming paths through a schema.
+
+Records are read from files or standard input and results written to
+standard output as JSON Lines, one object per line. The schema is loaded
+once, from a YAML file or by discovering mount points, and reused for all
+records.
+
+'''
+
+import sys
+import json
+import argparse
+import multiprocessing
+from itertools import islice
+
+from .core import discover_templates
+from .schema import Schema
+from . import error
+from . import daemon
+
+# Loaded state used to process records, set up once per process.
+_state = {}
+
+
+def main(arguments=None):
+    '''Run command line interface with *arguments* and return exit code.
+
+    *arguments* defaults to the arguments the process was started with.
+
+    '''
+    options = _parser().parse_args(arguments)
+
+    if options.command == 'serve':
+        return _serve(options)
+
+    separator = '\n'
+    if options.null:
+        separator = '\0'
+
+    try:
+        records = _read(options.inputs or ['-'], separator)
+        chunks = _chunks(
+            (record for record in records if record), options.chunk_size
+        )
+
+        # Load in this process first so that errors are reported once and
+        # forked workers inherit the loaded schema.
+        _initialise(options)
+
+        if options.workers > 1:
+            pool = multiprocessing.Pool(
+                options.workers, initializer=_initialise_worker,
+                initargs=(options,)
+            )
+            try:
+                results = pool.imap(_process, chunks)
+                _write(results)
+            finally:
+                pool.terminate()
+
+        else:
+            _write(_process(chunk) for chunk in chunks)
+
+    except (IOError, ValueError, error.ParseError, error.FormatError,
+            error.ResolveError) as exception:
+        sys.stderr.write('lucidity: {0}\n'.format(exception))
+        return 1
+
+    return 0
+
+
+def _parser():
+    '''Return argument parser.'''
+    parser = argparse.ArgumentParser(
+        prog='lucidity', description=__doc__.splitlines()[0]
+    )
+
+    loading = argparse.ArgumentParser(add_help=False)
+    loading.add_argument(
+        '-s', '--schema',
+        help='YAML schema to load. If neither this nor --discover is given '
+             'then mount points are discovered from LUCIDITY_TEMPLATE_PATH.'
+    )
+    loading.add_argument(
+        '-d', '--discover', action='append', default=[],
+        help='Discover mount points under this path. Can be given multiple '
+             'times.'
+    )
+
+    common = argparse.ArgumentParser(add_help=False, parents=[loading])
+    common.add_argument(
+        'inputs', nargs='*', metavar='input',
+        help='File to read records from, or - for standard input (the '
+             'default).'
+    )
+    common.add_argument(
+        '-a', '--all', action='store_true',
+        help='Output all matches for each record instead of the first.'
+    )
+    common.add_argument(
+        '-m', '--misses', action='store_true',
+        help='Output records with no match with null results.'
+    )
+    common.add_argument(
+        '-0', '--null', action='store_true',
+        help='Records are separated by NUL characters instead of newlines.'
+    )
+    common.add_argument(
+        '-j', '--workers', type=int, default=1,
+        help='Number of worker processes to distribute records across.'
+    )
+    common.add_argument(
+        '--chunk-size', type=int, default=1000,
+        help='Number of records sent to a worker at a time.'
+    )
+
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser(
+        'parse', parents=[common],
+        help='Parse paths and output data and matching template.'
+    )
+
+    format_command = commands.add_parser(
+        'format', parents=[common],
+        help='Format JSON data records into paths.'
+    )
+    format_command.add_argument(
+        '-t', '--template',
+        help='Format with the named template only.'
+    )
+
+    remap_command = commands.add_parser(
+        'remap', parents=[common],
+        help='Parse paths and format them with the same named template in '
+             'another schema.'
+    )
+    remap_command.add_argument(
+        '--target', required=True,
+        help='YAML schema to format paths with.'
+    )
+
+    serve_command = commands.add_parser(
+        'serve', parents=[loading],
+        help='Serve the schema to clients over a Unix domain socket.'
+    )
+    serve_command.add_argument(
+        'socket', help='Path of socket to listen on.'
+    )
+    serve_command.add_argument(
+        '--name', default=daemon.DEFAULT_SCHEMA,
+        help='Name to serve the schema under.'
+    )
+
+    return parser
+
+
+def _serve(options):
+    '''Serve schema described by *options* until interrupted.'''
+    try:
+        server = daemon.Server(options.socket, {options.name: _load(options)})
+    except (IOError, OSError, ValueError) as exception:
+        sys.stderr.write('lucidity: {0}\n'.format(exception))
+        return 1
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+    return 0
+
+
+def _load(options):
+    '''Return schema described by *options*.'''
+    if options.schema is not None:
+        schema = Schema.from_yaml(options.schema)
+    else:
+        schema = Schema()
+
+    if options.discover or options.schema is None:
+        for template in discover_templates(options.discover or None):
+            schema.add_template(template)
+
+    return schema
+
+
+def _initialise(options):
+    '''Load state for processing records according to *options*.'''
+    _state.clear()
+    _state['options'] = options
+    _state['schema'] = _load(options)
+
+    if options.command == 'remap':
+        _state['target'] = Schema.from_yaml(options.target)
+
+    if options.command == 'format' and options.template is not None:
+        if options.template not in _state['schema']:
+            raise ValueError(
+                'Template {0!r} not found in schema.'.format(options.template)
+            )
+
+
+def _initialise_worker(options):
+    '''Load state in worker process unless inherited.'''
+    if not _state:
+        _initialise(options)
+
+
+def _process(records):
+    '''Return list of output lines for *records*.'''
+    options = _state['options']
+    process = {
+        'parse': _parse,
+        'format': _format,
+        'remap': _remap
+    }[options.command]
+
+    lines = []
+    for record in records:
+        results = process(record)
+        if not results and options.misses:
+            results = [_miss(options.command, record)]
+
+        lines.extend(_dumps(result) for result in results)
+
+    return lines
+
+
+def _parse(path):
+    '''Return list of results for parsing *path*.'''
+    schema = _state['schema']
+    if _state['options'].all:
+        matches = schema.parse_all(path)
+    else:
+        try:
+            matches = [schema.parse(path)]
+        except error.ParseError:
+            matches = []
+
+    return [
+        {'path': path, 'template': template.name, 'data': data}
+        for data, template in matches
+    ]
+
+
+def _format(record):
+    '''Return list of results for formatting JSON data *record*.
+
+    A record that is not a JSON object, or holds values that no template can
+    format, such as numbers, is reported with an ``error`` and the original
+    ``record`` so that remaining records are still processed.
+
+    '''
+    options = _state['options']
+    schema = _state['schema']
+
+    try:
+        data = json.loads(record)
+    except ValueError as exception:
+        return [_invalid(record, 'Invalid JSON: {0}'.format(exception))]
+
+    if not isinstance(data, dict):
+        return [_invalid(record, 'Expected a JSON object.')]
+
+    if options.template is not None:
+        templates = [schema.get_template(options.template)]
+    else:
+        templates = schema.templates
+
+    results = []
+    type_error = None
+    for template in templates:
+        try:
+            path = template.format(data)
+        except error.FormatError:
+            continue
+        except TypeError as exception:
+            # Values that are not strings, such as JSON numbers, cannot be
+            # formatted by this template.
+            type_error = exception
+            continue
+
+        results.append({'data': data, 'template': template.name, 'path': path})
+        if not options.all:
+            break
+
+    if not results and type_error is not None:
+        return [_invalid(
+            record, 'Could not format data: {0}'.format(type_error)
+        )]
+
+    return results
+
+
+def _remap(path):
+    '''Return list of results for remapping *path* to the target schema.'''
+    target = _state['target']
+
+    results = []
+    for match in _parse(path):
+        other = target.get(match['template'])
+        if other is None:
+            continue
+
+        try:
+            match['target'] = other.format(match['data'])
+        except error.FormatError:
+            continue
+
+        results.append(match)
+
+    return results
+
+
+def _invalid(record, message):
+    '''Return result reporting that *record* could not be read.'''
+    return {
+        'data': None, 'template': None, 'path': None, 'record': record,
+        'error': message
+    }
+
+
+def _miss(command, record):
+    '''Return result reporting that *record* was not matched.'''
+    if command == 'format':
+        return {'data': json.loads(record), 'template': None, 'path': None}
+
+    result = {'path': record, 'template': None, 'data': None}
+    if command == 'remap':
+        result['target'] = None
+
+    return result
+
+
+def _read(inputs, separator):
+    '''Yield records separated by *separator* from *inputs*.'''
+    for name in inputs:
+        if name == '-':
+            stream = sys.stdin
+        else:
+            stream = open(name, 'rb')
+
+        try:
+            if separator == '\n':
+                for line in stream:
+                    yield line.rstrip('\n')
+
+            else:
+                remainder = ''
+                while True:
+                    block = stream.read(65536)
+                    if not block:
+                        break
+
+                    records = (remainder + block).split(separator)
+                    remainder = records.pop()
+                    for record in records:
+                        yield record
+
+                if remainder:
+                    yield remainder
+
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+
+def _chunks(records, size):
+    '''Yield lists of up to *size* consecutive *records*.'''
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            break
+
+        yield chunk
+
+
+def _write(results):
+    '''Write each list of lines in *results* to standard output.'''
+    for lines in results:
+        if lines:
+            sys.stdout.write('\n'.join(lines) + '\n')
+
+    sys.stdout.flush()
+
+
+def _dumps(result):
+    '''Return *result* as a line of JSON.
+
+    Byte strings that are not valid UTF-8, such as raw path names, are
+    decoded replacing invalid bytes.
+
+    '''
+    try:
+        return json.dumps(result, sort_keys=True)
+    except UnicodeDecodeError:
+        return json.dumps(_decode(result), sort_keys=True)
+
+
+def _decode(value):
+    '''Return *value* with byte strings decoded as UTF-8 leniently.'''
+    if isinstance(value, str):
+        return value.decode('utf-8', 'replace')
+
+    if isinstance(value, dict):
+        return dict(
+            (_decode(key), _decode(item)) for key, item in value.items()
+        )
+
+    return value
+
@@ -0,0 +1,193 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Column oriented batch parsing.'''
+
+from itertools import islice
+
+from .error import ParseError
+
+
+class Columns(object):
+    '''Column oriented results of parsing many paths.
+
+    Each column holds one entry per parsed path, in input order.
+
+    '''
+
+    def __init__(self, templates, template, miss, columns):
+        '''Initialise with parse results.
+
+        *templates* should be the list of templates that paths were parsed
+        against.
+
+        *template* should be a column of indices into *templates* for the
+        template that matched each path, or -1 where no template matched.
+
+        *miss* should be a column of booleans that are True where no template
+        matched.
+
+        *columns* should be a mapping of placeholder key, using dot notation
+        for nested placeholders, to column of extracted values. Values are
+        None where the matching template does not contain the placeholder or
+        no template matched.
+
+        '''
+        super(Columns, self).__init__()
+        self.templates = templates
+        self.template = template
+        self.miss = miss
+        self.columns = columns
+
+    def __repr__(self):
+        '''Return unambiguous representation of columns.'''
+        return '{0}(rows={1}, keys={2!r})'.format(
+            self.__class__.__name__, len(self), sorted(self.columns)
+        )
+
+    def __len__(self):
+        '''Return number of parsed paths.'''
+        return len(self.miss)
+
+    def __getitem__(self, key):
+        '''Return column for placeholder *key*.'''
+        return self.columns[key]
+
+    def keys(self):
+        '''Return placeholder keys with a column.'''
+        return sorted(self.columns)
+
+
+def parse_columns(paths, templates, arrays=None):
+    '''Parse *paths* against *templates* and return :class:`Columns`.
+
+    *paths* should be an iterable of strings to parse.
+
+    *templates* should be a list of :py:class:`~lucidity.template.Template`
+    instances in the order that they should be tried. The first successful
+    parse is recorded for each path.
+
+    If *arrays* is True then columns are NumPy arrays, and if False they are
+    lists. The default uses NumPy when it is available.
+
+    '''
+    templates = list(templates)
+    chunks = list(parse_columns_iter(paths, templates, None, arrays=arrays))
+    if chunks:
+        return chunks[0]
+
+    return _build(templates, _keys(templates), [], [], {}, arrays)
+
+
+def parse_columns_iter(paths, templates, chunk_size=100000, arrays=None):
+    '''Parse *paths* against *templates* and yield :class:`Columns` chunks.
+
+    Each chunk holds results for up to *chunk_size* consecutive paths so
+    that arbitrarily large inputs can be processed with bounded memory. If
+    *chunk_size* is None then all paths are returned in a single chunk.
+
+    See :func:`parse_columns` for details of the other arguments.
+
+    '''
+    templates = list(templates)
+    keys = _keys(templates)
+    paths = iter(paths)
+
+    while True:
+        chunk = list(islice(paths, chunk_size))
+        if not chunk:
+            break
+
+        # Resolve compiled expressions once per chunk.
+        candidates = [
+            (index, template, template._regular_expression())
+            for index, template in enumerate(templates)
+        ]
+
+        template_column = []
+        miss_column = []
+        columns = dict((key, []) for key in keys)
+
+        for path in chunk:
+            values = None
+            for index, template, regex in candidates:
+                match = regex.search(path)
+                if not match:
+                    continue
+
+                try:
+                    values = template._extract_values(match.groupdict())
+                except ParseError:
+                    continue
+
+                break
+
+            if values is None:
+                template_column.append(-1)
+                miss_column.append(True)
+                for column in columns.values():
+                    column.append(None)
+
+            else:
+                template_column.append(index)
+                miss_column.append(False)
+                for key, column in columns.items():
+                    column.append(values.get(key))
+
+        yield _build(
+            templates, keys, template_column, miss_column, columns, arrays
+        )
+
+        if chunk_size is None:
+            break
+
+
+def _keys(templates):
+    '''Return sorted union of placeholder keys in *templates*.'''
+    keys = set()
+    for template in templates:
+        keys.update(template.keys())
+
+    return sorted(keys)
+
+
+def _build(templates, keys, template_column, miss_column, columns, arrays):
+    '''Return :class:`Columns` converting to arrays if requested.'''
+    for key in keys:
+        columns.setdefault(key, [])
+
+    numpy = None
+    if arrays is None or arrays:
+        numpy = _numpy()
+
+    if arrays is None:
+        arrays = numpy is not None
+
+    if arrays:
+        if numpy is None:
+            raise ImportError('NumPy is required for array columns.')
+
+        template_column = numpy.array(template_column, dtype=numpy.int32)
+        miss_column = numpy.array(miss_column, dtype=bool)
+        for key, column in columns.items():
+            array = numpy.empty(len(column), dtype=object)
+            array[:] = column
+            columns[key] = array
+
+    return Columns(templates, template_column, miss_column, columns)
+
+
+def _numpy():
+    '''Return NumPy module or None if it is not available.
+
+    NumPy is only imported once array columns are built so that importing
+    lucidity does not pay for it.
+
+    '''
+    try:
+        import numpy
+    except ImportError:
+        return None
+
+    return numpy
@@ -5,8 +5,11 @@
 import os
 import uuid
 import imp
+from timeit import default_timer as _timer
 
 from .error import ParseError, FormatError, NotFound
+from .cache import canonical as _canonical
+from . import instrument
 
 
 def discover_templates(paths=None, recursive=True):
@@ -37,15 +40,16 @@ def discover_templates(paths=None, recursive=True):
                     continue
 
                 module_path = os.path.join(base, filename)
-                module_name = uuid.uuid4().hex
-                module = imp.load_source(module_name, module_path)
-                try:
-                    registered = module.register()
-                except AttributeError:
-                    pass
+                if instrument.hooks:
+                    registered = instrument.call(
+                        'discover', _load_mount_point, (module_path,),
+                        {'path': module_path}
+                    )
                 else:
-                    if registered:
-                        templates.extend(registered)
+                    registered = _load_mount_point(module_path)
+
+                if registered:
+                    templates.extend(registered)
 
             if not recursive:
                 del directories[:]
@@ -53,7 +57,22 @@ def discover_templates(paths=None, recursive=True):
     return templates
 
 
-def parse(path, templates, template_resolver=None):
+def _load_mount_point(path):
+    '''Return templates registered by mount point at *path*.
+
+    Return None if the module at *path* does not define a register function.
+
+    '''
+    module_name = uuid.uuid4().hex
+    module = imp.load_source(module_name, path)
+    try:
+        return module.register()
+    except AttributeError:
+        return None
+
+
+def parse(path, templates, template_resolver=None, cache=None,
+          statistics=None):
     '''Parse *path* against *templates* and return first successful parse.
 
     *path* should be a string to parse.
@@ -64,13 +83,29 @@ def parse(path, templates, template_resolver=None):
     *template_resolver* should be an object with a `get` method to retrieve template by name.
     instances in the order that they should be tried.
 
+    *cache* may be a :py:class:`~lucidity.cache.Cache` used to memoize both
+    successful and failed parses. Results are keyed by *path* and the
+    identity of *templates*.
+
+    *statistics* may be a :py:class:`~lucidity.statistics.Statistics` used to
+    record attempts, hits and time per template.
+
     Return ``(data, template)`` from first successful parse.
 
     Raise :py:class:`~lucidity.error.ParseError` if *path* is not
     parseable by any of the supplied *templates*.
 
     '''
-    iter = parse_iter(path, templates, template_resolver)
+    if cache is not None:
+        templates = tuple(templates)
+        return cache.call(
+            ('parse', path, templates),
+            lambda: parse(path, templates, template_resolver,
+                          statistics=statistics),
+            errors=(ParseError,)
+        )
+
+    iter = parse_iter(path, templates, template_resolver, statistics)
     try:
         return next(iter)
     except StopIteration:
@@ -80,7 +115,8 @@ def parse(path, templates, template_resolver=None):
         )
 
 
-def parse_iter(path, templates, template_resolver=None):
+def parse_iter(path, templates, template_resolver=None, statistics=None,
+               exclusions=None):
     '''Parse *path* against *templates* and yield all successful parses.
 
     *path* should be a string to parse.
@@ -88,18 +124,68 @@ def parse_iter(path, templates, template_resolver=None):
     *templates* should be a list of :py:class:`~lucidity.template.Template`
     instances in the order that they should be tried.
 
+    *statistics* may be a :py:class:`~lucidity.statistics.Statistics` used to
+    record attempts, hits and time per template.
+
+    *exclusions* may be a :py:class:`~lucidity.analysis.ExclusionGraph` for
+    *templates*. Once a template matches, templates the graph shows cannot
+    also match are skipped without being tried.
+
     Yield ``(data, template)`` for each match in a list.
     '''
+    skipped = ()
     for template in templates:
+        if template in skipped:
+            continue
+
+        if statistics is not None:
+            start = _timer()
+
         try:
             data = template.parse(path)
+        except ParseError:
+            if statistics is not None:
+                statistics.record(template, False, _timer() - start)
+            continue
+
+        if statistics is not None:
+            statistics.record(template, True, _timer() - start)
+
+        if exclusions is not None:
+            excluded = exclusions.exclusive(template)
+            if excluded:
+                skipped = set(skipped)
+                skipped.update(excluded)
+
+        yield (data, template)
+
+
+def match_prefix_iter(path, templates):
+    '''Match partial *path* against *templates* and yield viable matches.
+
+    *path* should be a string that may be the beginning of a full path, such
+    as a directory being walked or text being typed.
+
+    *templates* should be a list of :py:class:`~lucidity.template.Template`
+    instances in the order that they should be tried.
+
+    Yield ``(data, template)`` for each template that *path* could still
+    match, where *data* holds the placeholders bound so far.
+
+    See: :py:meth:`~lucidity.template.Template.match_prefix` for more
+    information.
+
+    '''
+    for template in templates:
+        try:
+            data = template.match_prefix(path)
         except ParseError:
             continue
         else:
             yield (data, template)
 
 
-def format(data, templates, template_resolver=None):  # @ReservedAssignment
+def format(data, templates, template_resolver=None, cache=None):  # @ReservedAssignment
     '''Format *data* using *templates* and return first successful format.
 
     *data* should be a dictionary of data to format into a path.
@@ -107,11 +193,29 @@ def format(data, templates, template_resolver=None):  # @ReservedAssignment
     *templates* should be a list of :py:class:`~lucidity.template.Template`
     instances in the order that they should be tried.
 
+    *cache* may be a :py:class:`~lucidity.cache.Cache` used to memoize both
+    successful and failed formats. Results are keyed by a canonical form of
+    *data* and the identity of *templates*. Data containing unhashable
+    values is formatted without caching.
+
     Return ``(path, template)`` from first successful format.
 
     Raise :py:class:`~lucidity.error.FormatError` if *data* is not
     formattable by any of the supplied *templates*.
     '''
+    if cache is not None:
+        templates = tuple(templates)
+        try:
+            key = ('format', _canonical(data), templates)
+        except TypeError:
+            pass
+        else:
+            return cache.call(
+                key,
+                lambda: format(data, templates, template_resolver),
+                errors=(FormatError,)
+            )
+
     iter = format_iter(data, templates, template_resolver)
     try:
         return next(iter)
@@ -0,0 +1,444 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Generation of synthetic path corpora from templates.'''
+
+import re
+import random
+import string
+import sre_parse
+import sre_constants
+
+from . import syntax
+
+#: Kinds of generated path.
+VALID, NEAR_MISS, NON_MATCHING = ('valid', 'near_miss', 'non_matching')
+
+# Characters sampled for wildcards and negated sets.
+_UNIVERSE = string.ascii_letters + string.digits + '_-.'
+
+_CATEGORIES = {
+    'CATEGORY_DIGIT': re.compile(r'\d'),
+    'CATEGORY_NOT_DIGIT': re.compile(r'\D'),
+    'CATEGORY_SPACE': re.compile(r'\s'),
+    'CATEGORY_NOT_SPACE': re.compile(r'\S'),
+    'CATEGORY_WORD': re.compile(r'\w'),
+    'CATEGORY_NOT_WORD': re.compile(r'\W')
+}
+
+_CANDIDATES = _UNIVERSE + ' !#$%&+,=@~'
+
+
+class Generator(object):
+    '''Generate paths from templates reproducibly.
+
+    Valid paths are formatted through a template with a value sampled for
+    each placeholder that matches the placeholder expression. Near miss
+    paths are valid paths with a small edit, such as a changed literal
+    character or an appended segment. Non matching paths are random paths
+    not derived from any template.
+
+    Near miss and non matching describe how a path was generated. Permissive
+    templates, such as those not anchored, may still parse them unless
+    *verify* is set. Likewise, sampled values can make a valid path ambiguous,
+    such as for a STRICT template with duplicate placeholders whose
+    expressions match the literal text between them.
+
+    '''
+
+    def __init__(self, templates, seed=None, near_miss=0.0,
+                 non_matching=0.0, max_repeat=8, verify=False):
+        '''Initialise generator for *templates*.
+
+        *seed* initialises the random number generator so that the same
+        sequence of paths is generated for the same templates in the same
+        order.
+
+        *near_miss* and *non_matching* are the proportions of paths of those
+        kinds to generate, with the remainder valid.
+
+        *max_repeat* limits the number of repetitions sampled for unbounded
+        quantifiers in placeholder expressions.
+
+        If *verify* is True then valid paths that their template cannot parse,
+        and near miss and non matching paths that any of the templates can
+        parse, are discarded and generated again.
+
+        '''
+        super(Generator, self).__init__()
+        if near_miss < 0 or non_matching < 0 or near_miss + non_matching > 1:
+            raise ValueError(
+                'Proportions of near miss and non matching paths must be '
+                'positive and total at most 1.'
+            )
+
+        self.templates = list(templates)
+        if not self.templates:
+            raise ValueError('At least one template is required.')
+
+        self.near_miss = near_miss
+        self.non_matching = non_matching
+        self.max_repeat = max_repeat
+        self.verify = verify
+
+        self._random = random.Random(seed)
+        self._plans = {}
+
+    def __iter__(self):
+        '''Yield paths indefinitely.'''
+        while True:
+            yield self.sample()[2]
+
+    def data(self, template):
+        '''Return data with a sampled value for each placeholder of *template*.
+
+        Values for duplicate placeholders are the same so the data is
+        accepted by STRICT templates.
+
+        '''
+        data = {}
+        for placeholder, sampler in sorted(self._plan(template)[1].items()):
+            target = data
+            parts = placeholder.split('.')
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+
+            target[parts[-1]] = sampler()
+
+        return data
+
+    def sample(self):
+        '''Return ``(kind, template, path, data)`` for a generated path.
+
+        *template* and *data* are None for non matching paths.
+
+        '''
+        choice = self._random.random()
+        if choice < self.non_matching:
+            kind = NON_MATCHING
+        elif choice < self.non_matching + self.near_miss:
+            kind = NEAR_MISS
+        else:
+            kind = VALID
+
+        template = None
+        data = None
+        for _ in range(100):
+            if kind == NON_MATCHING:
+                path = self._non_matching()
+            else:
+                template = self._random.choice(self.templates)
+                data = self.data(template)
+                path = template.format(data)
+                if kind == NEAR_MISS:
+                    path = self._near_miss(template, data)
+
+            if not self.verify:
+                return kind, template, path, data
+
+            if kind == VALID:
+                if self._parsable(path, [template]):
+                    return kind, template, path, data
+
+            elif not self._parsable(path, self.templates):
+                return kind, template, path, data
+
+        raise ValueError(
+            'Could not generate a verified {0} path.'
+            .format(kind.replace('_', ' '))
+        )
+
+    def paths(self, count):
+        '''Yield *count* generated paths.'''
+        for _ in xrange(count):
+            yield self.sample()[2]
+
+    def samples(self, count):
+        '''Yield *count* ``(kind, template, path, data)`` samples.'''
+        for _ in xrange(count):
+            yield self.sample()
+
+    def write(self, target, count, separator='\n'):
+        '''Write *count* generated paths to *target*.
+
+        *target* may be a filesystem path or an object with a ``write``
+        method. Each path is followed by *separator*. Paths are generated as
+        they are written so memory use does not grow with *count*.
+
+        '''
+        if hasattr(target, 'write'):
+            self._write(target, count, separator)
+        else:
+            with open(target, 'w') as stream:
+                self._write(stream, count, separator)
+
+    def _write(self, stream, count, separator):
+        '''Write *count* paths to *stream* in batches.'''
+        batch = []
+        for path in self.paths(count):
+            batch.append(path)
+            if len(batch) >= 10000:
+                stream.write(separator.join(batch) + separator)
+                batch = []
+
+        if batch:
+            stream.write(separator.join(batch) + separator)
+
+    def _plan(self, template):
+        '''Return ``(pieces, samplers)`` for current pattern of *template*.
+
+        *pieces* is a list of ``(literal, placeholder)`` pairs with
+        *placeholder* None after the last placeholder. *samplers* maps each
+        placeholder to a function returning a sampled value.
+
+        '''
+        pattern = template.expanded_pattern()
+        plan = self._plans.get(template)
+        if plan is not None and plan[0] == pattern:
+            return plan[1]
+
+        pieces = []
+        samplers = {}
+        trailing = ''
+        for literal, placeholder in syntax.parse(pattern).components:
+            if placeholder is None:
+                trailing = literal
+                continue
+
+            pieces.append((literal, placeholder.name))
+            if placeholder.name not in samplers:
+                samplers[placeholder.name] = self._sampler(
+                    placeholder.regular_expression(
+                        template._default_placeholder_expression
+                    )
+                )
+
+        pieces.append((trailing, None))
+
+        plan = (pieces, samplers)
+        self._plans[template] = (pattern, plan)
+        return plan
+
+    def _sampler(self, expression):
+        '''Return function sampling values that match *expression*.
+
+        Raise :exc:`ValueError` if *expression* is not a valid regular
+        expression.
+
+        '''
+        try:
+            parsed = sre_parse.parse(expression)
+            regex = re.compile('(?:{0})\\Z'.format(expression))
+        except (sre_constants.error, TypeError) as exception:
+            raise ValueError(
+                'Invalid placeholder expression {0!r}: {1}'
+                .format(expression, exception)
+            )
+
+        def sampler():
+            for _ in range(100):
+                value = ''.join(self._sample(parsed, {}))
+                if regex.match(value):
+                    return value
+
+            raise ValueError(
+                'Could not sample a value matching expression {0!r}.'
+                .format(expression)
+            )
+
+        return sampler
+
+    def _sample(self, subpattern, groups):
+        '''Return list of characters sampled from parsed *subpattern*.
+
+        *groups* maps group numbers to text sampled for them so far.
+
+        '''
+        characters = []
+        for opcode, argument in subpattern:
+            opcode = str(opcode).upper()
+
+            if opcode == 'LITERAL':
+                characters.append(_character(argument))
+
+            elif opcode == 'NOT_LITERAL':
+                characters.append(self._random.choice(
+                    [character for character in _UNIVERSE
+                     if ord(character) != argument]
+                ))
+
+            elif opcode == 'ANY':
+                characters.append(self._random.choice(_UNIVERSE))
+
+            elif opcode == 'IN':
+                characters.append(self._random.choice(
+                    _set_characters(argument) or _UNIVERSE
+                ))
+
+            elif opcode in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'):
+                minimum, maximum, item = argument
+                maximum = min(maximum, minimum + self.max_repeat)
+                for _ in range(self._random.randint(minimum, maximum)):
+                    characters.extend(self._sample(item, groups))
+
+            elif opcode == 'SUBPATTERN':
+                sampled = self._sample(argument[-1], groups)
+                if argument[0] is not None:
+                    groups[argument[0]] = sampled
+                characters.extend(sampled)
+
+            elif opcode == 'GROUPREF':
+                characters.extend(groups.get(argument, []))
+
+            elif opcode == 'BRANCH':
+                characters.extend(
+                    self._sample(self._random.choice(argument[1]), groups)
+                )
+
+            # Anchors and lookarounds are not sampled. Values violating them
+            # are rejected by the sampler and sampled again.
+
+        return characters
+
+    def _near_miss(self, template, data):
+        '''Return path formatted from *template* and *data* with a small edit.
+
+        The edit is one of changing a literal character, changing a character
+        in a value to one not matching its expression, or appending a
+        segment.
+
+        '''
+        pieces, samplers = self._plan(template)
+        values = {}
+        for placeholder in samplers:
+            value = data
+            for part in placeholder.split('.'):
+                value = value[part]
+            values[placeholder] = value
+
+        edits = ['append']
+        literals = [
+            index for index, (literal, _) in enumerate(pieces) if literal
+        ]
+        if literals:
+            edits.append('literal')
+        if values:
+            edits.append('value')
+
+        edit = self._random.choice(edits)
+        parts = []
+        for literal, placeholder in pieces:
+            parts.append(literal)
+            if placeholder is not None:
+                parts.append(values[placeholder])
+
+        if edit == 'literal':
+            index = self._random.choice(literals) * 2
+            parts[index] = self._change_character(parts[index])
+
+        elif edit == 'value':
+            index = self._random.randrange(1, len(parts), 2)
+            parts[index] = self._change_character(parts[index], ' !#@~')
+
+        else:
+            parts.append('/{0}'.format(self._word()))
+
+        return ''.join(parts)
+
+    def _change_character(self, text, replacements=_UNIVERSE):
+        '''Return *text* with one character changed.'''
+        if not text:
+            return self._random.choice(replacements)
+
+        index = self._random.randrange(len(text))
+        choices = [
+            character for character in replacements
+            if character != text[index]
+        ]
+        return text[:index] + self._random.choice(choices) + text[index + 1:]
+
+    def _non_matching(self):
+        '''Return random path not derived from a template.'''
+        return '/' + '/'.join(
+            self._word() for _ in range(self._random.randint(1, 6))
+        )
+
+    def _word(self):
+        '''Return random lowercase word.'''
+        return ''.join(
+            self._random.choice(string.ascii_lowercase)
+            for _ in range(self._random.randint(3, 10))
+        )
+
+    def _parsable(self, path, templates):
+        '''Return whether any of *templates* can parse *path*.'''
+        for template in templates:
+            try:
+                template.parse(path)
+            except Exception:
+                continue
+
+            return True
+
+        return False
+
+
+def generate(templates, count, seed=None, near_miss=0.0, non_matching=0.0):
+    '''Yield *count* paths generated from *templates*.
+
+    See :class:`Generator` for the meaning of the arguments.
+
+    '''
+    generator = Generator(
+        templates, seed=seed, near_miss=near_miss, non_matching=non_matching
+    )
+    return generator.paths(count)
+
+
+def _set_characters(items):
+    '''Return characters matched by parsed character set *items*.'''
+    negate = False
+    tests = []
+    candidates = set(_CANDIDATES)
+    for opcode, argument in items:
+        opcode = str(opcode).upper()
+
+        if opcode == 'NEGATE':
+            negate = True
+
+        elif opcode == 'LITERAL':
+            tests.append(lambda code, argument=argument: code == argument)
+            candidates.add(_character(argument))
+
+        elif opcode == 'RANGE':
+            tests.append(
+                lambda code, argument=argument:
+                    argument[0] <= code <= argument[1]
+            )
+            low, high = argument
+            for code in range(low, min(high, low + 256) + 1):
+                candidates.add(_character(code))
+
+        elif opcode == 'CATEGORY':
+            regex = _CATEGORIES.get(str(argument).upper())
+            if regex is not None:
+                tests.append(
+                    lambda code, regex=regex: regex.match(_character(code))
+                )
+
+    characters = []
+    for character in sorted(candidates):
+        matched = any(test(ord(character)) for test in tests)
+        if matched != negate:
+            characters.append(character)
+
+    return ''.join(characters)
+
+
+def _character(code):
+    '''Return character for *code*.'''
+    if code < 128:
+        return chr(code)
+
+    return unichr(code)
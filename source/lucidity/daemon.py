@@ -0,0 +1,480 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Resident daemon serving schemas over a Unix domain socket.
+
+Loading a schema and compiling its templates is paid once by a long running
+:class:`Server`. Short lived processes then parse and format through a
+:class:`Client`, which only needs to connect to the socket.
+
+Messages in both directions are frames of a four byte big endian length
+followed by that many bytes of UTF-8 encoded JSON. A request is an object
+with ``operation``, ``schema`` and ``arguments`` keys. A response is an
+object with either a ``result`` key or ``error`` and ``message`` keys.
+
+'''
+
+import os
+import json
+import errno
+import stat
+import socket
+import struct
+import SocketServer
+
+from . import error
+from .template import Template
+from .schema import Schema
+
+#: Name that schemas are served under by default.
+DEFAULT_SCHEMA = 'default'
+
+#: Largest frame accepted, in bytes.
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+_HEADER = struct.Struct('!I')
+
+# Errors reported to clients and raised again on their side.
+_ERRORS = dict(
+    (exception.__name__, exception) for exception in (
+        error.ParseError, error.FormatError, error.NotFound,
+        error.ResolveError, ValueError
+    )
+)
+
+
+class Server(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    '''Serve parse and format requests for schemas.
+
+    Each connection is handled in its own thread and may send any number of
+    requests in turn.
+
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, address, schemas):
+        '''Initialise server listening on socket at *address*.
+
+        *schemas* should map names to :py:class:`~lucidity.schema.Schema`
+        instances to serve. A single schema may be passed instead, which is
+        served as :data:`DEFAULT_SCHEMA`.
+
+        A stale socket file left at *address* by a server that is no longer
+        running is replaced.
+
+        '''
+        if isinstance(schemas, Schema):
+            schemas = {DEFAULT_SCHEMA: schemas}
+
+        self.schemas = schemas
+        _remove_stale_socket(address)
+        SocketServer.UnixStreamServer.__init__(self, address, _Handler)
+
+    def server_close(self):
+        '''Close server and remove socket file.'''
+        SocketServer.UnixStreamServer.server_close(self)
+        try:
+            os.remove(self.server_address)
+        except OSError:
+            pass
+
+    def respond(self, request):
+        '''Return response for *request*.'''
+        try:
+            operation = request.get('operation')
+            if operation not in _OPERATIONS:
+                raise ValueError(
+                    'Unknown operation {0!r}.'.format(operation)
+                )
+
+            name = request.get('schema', DEFAULT_SCHEMA)
+            schema = self.schemas.get(name)
+            if schema is None:
+                raise error.NotFound(
+                    'Schema {0!r} is not served.'.format(name)
+                )
+
+            result = _OPERATIONS[operation](
+                schema, *request.get('arguments', [])
+            )
+
+        except Exception as exception:
+            # Report any failure so that the connection remains usable.
+            return {
+                'error': type(exception).__name__, 'message': str(exception)
+            }
+
+        return {'result': result}
+
+
+class _Handler(SocketServer.BaseRequestHandler):
+    '''Handle requests on a connection until the client disconnects.'''
+
+    def handle(self):
+        '''Respond to each request received.'''
+        while True:
+            try:
+                request = receive(self.request)
+            except ValueError as exception:
+                send(self.request, {
+                    'error': 'ValueError', 'message': str(exception)
+                })
+                return
+
+            if request is None:
+                return
+
+            send(self.request, self.server.respond(request))
+
+
+class Client(object):
+    '''Parse and format through a :class:`Server`.
+
+    Methods mirror those of :py:class:`~lucidity.schema.Schema`. Returned
+    templates are reconstructed from the served templates with their
+    references expanded, and values are returned as unicode strings.
+
+    If the server cannot be reached and a *fallback* was given then that
+    schema is used in process for this and all later calls instead. Results
+    take the same form either way.
+
+    Byte string arguments must be valid UTF-8, otherwise
+    :exc:`ValueError` is raised for that call only.
+
+    '''
+
+    def __init__(self, address, schema=DEFAULT_SCHEMA, fallback=None,
+                 timeout=None, batch_size=1000):
+        '''Initialise client for server listening at *address*.
+
+        *schema* is the name of the served schema to use.
+
+        *fallback* may be a :py:class:`~lucidity.schema.Schema`, or a callable
+        returning one so that it is only loaded if needed.
+
+        *timeout* is the number of seconds to wait for the server to respond,
+        or None to wait indefinitely.
+
+        *batch_size* is the number of paths sent in each request by
+        :meth:`parse_many`.
+
+        '''
+        super(Client, self).__init__()
+        self.address = address
+        self.schema = schema
+        self.fallback = fallback
+        self.timeout = timeout
+        self.batch_size = batch_size
+
+        self._socket = None
+        self._local = None
+        self._templates = {}
+
+    def __enter__(self):
+        '''Return client for use as a context manager.'''
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        '''Close client on leaving context.'''
+        self.close()
+
+    def close(self):
+        '''Close connection to server.'''
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    @property
+    def connected(self):
+        '''Return whether requests are currently sent to the server.'''
+        return self._local is None and self._socket is not None
+
+    def parse(self, path):
+        '''Return ``(data, template)`` for first template matching *path*.'''
+        return self._match(self._call('parse', path))
+
+    def parse_all(self, path):
+        '''Return list of ``(data, template)`` for templates matching *path*.'''
+        return [self._match(match) for match in self._call('parse_all', path)]
+
+    def parse_many(self, paths):
+        '''Yield ``(path, data, template)`` for first match of each of *paths*.
+
+        Paths are sent in batches of :attr:`batch_size` per request. *data*
+        and *template* are None for paths no template matched.
+
+        '''
+        batch = []
+        for path in paths:
+            batch.append(path)
+            if len(batch) >= self.batch_size:
+                for result in self._parse_batch(batch):
+                    yield result
+
+                batch = []
+
+        if batch:
+            for result in self._parse_batch(batch):
+                yield result
+
+    def _parse_batch(self, paths):
+        '''Return list of ``(path, data, template)`` for *paths*.'''
+        result = self._call('parse_many', paths)
+
+        results = []
+        for path, match in zip(paths, result):
+            if match is None:
+                results.append((path, None, None))
+            else:
+                data, template = self._match(match)
+                results.append((path, data, template))
+
+        return results
+
+    def format(self, data):
+        '''Return ``(path, template)`` for first template formatting *data*.'''
+        return self._match(self._call('format', data))
+
+    def format_all(self, data):
+        '''Return list of ``(path, template)`` for templates formatting *data*.'''
+        return [self._match(match) for match in self._call('format_all', data)]
+
+    def _call(self, operation, *arguments):
+        '''Return result of *operation* with *arguments* from server.
+
+        If the server is unavailable and a fallback schema was given then
+        return the result of performing the operation with that schema
+        instead, on the arguments as the server would have received them.
+
+        '''
+        # Serialise before using the connection so that invalid arguments
+        # fail this call only rather than being mistaken for a lost server.
+        try:
+            payload = _encode({
+                'operation': operation, 'schema': self.schema,
+                'arguments': arguments
+            })
+        except UnicodeDecodeError as exception:
+            raise ValueError(
+                'Arguments must be unicode or UTF-8 encoded byte strings: '
+                '{0}'.format(exception)
+            )
+
+        if self._local is not None:
+            return self._call_local(payload)
+
+        try:
+            if self._socket is None:
+                self._socket = connect(self.address, self.timeout)
+
+            self._socket.sendall(payload)
+            response = receive(self._socket)
+            if response is None:
+                raise socket.error(
+                    errno.ECONNRESET, 'Connection closed by server.'
+                )
+
+        except (socket.error, ValueError):
+            # Connection failed or the server sent an invalid frame.
+            self.close()
+            if self.fallback is None:
+                raise
+
+            fallback = self.fallback
+            if callable(fallback):
+                fallback = fallback()
+
+            self._local = fallback
+            return self._call_local(payload)
+
+        if 'error' in response:
+            # Failures other than expected errors are reported generically.
+            exception = _ERRORS.get(response['error'], RuntimeError)
+            raise exception(response['message'])
+
+        return response['result']
+
+    def _call_local(self, payload):
+        '''Return result of request in *payload* using the fallback schema.
+
+        The result is passed through JSON so that it takes exactly the form
+        it would have if received from a server.
+
+        '''
+        request = json.loads(payload[_HEADER.size:])
+        result = _OPERATIONS[request['operation']](
+            self._local, *request['arguments']
+        )
+        return json.loads(json.dumps(result))
+
+    def _match(self, match):
+        '''Return ``(value, template)`` from served *match*.'''
+        value, description = match
+        return value, self._template(description)
+
+    def _template(self, description):
+        '''Return template for served *description*.'''
+        key = tuple(description)
+        template = self._templates.get(key)
+        if template is None:
+            name, pattern, anchor, mode, expression = description
+            template = Template(
+                name, pattern, anchor=anchor, duplicate_placeholder_mode=mode,
+                default_placeholder_expression=expression
+            )
+            self._templates[key] = template
+
+        return template
+
+
+def connect(address, timeout=None):
+    '''Return socket connected to server listening at *address*.'''
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    try:
+        connection.connect(address)
+    except socket.error:
+        connection.close()
+        raise
+
+    return connection
+
+
+def send(connection, message):
+    '''Send *message* as a frame on *connection*.'''
+    connection.sendall(_encode(message))
+
+
+def _encode(message):
+    '''Return *message* encoded as a frame.'''
+    payload = json.dumps(message, separators=(',', ':'))
+    return _HEADER.pack(len(payload)) + payload
+
+
+def receive(connection):
+    '''Return message received as a frame on *connection*.
+
+    Return None if the connection was closed before a frame started. Raise
+    :exc:`ValueError` if the frame is invalid.
+
+    '''
+    header = _receive_exactly(connection, _HEADER.size)
+    if not header:
+        return None
+
+    if len(header) < _HEADER.size:
+        raise ValueError('Connection closed during frame.')
+
+    size = _HEADER.unpack(header)[0]
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(
+            'Frame of {0} bytes exceeds maximum size.'.format(size)
+        )
+
+    payload = _receive_exactly(connection, size)
+    if len(payload) < size:
+        raise ValueError('Connection closed during frame.')
+
+    return json.loads(payload)
+
+
+def _receive_exactly(connection, size):
+    '''Return up to *size* bytes, fewer only if *connection* closes.'''
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = connection.recv(min(remaining, 65536))
+        if not chunk:
+            break
+
+        chunks.append(chunk)
+        remaining -= len(chunk)
+
+    return ''.join(chunks)
+
+
+def _remove_stale_socket(address):
+    '''Remove socket file at *address* if no server is listening on it.
+
+    Raise :exc:`ValueError` if a file other than a socket exists at
+    *address*, so that it is never removed.
+
+    '''
+    try:
+        mode = os.lstat(address).st_mode
+    except OSError as exception:
+        if exception.errno == errno.ENOENT:
+            return
+        raise
+
+    if not stat.S_ISSOCK(mode):
+        raise ValueError(
+            'Refusing to replace {0!r} as it is not a socket.'.format(address)
+        )
+
+    try:
+        connect(address).close()
+    except socket.error:
+        os.remove(address)
+    else:
+        raise ValueError(
+            'A server is already listening at {0!r}.'.format(address)
+        )
+
+
+def _describe(template):
+    '''Return description of *template* to reconstruct it from.'''
+    return [
+        template.name, template.expanded_pattern(), template.anchor,
+        template.duplicate_placeholder_mode,
+        template._default_placeholder_expression
+    ]
+
+
+def _parse(schema, path):
+    '''Return first match parsing *path*.'''
+    data, template = schema.parse(path)
+    return [data, _describe(template)]
+
+
+def _parse_all(schema, path):
+    '''Return all matches parsing *path*.'''
+    return [
+        [data, _describe(template)] for data, template in schema.parse_all(path)
+    ]
+
+
+def _parse_many(schema, paths):
+    '''Return first match, or None, for each of *paths*.'''
+    results = []
+    for _, data, template in schema.parse_many(paths):
+        if template is None:
+            results.append(None)
+        else:
+            results.append([data, _describe(template)])
+
+    return results
+
+
+def _format(schema, data):
+    '''Return first match formatting *data*.'''
+    path, template = schema.format(data)
+    return [path, _describe(template)]
+
+
+def _format_all(schema, data):
+    '''Return all matches formatting *data*.'''
+    return [
+        [path, _describe(template)] for path, template in schema.format_all(data)
+    ]
+
+
+_OPERATIONS = {
+    'parse': _parse,
+    'parse_all': _parse_all,
+    'parse_many': _parse_many,
+    'format': _format,
+    'format_all': _format_all
+}
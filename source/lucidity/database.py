@@ -0,0 +1,342 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Persistent index of parsed paths.'''
+
+import json
+import sqlite3
+
+
+class Index(object):
+    '''Index of parsed paths stored in a SQLite database.
+
+    Each template has its own table with a row per path holding a column per
+    placeholder, each with an index, so that paths can be queried by partial
+    data without parsing them again. Placeholder columns are prefixed with
+    ``key:`` so that they never collide with the ``path`` column.
+
+    Results to index are ``(path, data, template)`` as produced by
+    :py:meth:`~lucidity.schema.Schema.find` when scanning or
+    :py:meth:`~lucidity.schema.Schema.parse_many` when batch parsing.
+
+    Values are stored and returned as byte strings.
+
+    '''
+
+    #: Name of table recording indexed templates.
+    TEMPLATES_TABLE = 'lucidity_templates'
+
+    def __init__(self, filepath=':memory:', templates=None):
+        '''Initialise index stored in database at *filepath*.
+
+        Tables are created for *templates* and for any other template as
+        results for it are added. If the pattern of a template differs from
+        when it was indexed then its previous rows are discarded.
+
+        '''
+        super(Index, self).__init__()
+        self.filepath = filepath
+
+        self._connection = sqlite3.connect(filepath)
+        self._connection.text_factory = str
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS {0} ('
+            'name TEXT PRIMARY KEY, pattern TEXT, keys TEXT)'
+            .format(_quote(self.TEMPLATES_TABLE))
+        )
+        self._connection.commit()
+
+        self._tables = {}
+        for name, pattern, keys in self._connection.execute(
+            'SELECT name, pattern, keys FROM {0}'
+            .format(_quote(self.TEMPLATES_TABLE))
+        ).fetchall():
+            keys = json.loads(keys)
+
+            # Tables created with a different column layout are recreated
+            # when next used.
+            columns = set(
+                row[1] for row in self._connection.execute(
+                    'PRAGMA table_info({0})'.format(_table_name(name))
+                )
+            )
+            if columns != set(['path'] + [_column(key) for key in keys]):
+                continue
+
+            self._tables[name] = (pattern, keys)
+
+        for template in templates or []:
+            self._table(template)
+
+        self._connection.commit()
+
+    def __enter__(self):
+        '''Return index for use as a context manager.'''
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        '''Close index on leaving context.'''
+        self.close()
+
+    def close(self):
+        '''Close database.'''
+        self._connection.close()
+
+    def templates(self):
+        '''Return names of indexed templates.'''
+        return sorted(self._tables)
+
+    def add(self, results):
+        '''Add or replace indexed *results*.
+
+        Results with a template of None, such as paths that did not parse,
+        are skipped. Return number of results indexed.
+
+        '''
+        count = 0
+        with self._connection:
+            for path, data, template in results:
+                if template is None:
+                    continue
+
+                self._insert(path, data, template)
+                count += 1
+
+        return count
+
+    def update(self, root, results):
+        '''Replace indexed results for paths under *root* with *results*.
+
+        *results* should be the complete results of scanning or parsing
+        again under *root*, such as after the contents of a directory
+        changed. Rows for paths no longer present are removed and others
+        added or replaced, leaving rows outside *root* untouched.
+
+        Return ``(added, removed)`` counts.
+
+        '''
+        with self._connection:
+            previous = set()
+            for name in self._tables:
+                previous.update(
+                    (name, path) for (path,) in self._connection.execute(
+                        'SELECT path FROM {0} WHERE {1}'.format(
+                            _table_name(name), _under_clause()
+                        ),
+                        _under_arguments(root)
+                    )
+                )
+
+            current = set()
+            for path, data, template in results:
+                if template is None:
+                    continue
+
+                self._insert(path, data, template)
+                current.add((template.name, path))
+
+            removed = previous - current
+            for name, path in removed:
+                self._connection.execute(
+                    'DELETE FROM {0} WHERE path = ?'.format(_table_name(name)),
+                    (path,)
+                )
+
+        return len(current - previous), len(removed)
+
+    def remove(self, root):
+        '''Remove indexed results for paths under *root* and return count.'''
+        count = 0
+        with self._connection:
+            for name in self._tables:
+                count += self._connection.execute(
+                    'DELETE FROM {0} WHERE {1}'.format(
+                        _table_name(name), _under_clause()
+                    ),
+                    _under_arguments(root)
+                ).rowcount
+
+        return count
+
+    def discard(self, paths):
+        '''Remove indexed results for exactly *paths* and return count.
+
+        Unlike :meth:`remove`, paths below each of *paths* are kept.
+
+        '''
+        count = 0
+        with self._connection:
+            for path in paths:
+                count += self._delete(path)
+
+        return count
+
+    def query(self, data=None, template=None, root=None):
+        '''Yield ``(path, data, template_name)`` for indexed paths.
+
+        *data* may partially specify placeholder values in the same structure
+        returned by parsing. Keys may also use dot notation for nested
+        placeholders. Only paths of templates with all of the given
+        placeholders and matching values are yielded.
+
+        *template* may name a single template to query and *root* restrict
+        results to paths under it.
+
+        Paths are yielded in order for each template in turn.
+
+        '''
+        criteria = _flatten(data or {})
+
+        names = sorted(self._tables)
+        if template is not None:
+            names = [name for name in names if name == template]
+
+        for name in names:
+            keys = self._tables[name][1]
+            if not all(key in keys for key in criteria):
+                continue
+
+            clauses = []
+            arguments = []
+            for key, value in sorted(criteria.items()):
+                clauses.append('{0} = ?'.format(_quote(_column(key))))
+                arguments.append(_text(value))
+
+            if root is not None:
+                clauses.append(_under_clause())
+                arguments.extend(_under_arguments(root))
+
+            statement = 'SELECT {0} FROM {1}'.format(
+                ', '.join(['path'] + [_quote(_column(key)) for key in keys]),
+                _table_name(name)
+            )
+
+            if clauses:
+                statement += ' WHERE ' + ' AND '.join(clauses)
+
+            statement += ' ORDER BY path'
+
+            for row in self._connection.execute(statement, arguments):
+                yield row[0], _nest(zip(keys, row[1:])), name
+
+    def _table(self, template):
+        '''Ensure table exists for current pattern of *template*.'''
+        pattern = template.expanded_pattern()
+        existing = self._tables.get(template.name)
+        if existing is not None and existing[0] == pattern:
+            return existing[1]
+
+        keys = sorted(template.keys())
+        table = _table_name(template.name)
+
+        self._connection.execute('DROP TABLE IF EXISTS {0}'.format(table))
+        self._connection.execute(
+            'CREATE TABLE {0} (path TEXT PRIMARY KEY{1})'.format(
+                table, ''.join(
+                    ', {0} TEXT'.format(_quote(_column(key))) for key in keys
+                )
+            )
+        )
+        for key in keys:
+            self._connection.execute(
+                'CREATE INDEX {0} ON {1} ({2})'.format(
+                    _quote('index:{0}:{1}'.format(template.name, key)), table,
+                    _quote(_column(key))
+                )
+            )
+
+        self._connection.execute(
+            'INSERT OR REPLACE INTO {0} (name, pattern, keys) VALUES (?, ?, ?)'
+            .format(_quote(self.TEMPLATES_TABLE)),
+            (template.name, pattern, json.dumps(keys))
+        )
+
+        self._tables[template.name] = (pattern, keys)
+        return keys
+
+    def _insert(self, path, data, template):
+        '''Insert or replace row for *path* parsed to *data* by *template*.'''
+        keys = self._table(template)
+        flat = _flatten(data)
+        self._connection.execute(
+            'INSERT OR REPLACE INTO {0} (path{1}) VALUES (?{2})'.format(
+                _table_name(template.name),
+                ''.join(', {0}'.format(_quote(_column(key))) for key in keys),
+                ', ?' * len(keys)
+            ),
+            [path] + [_text(flat.get(key)) for key in keys]
+        )
+
+    def _delete(self, path):
+        '''Delete rows for exactly *path* and return count deleted.'''
+        count = 0
+        for name in self._tables:
+            count += self._connection.execute(
+                'DELETE FROM {0} WHERE path = ?'.format(_table_name(name)),
+                (path,)
+            ).rowcount
+
+        return count
+
+
+def _quote(identifier):
+    '''Return SQL quoted *identifier*.'''
+    return '"{0}"'.format(identifier.replace('"', '""'))
+
+
+def _table_name(name):
+    '''Return quoted table name for template *name*.'''
+    return _quote('template:{0}'.format(name))
+
+
+def _column(key):
+    '''Return column name for placeholder *key*.'''
+    return 'key:{0}'.format(key)
+
+
+def _under_clause():
+    '''Return SQL clause matching paths under a root.'''
+    # Paths under a root sort between the root followed by a separator and
+    # the root followed by the next character after the separator.
+    return '(path = ? OR (path >= ? AND path < ?))'
+
+
+def _under_arguments(root):
+    '''Return arguments for :func:`_under_clause` with *root*.'''
+    root = root.rstrip('/')
+    return [root, root + '/', root + chr(ord('/') + 1)]
+
+
+def _text(value):
+    '''Return *value* as text to store or compare.'''
+    if value is None or isinstance(value, basestring):
+        return value
+
+    return str(value)
+
+
+def _flatten(data, prefix=''):
+    '''Return mapping of dotted keys to values in nested *data*.'''
+    flat = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, '{0}{1}.'.format(prefix, key)))
+        else:
+            flat[prefix + key] = value
+
+    return flat
+
+
+def _nest(items):
+    '''Return nested data from ``(dotted key, value)`` *items*.'''
+    data = {}
+    for key, value in items:
+        target = data
+        parts = key.split('.')
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+
+        target[parts[-1]] = value
+
+    return data
@@ -19,3 +19,7 @@ class NotFound(Exception):
 
 class ResolveError(Exception):
     '''Raise when a template reference can not be resolved.'''
+
+
+class BacktrackingWarning(UserWarning):
+    '''Warn when a template pattern may backtrack excessively.'''
@@ -0,0 +1,184 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Instrumentation of internal operations.
+
+Hooks registered with :func:`add_hook` are called after each instrumented
+operation as ``hook(event, duration, details)`` where *event* is one of:
+
+* ``compile`` - construction of a compiled artefact for a template.
+* ``expand`` - expansion of template references in a pattern.
+* ``parse`` - a parse attempt by a single template.
+* ``format`` - a format attempt by a single template.
+* ``discover`` - import of a mount point during template discovery.
+
+*duration* is the time taken in seconds and *details* a dictionary
+describing the operation, such as the template name and whether it
+succeeded.
+
+When no hooks are registered instrumented code only pays for a check of
+:data:`hooks`.
+
+'''
+
+import json
+from collections import defaultdict
+from timeit import default_timer as timer
+
+#: Registered hooks. Use :func:`add_hook` and :func:`remove_hook` rather
+#: than modifying directly.
+hooks = []
+
+
+def add_hook(hook):
+    '''Register *hook* to be called after instrumented operations.'''
+    hooks.append(hook)
+
+
+def remove_hook(hook):
+    '''Unregister *hook*.
+
+    Raise :exc:`ValueError` if *hook* is not registered.
+
+    '''
+    hooks.remove(hook)
+
+
+def emit(event, duration, details):
+    '''Call registered hooks for *event* taking *duration* seconds.'''
+    for hook in list(hooks):
+        hook(event, duration, details)
+
+
+def call(event, function, arguments, details):
+    '''Return result of calling *function* with *arguments* and emit *event*.
+
+    *details* is updated with a ``success`` key recording whether *function*
+    returned without raising an exception.
+
+    '''
+    start = timer()
+    try:
+        result = function(*arguments)
+    except Exception:
+        details['success'] = False
+        emit(event, timer() - start, details)
+        raise
+
+    details['success'] = True
+    emit(event, timer() - start, details)
+    return result
+
+
+class Collector(object):
+    '''Hook aggregating counts and durations per event.
+
+    Use as a context manager to register for the duration of a block::
+
+        >>> with Collector() as collector:
+        ...     schema.parse(path)
+        >>> print collector.table()
+
+    '''
+
+    def __init__(self, key=None):
+        '''Initialise empty collector.
+
+        If *key* is set it should be a detail name, such as ``template``, used
+        to aggregate each event separately per value of that detail.
+
+        '''
+        super(Collector, self).__init__()
+        self.key = key
+        self._entries = defaultdict(lambda: [0, 0, 0.0, 0.0])
+
+    def __call__(self, event, duration, details):
+        '''Record *event* taking *duration* seconds.'''
+        if self.key is not None:
+            event = (event, details.get(self.key))
+
+        entry = self._entries[event]
+        entry[0] += 1
+        if not details.get('success', True):
+            entry[1] += 1
+        entry[2] += duration
+        if duration > entry[3]:
+            entry[3] = duration
+
+    def __enter__(self):
+        '''Register collector as a hook.'''
+        add_hook(self)
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        '''Unregister collector.'''
+        remove_hook(self)
+
+    def reset(self):
+        '''Discard all recorded events.'''
+        self._entries.clear()
+
+    def summary(self):
+        '''Return list of dictionaries summarising each event.
+
+        Entries are ordered by descending total time.
+
+        '''
+        summary = []
+        for event, (count, failures, total, maximum) in self._entries.items():
+            entry = {
+                'event': event,
+                'count': count,
+                'failures': failures,
+                'total': total,
+                'mean': total / count,
+                'max': maximum
+            }
+            if self.key is not None:
+                entry['event'], entry[self.key] = event
+
+            summary.append(entry)
+
+        summary.sort(key=lambda entry: -entry['total'])
+        return summary
+
+    def json(self, **kwargs):
+        '''Return summary as a JSON string.
+
+        *kwargs* are passed to :func:`json.dumps`.
+
+        '''
+        return json.dumps(self.summary(), **kwargs)
+
+    def table(self):
+        '''Return summary formatted as a text table.'''
+        columns = ['event']
+        if self.key is not None:
+            columns.append(self.key)
+
+        rows = [
+            columns + [
+                'count', 'failures', 'total (s)', 'mean (ms)', 'max (ms)'
+            ]
+        ]
+        for entry in self.summary():
+            rows.append([str(entry[column]) for column in columns] + [
+                str(entry['count']),
+                str(entry['failures']),
+                '{0:.6f}'.format(entry['total']),
+                '{0:.4f}'.format(entry['mean'] * 1000),
+                '{0:.4f}'.format(entry['max'] * 1000)
+            ])
+
+        widths = [
+            max(len(row[index]) for row in rows)
+            for index in range(len(rows[0]))
+        ]
+
+        return '\n'.join(
+            '  '.join(
+                value.ljust(width) for value, width in zip(row, widths)
+            ).rstrip()
+            for row in rows
+        )
@@ -0,0 +1,184 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Parsing of paths from memory mapped listing files.'''
+
+import re
+import mmap
+
+from .error import ParseError
+
+
+class Listing(object):
+    '''Listing file of paths separated by a separator character.
+
+    The file is memory mapped rather than read so that arbitrarily large
+    listings can be processed without loading them. When parsing, templates
+    are matched against the mapped bytes directly and only records that
+    match become Python strings.
+
+    Positions are byte offsets into the file. :attr:`offset` is the offset of
+    the next record to be processed, so after handling each result it can be
+    stored as a checkpoint and passed as *start* to resume an interrupted run
+    from that point.
+
+    '''
+
+    def __init__(self, filepath, separator='\n'):
+        '''Initialise with listing at *filepath* separated by *separator*.
+
+        *separator* is typically a newline or, for listings written by tools
+        such as ``find -print0``, a NUL character.
+
+        '''
+        super(Listing, self).__init__()
+        self.filepath = filepath
+        self.separator = separator
+        self.offset = 0
+
+        self._file = open(filepath, 'rb')
+        try:
+            self._map = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        except ValueError:
+            # Empty files cannot be mapped.
+            self._map = None
+
+    def __enter__(self):
+        '''Return listing for use as a context manager.'''
+        return self
+
+    def __exit__(self, exception_type, exception_value, traceback):
+        '''Close listing on leaving context.'''
+        self.close()
+
+    def __len__(self):
+        '''Return size of listing in bytes.'''
+        if self._map is None:
+            return 0
+
+        return len(self._map)
+
+    def close(self):
+        '''Close listing releasing the mapped file.'''
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+        self._file.close()
+
+    def records(self, start=0):
+        '''Yield ``(offset, path)`` for each record from offset *start*.
+
+        Empty records, such as one after a trailing separator, are skipped.
+
+        '''
+        buffer = self._map
+        for offset, end in self._spans(start):
+            yield offset, buffer[offset:end]
+
+    def parse(self, templates, start=0):
+        '''Parse records from offset *start* against *templates*.
+
+        Yield ``(offset, path, data, template)`` for each record matched by a
+        template, using the first template to match in the order given.
+        Records not matched by any template are skipped without being copied
+        out of the listing.
+
+        Results are identical to parsing each path as a byte string with
+        :py:meth:`~lucidity.template.Template.parse`. Templates are compiled
+        when parsing starts so changes to referenced templates after that
+        point are not reflected.
+
+        '''
+        plans = [_plan(template) for template in templates]
+        buffer = self._map
+
+        for offset, end in self._spans(start):
+            for template, method, literals in plans:
+                if literals is not None and not _contains_in_order(
+                    buffer, literals, offset, end
+                ):
+                    continue
+
+                match = method(buffer, offset, end)
+                if not match:
+                    continue
+
+                try:
+                    data = template._extract(match.groupdict())
+                except ParseError:
+                    continue
+
+                yield offset, buffer[offset:end], data, template
+                break
+
+    def _spans(self, start):
+        '''Yield ``(offset, end)`` of each non empty record from *start*.
+
+        :attr:`offset` is advanced past each record before it is yielded.
+
+        '''
+        self.offset = start
+        buffer = self._map
+        if buffer is None:
+            return
+
+        separator = self.separator
+        size = len(buffer)
+        position = start
+        while position < size:
+            end = buffer.find(separator, position)
+            if end == -1:
+                end = size
+
+            offset = position
+            position = end + len(separator)
+            self.offset = min(position, size)
+
+            if end > offset:
+                yield offset, end
+
+
+def parse_listing(filepath, templates, separator='\n', start=0):
+    '''Parse listing at *filepath* against *templates*.
+
+    Yield ``(offset, path, data, template)`` for each record matched. See
+    :class:`Listing` for details.
+
+    '''
+    with Listing(filepath, separator=separator) as listing:
+        for result in listing.parse(templates, start=start):
+            yield result
+
+
+def _plan(template):
+    '''Return ``(template, method, literals)`` to match *template* in place.
+
+    *method* should be called with the buffer and the start and end offsets
+    of a record. *literals* is the literal text to check for first, or None.
+
+    '''
+    regex, literals, _ = template._byte_parser()
+
+    # A start anchor only matches at the real start of the buffer, so match
+    # the unanchored expression at the record offset instead.
+    if template.anchor is not None and template.anchor & template.ANCHOR_START:
+        return template, re.compile(regex.pattern[1:]).match, literals
+
+    return template, regex.search, literals
+
+
+def _contains_in_order(buffer, literals, start, end):
+    '''Return whether *literals* appear in order between *start* and *end*.'''
+    position = start
+    for literal in literals:
+        position = buffer.find(literal, position, end)
+        if position == -1:
+            return False
+
+        position += len(literal)
+
+    return True
@@ -0,0 +1,198 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Schemas layering overrides on top of a shared base schema.'''
+
+import copy
+
+from .schema import Schema, _load_dict, _warn_backtracking
+from .vendor import yaml
+
+
+class OverlaySchema(Schema):
+    '''Schema overriding some templates and references of a base schema.
+
+    Lookup, parsing and formatting behave as for a :py:class:`~lucidity.schema.Schema`
+    holding the templates and references of the base merged with the overrides. Templates and references of the base
+    that neither are overridden nor depend on an overridden name, directly or through other references, are the
+    same instances as in the base and so share its compiled state. Those that do depend on an overridden name are
+    copied so that they resolve references against this schema instead.
+
+    Changes to this schema never affect the base. Changes to the base after the overlay was created are reflected
+    once :meth:`refresh` is called.
+    '''
+
+    def __init__(self, base, templates=None, references=None, cache=None,
+                 statistics=None, adaptive=False, exclusions=False):
+        '''Initialise overlay of *base* with optional *templates* and *references* overriding those of the same name.
+
+        *base* must be a :py:class:`~lucidity.schema.Schema`. *templates* and *references* must be lists of
+        instantiated :py:class:`~lucidity.template.Template` objects. See :py:class:`~lucidity.schema.Schema` for
+        details of the remaining arguments.
+        '''
+        self.base = base
+        self._template_overrides = {}
+        self._reference_overrides = {}
+        self._removed = set()
+
+        super(OverlaySchema, self).__init__(
+            cache=cache, statistics=statistics, adaptive=adaptive,
+            exclusions=exclusions
+        )
+
+        for template in templates or []:
+            template.template_resolver = self.template_resolver
+            self._template_overrides[template.name] = template
+
+        for reference in references or []:
+            reference.template_resolver = self.template_resolver
+            self._reference_overrides[reference.name] = reference
+
+        self.refresh()
+
+    def __setitem__(self, key, value):
+        # Record override and merge again as dependents may need copying.
+        assert key == value.name
+        super(OverlaySchema, self).__setitem__(key, value)
+        self._template_overrides[key] = value
+        self._removed.discard(key)
+        self.refresh()
+
+    def __delitem__(self, key):
+        super(OverlaySchema, self).__delitem__(key)
+        self._template_overrides.pop(key, None)
+        if key in self.base:
+            self._removed.add(key)
+
+        self.refresh()
+
+    def clear(self):
+        # Remove every template, including those only present in the base.
+        self._removed.update(self.base)
+        self._template_overrides.clear()
+        self.refresh()
+
+    def add_reference(self, reference):
+        '''Add the *reference* to this overlay, overriding any reference of the same name in the base.
+
+        See: :py:meth:`~lucidity.schema.Schema.add_reference` for more information.
+        '''
+        super(OverlaySchema, self).add_reference(reference)
+        self._reference_overrides[reference.name] = reference
+        self.refresh()
+
+    def overrides(self):
+        '''Return names of templates and references overridden or removed by this overlay.'''
+        return (
+            set(self._template_overrides) | set(self._reference_overrides) |
+            self._removed
+        )
+
+    def shared(self):
+        '''Return names of templates shared unchanged with the base.'''
+        return set(
+            name for name, template in self.items()
+            if self.base.get(name) is template
+        )
+
+    def refresh(self):
+        '''Merge the current templates and references of the base with the overrides.'''
+        depends = _dependency_test(self.base, self.overrides())
+
+        dict.clear(self)
+        for name, template in self.base.items():
+            if name in self._template_overrides or name in self._removed:
+                continue
+
+            if depends(template):
+                template = _copy(template, self.template_resolver)
+
+            dict.__setitem__(self, name, template)
+
+        for name, template in self._template_overrides.items():
+            dict.__setitem__(self, name, template)
+
+        references = {}
+        for name, reference in self.base.references.items():
+            if name in self._reference_overrides:
+                continue
+
+            if depends(reference):
+                reference = _copy(reference, self.template_resolver)
+
+            references[name] = reference
+
+        references.update(self._reference_overrides)
+        self.references = references
+
+        self._invalidate()
+
+    @classmethod
+    def from_dict(cls, data, base=None):
+        '''Instantiate an overlay of *base* with overrides from the *data* dictionary.
+
+        *data* has the same structure as for :py:meth:`~lucidity.schema.Schema.from_dict`. If *base* is not
+        supplied an empty schema is used. Overrides may reference templates and references of the base.
+        '''
+        if base is None:
+            base = Schema()
+
+        templates, references = _load_dict(data)
+        overlay = cls(base, templates, references)
+        _warn_backtracking(templates)
+        return overlay
+
+    @classmethod
+    def from_yaml(cls, filepath, base=None):
+        '''Instantiate an overlay of *base* with overrides from the YAML file at the given *filepath*.
+
+        See: :py:meth:`from_dict` for more information.
+        '''
+        with open(filepath, 'r') as f:
+            data = yaml.safe_load(f)
+
+        return cls.from_dict(data, base=base)
+
+
+def _dependency_test(schema, names):
+    '''Return function testing whether a template in *schema* depends on any of *names*.
+
+    A template depends on a name if it references it, or references a template or reference in *schema* that
+    depends on it.
+    '''
+    # Templates take precedence over references when resolving.
+    items = dict(schema.references)
+    items.update(schema)
+
+    resolved = {}
+
+    def depends(template, visiting):
+        '''Return whether *template* depends on any of *names*.'''
+        for reference in template.references():
+            if reference in names:
+                return True
+
+            if reference not in resolved:
+                item = items.get(reference)
+                if item is None or reference in visiting:
+                    continue
+
+                visiting.add(reference)
+                resolved[reference] = depends(item, visiting)
+                visiting.discard(reference)
+
+            if resolved[reference]:
+                return True
+
+        return False
+
+    return lambda template: depends(template, set())
+
+
+def _copy(template, resolver):
+    '''Return copy of *template* resolving references with *resolver*.'''
+    copied = copy.copy(template)
+    copied._compiled = {}
+    copied.template_resolver = resolver
+    return copied
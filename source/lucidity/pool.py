@@ -0,0 +1,107 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Sharing of compiled template artefacts across templates.
+
+Templates with the same expanded pattern, anchor and placeholder settings
+compile identical regular expressions, parsers and formatters. Each template
+looks these up in the :data:`shared` pool when first needed, so that copies
+of a schema loaded side by side, or templates referencing the same patterns,
+compile each artefact once.
+
+The pool only holds weak references. An artefact is released once no
+template uses it, so memory is reclaimed when schemas are dropped.
+
+'''
+
+import weakref
+
+
+class Pool(object):
+    '''Pool of constructed values held by weak reference.
+
+    Counters for :attr:`hits` and :attr:`misses` are maintained for
+    monitoring effectiveness.
+
+    '''
+
+    def __init__(self):
+        '''Initialise empty pool.'''
+        super(Pool, self).__init__()
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = weakref.WeakValueDictionary()
+
+    def __repr__(self):
+        '''Return unambiguous representation of pool.'''
+        return '{0}(size={1}, hits={2}, misses={3})'.format(
+            self.__class__.__name__, len(self), self.hits, self.misses
+        )
+
+    def __len__(self):
+        '''Return number of values currently in use.'''
+        return len(self._entries)
+
+    def info(self):
+        '''Return dictionary of counters, hit rate and size.'''
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate(),
+            'size': len(self)
+        }
+
+    def hit_rate(self):
+        '''Return fraction of lookups that reused a value, or None if none.'''
+        lookups = self.hits + self.misses
+        if not lookups:
+            return None
+
+        return float(self.hits) / lookups
+
+    def clear(self):
+        '''Remove all entries, leaving counters unchanged.
+
+        Values already obtained remain in use by their holders.
+
+        '''
+        self._entries.clear()
+
+    def get(self, key, construct):
+        '''Return :class:`Entry` holding value for *key*.
+
+        If no value is pooled for *key* then *construct* is called without
+        arguments to create one. The returned entry must be kept for as long
+        as the value is used, as the pool only refers to it weakly.
+
+        '''
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        entry = Entry(construct())
+        self._entries[key] = entry
+        return entry
+
+
+class Entry(object):
+    '''Holder of a pooled value.
+
+    Values such as tuples and None cannot be weakly referenced themselves, so
+    the pool refers to their holder instead.
+
+    '''
+
+    __slots__ = ('value', '__weakref__')
+
+    def __init__(self, value):
+        '''Initialise holding *value*.'''
+        self.value = value
+
+
+#: Pool used by all templates.
+shared = Pool()
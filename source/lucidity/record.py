@@ -0,0 +1,272 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Compact records for parsed data.'''
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+class _Mapping(object):
+    '''Read only mapping methods for slotted classes.
+
+    :class:`~collections.Mapping` is not subclassed as it does not define
+    slots on all supported Python versions, which would add a dictionary to
+    every instance.
+
+    '''
+
+    __slots__ = ()
+
+    __hash__ = None
+
+    def __contains__(self, key):
+        '''Return whether *key* is present.'''
+        try:
+            self[key]
+        except KeyError:
+            return False
+
+        return True
+
+    def __eq__(self, other):
+        '''Return whether equal to *other* mapping.'''
+        if not isinstance(other, Mapping):
+            return NotImplemented
+
+        return dict(self.items()) == dict(other.items())
+
+    def __ne__(self, other):
+        '''Return whether not equal to *other* mapping.'''
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+
+        return not equal
+
+    def get(self, key, default=None):
+        '''Return value for *key* or *default* if not present.'''
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        '''Return list of keys.'''
+        return list(self)
+
+    def values(self):
+        '''Return list of values.'''
+        return [self[key] for key in self]
+
+    def items(self):
+        '''Return list of ``(key, value)`` pairs.'''
+        return [(key, self[key]) for key in self]
+
+
+class Record(_Mapping):
+    '''Compact, read only result of a parse.
+
+    Values are stored in slots rather than nested dictionaries. Access is
+    supported as a mapping, using the same structure as
+    :py:meth:`~lucidity.template.Template.parse`, or by attribute::
+
+        >>> record['job']['code']
+        'monty'
+        >>> record.job.code
+        'monty'
+
+    Dot notation keys, such as ``record['job.code']``, are also accepted.
+
+    Subclasses are created per template by :func:`create_record_type`.
+
+    '''
+
+    __slots__ = ()
+
+    #: Template the record type was created for.
+    template = None
+
+    #: Placeholder keys, using dot notation, in slot order.
+    fields = ()
+
+    # Mapping of placeholder key to slot name.
+    _slots = {}
+
+    # Nested mapping of key part to either a placeholder key or another
+    # nested mapping.
+    _tree = {}
+
+    def __init__(self, values):
+        '''Initialise from flat mapping of placeholder key to value.
+
+        Placeholders missing from *values* are set to None.
+
+        '''
+        for key, slot in self._slots.items():
+            object.__setattr__(self, slot, values.get(key))
+
+    def __setattr__(self, name, value):
+        '''Prevent modification of record.'''
+        raise AttributeError(
+            '{0} is read only.'.format(self.__class__.__name__)
+        )
+
+    def __repr__(self):
+        '''Return unambiguous representation of record.'''
+        return '{0}({1!r})'.format(self.__class__.__name__, self.to_dict())
+
+    def __getitem__(self, key):
+        '''Return value or nested view for *key*.'''
+        return _lookup(self, self._tree, key)
+
+    def __getattr__(self, name):
+        '''Return value or nested view for *name*.'''
+        try:
+            return _lookup(self, self._tree, name)
+        except KeyError:
+            raise AttributeError(name)
+
+    def __iter__(self):
+        '''Iterate over top level keys.'''
+        return iter(self._tree)
+
+    def __len__(self):
+        '''Return number of top level keys.'''
+        return len(self._tree)
+
+    def __reduce__(self):
+        '''Support pickling by reducing to dictionary form.'''
+        return (dict, (self.to_dict(),))
+
+    def get_value(self, key):
+        '''Return value for dot notation placeholder *key*.'''
+        try:
+            slot = self._slots[key]
+        except KeyError:
+            raise KeyError(key)
+
+        return object.__getattribute__(self, slot)
+
+    def to_dict(self):
+        '''Return data as nested dictionaries.'''
+        return _to_dict(self, self._tree)
+
+
+class RecordView(_Mapping):
+    '''Read only view of a nested level of a :class:`Record`.'''
+
+    __slots__ = ('_record', '_tree')
+
+    def __init__(self, record, tree):
+        '''Initialise view of *record* at nested *tree*.'''
+        object.__setattr__(self, '_record', record)
+        object.__setattr__(self, '_tree', tree)
+
+    def __setattr__(self, name, value):
+        '''Prevent modification of view.'''
+        raise AttributeError(
+            '{0} is read only.'.format(self.__class__.__name__)
+        )
+
+    def __repr__(self):
+        '''Return unambiguous representation of view.'''
+        return '{0}({1!r})'.format(self.__class__.__name__, self.to_dict())
+
+    def __getitem__(self, key):
+        '''Return value or nested view for *key*.'''
+        return _lookup(self._record, self._tree, key)
+
+    def __getattr__(self, name):
+        '''Return value or nested view for *name*.'''
+        try:
+            return _lookup(self._record, self._tree, name)
+        except KeyError:
+            raise AttributeError(name)
+
+    def __iter__(self):
+        '''Iterate over keys at this level.'''
+        return iter(self._tree)
+
+    def __len__(self):
+        '''Return number of keys at this level.'''
+        return len(self._tree)
+
+    def to_dict(self):
+        '''Return data at this level as nested dictionaries.'''
+        return _to_dict(self._record, self._tree)
+
+
+Mapping.register(Record)
+Mapping.register(RecordView)
+
+
+def create_record_type(template, keys):
+    '''Return new :class:`Record` subclass for *template* with *keys*.
+
+    *keys* should be placeholder names using dot notation for nested
+    placeholders.
+
+    '''
+    fields = tuple(sorted(keys))
+    slots = {}
+    tree = {}
+    for index, key in enumerate(fields):
+        # Use positional slot names to avoid clashing with mapping methods.
+        slots[key] = '_{0}'.format(index)
+
+        target = tree
+        parts = key.split('.')
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+
+        target[parts[-1]] = key
+
+    name = '{0}Record'.format(
+        ''.join(
+            character for character in template.name.title()
+            if character.isalnum()
+        )
+    )
+
+    return type(str(name), (Record,), {
+        '__slots__': tuple(slots[key] for key in fields),
+        'template': template,
+        'fields': fields,
+        '_slots': slots,
+        '_tree': tree
+    })
+
+
+def _lookup(record, tree, key):
+    '''Return value or view from *record* for *key* at nested *tree*.'''
+    try:
+        target = tree[key]
+    except KeyError:
+        # Support dot notation keys relative to this level.
+        target = tree
+        for part in key.split('.'):
+            try:
+                target = target[part]
+            except (KeyError, TypeError):
+                raise KeyError(key)
+
+    if isinstance(target, dict):
+        return RecordView(record, target)
+
+    return record.get_value(target)
+
+
+def _to_dict(record, tree):
+    '''Return nested dictionaries for *record* at nested *tree*.'''
+    data = {}
+    for key, target in tree.items():
+        if isinstance(target, dict):
+            data[key] = _to_dict(record, target)
+        else:
+            data[key] = record.get_value(target)
+
+    return data
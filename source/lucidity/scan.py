@@ -0,0 +1,305 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Incremental scanning of directory trees into an index.
+
+A :class:`Scanner` records a snapshot of each directory scanned, holding its
+modification time, device and inode along with the entries parsed from it,
+in the same database as the :py:class:`~lucidity.database.Index` of parsed
+results. Adding, removing or renaming an entry changes the modification time
+of its directory, so on rescanning only directories whose identity changed
+are listed and parsed again. Unchanged directories cost a single stat.
+
+'''
+
+import os
+import sys
+import json
+import stat
+import time
+
+from .batch import BatchParser
+from .database import _quote, _under_clause, _under_arguments
+
+#: Change reported for an entry not present in the previous scan.
+ADDED = 'added'
+
+#: Change reported for an entry no longer present.
+REMOVED = 'removed'
+
+#: Change reported for an entry parsed differently than in the previous scan.
+CHANGED = 'changed'
+
+# Directories modified this close to a scan, in seconds, are listed again on
+# the next scan as later changes may not alter a coarse modification time.
+_RACE_WINDOW = 2.0
+
+
+class Scanner(object):
+    '''Scan directory trees against templates, reporting changes.
+
+    Snapshots are stored in the database of the index and updated together
+    with the indexed results, so an interrupted scan leaves both consistent
+    and is completed by the next scan.
+
+    Symbolic links are parsed as entries but not followed.
+
+    '''
+
+    #: Name of table recording scanned directories.
+    DIRECTORIES_TABLE = 'lucidity_directories'
+
+    #: Name of table recording templates each root was scanned with.
+    ROOTS_TABLE = 'lucidity_roots'
+
+    def __init__(self, index, templates):
+        '''Initialise scanner updating *index* with *templates*.
+
+        *index* should be a :py:class:`~lucidity.database.Index`. Each entry
+        is parsed with the first of *templates* to match it.
+
+        '''
+        super(Scanner, self).__init__()
+        self.index = index
+        self.templates = list(templates)
+
+        self._parser = BatchParser(self.templates)
+        self._connection = index._connection
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS {0} ('
+            'path TEXT PRIMARY KEY, device INTEGER, inode INTEGER, '
+            'mtime REAL, subdirectories TEXT, entries TEXT)'
+            .format(_quote(self.DIRECTORIES_TABLE))
+        )
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS {0} ('
+            'root TEXT PRIMARY KEY, signature TEXT)'
+            .format(_quote(self.ROOTS_TABLE))
+        )
+        self._connection.commit()
+
+    def scan(self, root):
+        '''Scan directory tree at *root* and yield changes since last scan.
+
+        Yield ``(change, path, data, template_name)`` for each entry under
+        *root* that was :data:`ADDED`, :data:`REMOVED` or :data:`CHANGED`.
+        Entries matching no template are tracked but not reported. On the
+        first scan of *root* every matching entry is reported as added.
+
+        If the templates differ from those *root* was last scanned with then
+        every directory is listed and parsed again, with entries parsed
+        differently reported as changed.
+
+        Paths are byte strings, with a unicode *root* encoded using the file
+        system encoding. The index is updated as changes are yielded and
+        committed when the scan finishes or is abandoned.
+
+        '''
+        if isinstance(root, unicode):
+            root = root.encode(sys.getfilesystemencoding() or 'utf-8')
+
+        if root != '/':
+            root = root.rstrip('/')
+
+        started = time.time()
+        signature = self._signature()
+        trusted = self._connection.execute(
+            'SELECT 1 FROM {0} WHERE root = ? AND signature = ?'
+            .format(_quote(self.ROOTS_TABLE)),
+            (root, signature)
+        ).fetchone() is not None
+
+        visited = set()
+        try:
+            pending = [root]
+            while pending:
+                directory = pending.pop()
+                visited.add(directory)
+
+                snapshot = self._snapshot(directory)
+                try:
+                    status = os.stat(directory)
+                except OSError:
+                    status = None
+
+                if status is None or not stat.S_ISDIR(status.st_mode):
+                    visited.discard(directory)
+                    continue
+
+                identity = (status.st_dev, status.st_ino, status.st_mtime)
+                if (
+                    trusted and snapshot is not None
+                    and snapshot[0] == identity
+                ):
+                    pending.extend(reversed(snapshot[1]))
+                    continue
+
+                subdirectories, entries = self._list(directory)
+                if entries is None:
+                    # Unreadable directories are treated as removed.
+                    visited.discard(directory)
+                    continue
+
+                previous = {}
+                if snapshot is not None:
+                    previous = snapshot[2]
+
+                for change in self._update(previous, entries):
+                    yield change
+
+                if started - status.st_mtime < _RACE_WINDOW:
+                    identity = identity[:2] + (None,)
+
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO {0} (path, device, inode, mtime, '
+                    'subdirectories, entries) VALUES (?, ?, ?, ?, ?, ?)'
+                    .format(_quote(self.DIRECTORIES_TABLE)),
+                    (directory,) + identity + (
+                        _dumps(subdirectories), _dumps(entries)
+                    )
+                )
+
+                pending.extend(reversed(subdirectories))
+
+            for change in self._prune(root, visited):
+                yield change
+
+            self._connection.execute(
+                'INSERT OR REPLACE INTO {0} (root, signature) VALUES (?, ?)'
+                .format(_quote(self.ROOTS_TABLE)),
+                (root, signature)
+            )
+
+        finally:
+            self._connection.commit()
+
+    def _signature(self):
+        '''Return signature of templates to detect changes to them.'''
+        return json.dumps([
+            [
+                template.name, template.expanded_pattern(), template.anchor,
+                template.duplicate_placeholder_mode
+            ]
+            for template in self.templates
+        ])
+
+    def _snapshot(self, directory):
+        '''Return ``(identity, subdirectories, entries)`` for *directory*.
+
+        Return None if *directory* has not been scanned before.
+
+        '''
+        row = self._connection.execute(
+            'SELECT device, inode, mtime, subdirectories, entries FROM {0} '
+            'WHERE path = ?'.format(_quote(self.DIRECTORIES_TABLE)),
+            (directory,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        return tuple(row[:3]), _loads(row[3]), _loads(row[4])
+
+    def _list(self, directory):
+        '''Return ``(subdirectories, entries)`` listed from *directory*.
+
+        *entries* maps each path to ``[template_name, data]``, with both None
+        if no template matched. Return ``(None, None)`` if *directory* cannot
+        be listed.
+
+        '''
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            return None, None
+
+        subdirectories = []
+        entries = {}
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                mode = os.lstat(path).st_mode
+            except OSError:
+                continue
+
+            if stat.S_ISDIR(mode):
+                subdirectories.append(path)
+
+            entries[path] = [None, None]
+            for data, template in self._parser.parse_iter(path):
+                entries[path] = [template.name, data]
+                break
+
+        return subdirectories, entries
+
+    def _update(self, previous, current):
+        '''Yield changes from *previous* to *current* entries and index them.'''
+        templates = dict(
+            (template.name, template) for template in self.templates
+        )
+
+        for path in sorted(set(previous) | set(current)):
+            old = previous.get(path, [None, None])
+            new = current.get(path, [None, None])
+            if old == new:
+                continue
+
+            if old[0] is not None:
+                self.index._delete(path)
+
+            if new[0] is not None:
+                self.index._insert(path, new[1], templates[new[0]])
+
+            if old[0] is None:
+                yield ADDED, path, new[1], new[0]
+            elif new[0] is None:
+                yield REMOVED, path, old[1], old[0]
+            else:
+                yield CHANGED, path, new[1], new[0]
+
+    def _prune(self, root, visited):
+        '''Yield removals for directories under *root* not in *visited*.'''
+        table = _quote(self.DIRECTORIES_TABLE)
+        stale = [
+            directory for (directory,) in self._connection.execute(
+                'SELECT path FROM {0} WHERE {1}'.format(table, _under_clause()),
+                _under_arguments(root)
+            )
+            if directory not in visited
+        ]
+
+        for directory in sorted(stale):
+            snapshot = self._snapshot(directory)
+            for change in self._update(snapshot[2], {}):
+                yield change
+
+            self._connection.execute(
+                'DELETE FROM {0} WHERE path = ?'.format(table), (directory,)
+            )
+
+
+def _dumps(value):
+    '''Return JSON for *value* preserving byte strings.'''
+    # Decoding as Latin-1 maps every byte to a character and back again.
+    return json.dumps(value, encoding='latin-1')
+
+
+def _loads(text):
+    '''Return value from JSON *text* written by :func:`_dumps`.'''
+    return _restore(json.loads(text))
+
+
+def _restore(value):
+    '''Return *value* with unicode strings encoded back to byte strings.'''
+    if isinstance(value, unicode):
+        return value.encode('latin-1')
+
+    if isinstance(value, list):
+        return [_restore(item) for item in value]
+
+    if isinstance(value, dict):
+        return dict(
+            (_restore(key), _restore(item)) for key, item in value.items()
+        )
+
+    return value
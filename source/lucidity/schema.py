@@ -2,22 +2,53 @@
 # :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
 # :license: See LICENSE.txt.
 
+import warnings
+
 from . import Template, Resolver
+from .template import _iter_records
 from . import error
 from .vendor import yaml
 from .core import *
+from .cache import canonical
+from .batch import parse_many
+from .statistics import AdaptiveOrder
+from .analysis import ExclusionGraph, backtracking_risks
 
 
 class Schema(dict):
     '''A schema.'''
 
-    def __init__(self, templates=None):
+    def __init__(self, templates=None, cache=None, statistics=None,
+                 adaptive=False, exclusions=False):
         '''Initialise with optional *templates*.
 
         *templates* must be a list of instantiated :py:class:`~lucidity.template.Template` objects.
         Similar to the one returned from :py:function:`~luciditiy.discover_templates`.
+
+        *cache* may be a :py:class:`~lucidity.cache.Cache` used to memoize :meth:`parse`, :meth:`parse_all`,
+        :meth:`format` and :meth:`format_all`. It can also be set later using the :attr:`cache` attribute and may
+        be shared with other schemas. Entries of this schema are cleared automatically whenever templates or
+        references change.
+
+        *statistics* may be a :py:class:`~lucidity.statistics.Statistics` used to record parse attempts, hits and
+        time per template. If *adaptive* is also True then :meth:`parse` tries templates in an
+        :py:class:`~lucidity.statistics.AdaptiveOrder`, which moves templates with a high hit rate earlier only
+        where that cannot change the result. Both can also be set later using the attributes of the same name.
+
+        If *exclusions* is True then :meth:`parse_iter` and :meth:`parse_all` skip templates that the
+        :meth:`exclusion_graph` shows cannot match alongside an earlier match. Each row of the graph is computed the
+        first time its template matches, at a cost linear in the number of templates, so this only pays off when
+        the same templates match many paths. It can also be set later using the :attr:`exclusions` attribute.
         '''
         super(Schema, self).__init__()
+        self.cache = cache
+        # Prefix of cache keys identifying this schema in a shared cache.
+        self._cache_namespace = (object(),)
+        self.statistics = statistics
+        self.adaptive = adaptive
+        self.exclusions = exclusions
+        self._adaptive_order = None
+        self._exclusion_graph = None
         self.references = {}
         self.template_resolver = SchemaReferenceResolver(self)
         if templates is not None:
@@ -30,6 +61,65 @@ class Schema(dict):
         assert isinstance(value, Template)
         assert key == value.name
         super(Schema, self).__setitem__(key, value)
+        self._invalidate()
+
+    def __delitem__(self, key):
+        super(Schema, self).__delitem__(key)
+        self._invalidate()
+
+    # Route the remaining mutating dict methods through item assignment and
+    # deletion so that memoized results are always invalidated.
+
+    def pop(self, key, *default):
+        if key not in self and default:
+            return default[0]
+
+        value = self[key]
+        del self[key]
+        return value
+
+    def popitem(self):
+        if not self:
+            raise KeyError('popitem(): schema is empty')
+
+        key = next(iter(self))
+        return (key, self.pop(key))
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        super(Schema, self).clear()
+        self._invalidate()
+
+    def _invalidate(self):
+        '''Clear memoized results after templates or references change.'''
+        if self.cache is not None:
+            self.cache.clear(prefix=self._cache_namespace)
+
+        self._adaptive_order = None
+        self._exclusion_graph = None
+
+    def _parse_templates(self):
+        '''Return templates in the order to try for a first match parse.'''
+        if not self.adaptive or self.statistics is None:
+            return self.templates
+
+        order = self._adaptive_order
+        if order is None or order.statistics is not self.statistics:
+            graph = self.exclusion_graph()
+            order = self._adaptive_order = AdaptiveOrder(
+                graph.templates, self.statistics, exclusions=graph
+            )
+
+        return order.templates()
 
     def add_reference(self, reference):
         '''Add the *reference* to this Schema instance.
@@ -41,6 +131,7 @@ class Schema(dict):
         assert isinstance(reference, Template)
         reference.template_resolver = self.template_resolver
         self.references[reference.name] = reference
+        self._invalidate()
 
     def add_template(self, template):
         '''Add the *template* to this Schema instance.
@@ -56,29 +147,196 @@ class Schema(dict):
 
         See: :py:function:`~luciditiy.parse` for more information.
         '''
-        return parse(path, self.templates)
+        if self.cache is not None:
+            return self.cache.call(
+                self._cache_namespace + ('parse', path),
+                lambda: parse(
+                    path, self._parse_templates(), statistics=self.statistics
+                ),
+                errors=(error.ParseError,)
+            )
+
+        return parse(
+            path, self._parse_templates(), statistics=self.statistics
+        )
+
+    def parse_record(self, path, pool=None):
+        '''Parse *path* against all templates in this schema and return first correct match as a compact record.
+
+        Return ``(record, template)``. See: :py:meth:`~lucidity.template.Template.parse_record` for more information.
+        '''
+        for template in self.templates:
+            try:
+                return (template.parse_record(path, pool=pool), template)
+            except error.ParseError:
+                continue
+
+        raise error.ParseError(
+            'Path {0!r} did not match any of the supplied template patterns.'
+            .format(path)
+        )
 
     def parse_all(self, path):
         '''Parse *path* against all templates in this schema and returns a list of all matches.
 
         This is equivalent to performing ``list(schema.parse_iter(path))``.
         '''
+        if self.cache is not None:
+            return self.cache.call(
+                self._cache_namespace + ('parse_all', path),
+                lambda: list(self.parse_iter(path))
+            )
+
         return list(self.parse_iter(path))
 
     def parse_iter(self, path):
         '''Parse *path* against all templates in this schema and yields all matches.
 
+        If :attr:`exclusions` is True then templates that the :meth:`exclusion_graph` shows cannot match alongside
+        an earlier match are skipped.
+
         See: :py:function:`~luciditiy.parse_iter` for more information.
         '''
-        return parse_iter(path, self.templates)
+        exclusions = None
+        if self.exclusions:
+            exclusions = self.exclusion_graph()
+
+        return parse_iter(
+            path, self.templates, statistics=self.statistics,
+            exclusions=exclusions
+        )
+
+    def exclusion_graph(self):
+        '''Return :py:class:`~lucidity.analysis.ExclusionGraph` for the templates in this schema.
+
+        The graph is created on first use and discarded whenever templates or references change.
+        '''
+        if self._exclusion_graph is None:
+            self._exclusion_graph = ExclusionGraph(self.templates)
+
+        return self._exclusion_graph
+
+    def ambiguous_pairs(self, samples=100, seed=0):
+        '''Return list of ``(template_a, template_b, path)`` for template pairs in this schema that both parse a path.
+
+        See: :py:meth:`~lucidity.analysis.ExclusionGraph.ambiguous_pairs` for more information.
+        '''
+        return self.exclusion_graph().ambiguous_pairs(samples=samples, seed=seed)
+
+    def match_prefix_all(self, path):
+        '''Match partial *path* against all templates in this schema and return a list of viable matches.
+
+        This is equivalent to performing ``list(schema.match_prefix_iter(path))``.
+        '''
+        return list(self.match_prefix_iter(path))
+
+    def match_prefix_iter(self, path):
+        '''Match partial *path* against all templates in this schema and yields all viable matches.
+
+        See: :py:function:`~luciditiy.match_prefix_iter` for more information.
+        '''
+        return match_prefix_iter(path, self.templates)
+
+    def parse_many(self, paths, size=64):
+        '''Parse *paths* against all templates in this schema and yield the first match for each.
+
+        See: :py:func:`~lucidity.batch.parse_many` for more information.
+        '''
+        return parse_many(paths, self.templates, size=size)
+
+    def parse_columns(self, paths, arrays=None):
+        '''Parse *paths* against all templates in this schema and return column oriented results.
+
+        See: :py:func:`~lucidity.column.parse_columns` for more information.
+        '''
+        from .column import parse_columns
+        return parse_columns(paths, self.templates, arrays=arrays)
+
+    def parse_columns_iter(self, paths, chunk_size=100000, arrays=None):
+        '''Parse *paths* against all templates in this schema and yield chunks of column oriented results.
+
+        See: :py:func:`~lucidity.column.parse_columns_iter` for more information.
+        '''
+        from .column import parse_columns_iter
+        return parse_columns_iter(
+            paths, self.templates, chunk_size=chunk_size, arrays=arrays
+        )
+
+    def parse_listing(self, filepath, separator='\n', start=0):
+        '''Parse listing file at *filepath* against all templates in this schema and yield each match.
+
+        See: :py:func:`~lucidity.listing.parse_listing` for more information.
+        '''
+        from .listing import parse_listing
+        return parse_listing(
+            filepath, self.templates, separator=separator, start=start
+        )
 
     def format(self, data):
         '''Format *data* using the templates in this schema and return the first match.
 
         See: :py:function:`~luciditiy.format` for more information.
         '''
+        key = self._format_cache_key('format', data)
+        if key is not None:
+            return self.cache.call(
+                key,
+                lambda: format(data, self.templates),
+                errors=(error.FormatError,)
+            )
+
         return format(data, self.templates)
 
+    def format_many(self, data, stream=None, separator='\n'):
+        '''Format many records of *data* using the templates in this schema, taking the first match for each.
+
+        Accepts the same *data* as :py:meth:`~lucidity.template.Template.format_many`.
+
+        If *stream* is None, return an iterator yielding ``(path, template, error)`` for each record in order, where
+        *error* is None on success and *path* and *template* are None on failure.
+
+        Otherwise write each formatted path followed by *separator* to *stream* and return a list of
+        ``(index, error)`` for records that could not be formatted by any template.
+        '''
+        formatters = [
+            (template, template._formatter()) for template in self.templates
+        ]
+        results = self._format_many(formatters, _iter_records(data))
+
+        if stream is None:
+            return results
+
+        errors = []
+        for index, (path, _, format_error) in enumerate(results):
+            if format_error is not None:
+                errors.append((index, format_error))
+            else:
+                stream.write(path + separator)
+
+        return errors
+
+    def _format_many(self, formatters, records):
+        '''Yield ``(path, template, error)`` for each of *records*.'''
+        for record in records:
+            if isinstance(record, error.FormatError):
+                yield (None, None, record)
+                continue
+
+            for template, formatter in formatters:
+                try:
+                    path = formatter(record)
+                except (error.FormatError, TypeError):
+                    continue
+                else:
+                    yield (path, template, None)
+                    break
+
+            else:
+                yield (None, None, error.FormatError(
+                    'Data {0!r} was not formattable by any of the supplied '
+                    'templates.'.format(record)
+                ))
+
     def format_iter(self, data):
         '''Format *data* using the templates in this schema and return the first match.
 
@@ -91,8 +349,39 @@ class Schema(dict):
 
         This is equivalent to performing ``list(schema.format_iter(data))``.
         '''
+        key = self._format_cache_key('format_all', data)
+        if key is not None:
+            return self.cache.call(key, lambda: list(self.format_iter(data)))
+
         return list(self.format_iter(data))
 
+    def _format_cache_key(self, operation, data):
+        '''Return cache key for *operation* on *data* or None if not cacheable.'''
+        if self.cache is None:
+            return None
+
+        try:
+            return self._cache_namespace + (operation, canonical(data))
+        except TypeError:
+            return None
+
+    def find(self, data=None, root=None):
+        '''Yield ``(path, data, template)`` for existing paths matching templates in this schema.
+
+        See: :py:meth:`~lucidity.template.Template.glob` for more information.
+        '''
+        for template in self.templates:
+            for path, parsed in template.glob(data, root=root):
+                yield (path, parsed, template)
+
+    def scan(self, index, root):
+        '''Scan directory tree at *root* into *index* with templates in this schema and yield changes since the last scan.
+
+        See: :py:meth:`~lucidity.scan.Scanner.scan` for more information.
+        '''
+        from .scan import Scanner
+        return Scanner(index, self.templates).scan(root)
+
     def get_template(self, name):
         '''Retrieve a template from *templates* by *name*.
 
@@ -147,58 +436,22 @@ class Schema(dict):
         Instantiate a Schema from a dictionary loading all `paths` as templates
         Also supports setting a separate default for all paths in the schema using `defaults`.
 
+        Emit :py:class:`~lucidity.error.BacktrackingWarning` for templates at risk of excessive backtracking. Templates
+        whose references cannot be resolved are skipped. See: :py:func:`~lucidity.analysis.backtracking_risks` for more information.
+
         Return ``lucidity.schema.Schema`` initialized with all path templates defined in the *data* dictionary.
         """
 
         schema = cls()
 
-        if not data:
-            return schema
+        templates, references = _load_dict(data)
+        for template in templates:
+            schema.add_template(template)
 
-        convert_anchor = {'start': Template.ANCHOR_START,
-                          'both': Template.ANCHOR_BOTH,
-                          'end': Template.ANCHOR_END}
-        convert_mode = {'relaxed': Template.ANCHOR_START,
-                        'strict': Template.ANCHOR_BOTH}
+        for reference in references:
+            schema.add_reference(reference)
 
-        conversions = {'anchor': convert_anchor,
-                       'mode': convert_mode}
-
-        defaults = {'anchor': Template.ANCHOR_START,
-                    'mode': Template.RELAXED}
-
-        if 'defaults' in data:
-            for key, value in data['defaults'].iteritems():
-                defaults[key] = conversions[key][value]
-
-        if 'paths' in data:
-            for name, template_data in data['paths'].iteritems():
-
-                # pattern
-                pattern = template_data['pattern']
-
-                # anchor
-                anchor = defaults['anchor']
-                if 'anchor' in template_data:
-                    anchor_raw = template_data['anchor']
-                    anchor = conversions['anchor'][anchor_raw]
-
-                # mode
-                mode = defaults['mode']
-                if 'mode' in template_data:
-                    mode_raw = template_data['mode']
-                    mode = conversions['mode'][mode_raw]
-
-                template = Template(name,
-                                             pattern,
-                                             anchor=anchor,
-                                             duplicate_placeholder_mode=mode)
-                schema.add_template(template)
-
-        if 'references' in data:
-            for name, pattern in data['references'].iteritems():
-                template = Template(name, pattern)
-                schema.add_reference(template)
+        _warn_backtracking(schema.templates)
 
         return schema
 
@@ -215,6 +468,81 @@ class Schema(dict):
         return cls.from_dict(data)
 
 
+def _load_dict(data):
+    '''Return ``(templates, references)`` defined in the *data* dictionary.
+
+    See: :py:meth:`Schema.from_dict` for the structure of *data*.
+    '''
+    templates = []
+    references = []
+    if not data:
+        return templates, references
+
+    convert_anchor = {'start': Template.ANCHOR_START,
+                      'both': Template.ANCHOR_BOTH,
+                      'end': Template.ANCHOR_END}
+    convert_mode = {'relaxed': Template.RELAXED,
+                    'strict': Template.STRICT}
+
+    conversions = {'anchor': convert_anchor,
+                   'mode': convert_mode}
+
+    defaults = {'anchor': Template.ANCHOR_START,
+                'mode': Template.RELAXED}
+
+    if 'defaults' in data:
+        for key, value in data['defaults'].iteritems():
+            defaults[key] = conversions[key][value]
+
+    if 'paths' in data:
+        for name, template_data in data['paths'].iteritems():
+
+            # pattern
+            pattern = template_data['pattern']
+
+            # anchor
+            anchor = defaults['anchor']
+            if 'anchor' in template_data:
+                anchor_raw = template_data['anchor']
+                anchor = conversions['anchor'][anchor_raw]
+
+            # mode
+            mode = defaults['mode']
+            if 'mode' in template_data:
+                mode_raw = template_data['mode']
+                mode = conversions['mode'][mode_raw]
+
+            template = Template(name,
+                                pattern,
+                                anchor=anchor,
+                                duplicate_placeholder_mode=mode)
+            templates.append(template)
+
+    if 'references' in data:
+        for name, pattern in data['references'].iteritems():
+            template = Template(name, pattern)
+            references.append(template)
+
+    return templates, references
+
+
+def _warn_backtracking(templates):
+    '''Emit :py:class:`~lucidity.error.BacktrackingWarning` for *templates* at risk of excessive backtracking.'''
+    for template in templates:
+        # Unresolvable references are reported when the template is
+        # used rather than when the schema is loaded.
+        try:
+            risks = backtracking_risks(template)
+        except error.ResolveError:
+            continue
+
+        for risk in risks:
+            warnings.warn(
+                'Template {0!r} may backtrack excessively on non matching paths. {1}'.format(template.name, risk),
+                error.BacktrackingWarning
+            )
+
+
 class SchemaReferenceResolver(Resolver):
     def __init__(self, schema):
         assert isinstance(schema, Schema)
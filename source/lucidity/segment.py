@@ -0,0 +1,324 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Parsing of paths segment by segment without regular expressions.
+
+Most patterns only use the default placeholder expression between
+separators. Such a pattern can be matched by splitting the path at
+separators and checking each segment against its literal text and the
+characters the default expression allows, then building the data directly.
+
+:func:`create_parser` returns a :class:`SegmentParser` for patterns that
+qualify, giving exactly the same results as the regular expression.
+
+'''
+
+import string
+import operator
+
+from . import error
+
+#: Placeholder expression the segment parser can evaluate.
+DEFAULT_EXPRESSION = '[\w_.\-]+'
+
+# Characters matched by the default expression. The regular expression is
+# compiled without the UNICODE or LOCALE flags so only ASCII word characters
+# are matched, for both byte and unicode strings.
+_CHARACTERS = string.ascii_letters + string.digits + '_.-'
+_UNICODE_DELETIONS = dict((ord(character), None) for character in _CHARACTERS)
+
+
+def _valid(value):
+    '''Return whether all characters of *value* match the default expression.'''
+    if isinstance(value, unicode):
+        return not value.translate(_UNICODE_DELETIONS)
+
+    return not value.translate(None, _CHARACTERS)
+
+
+def _leading(value):
+    '''Return length of leading characters of *value* valid for default.'''
+    if _valid(value):
+        return len(value)
+
+    for index, character in enumerate(value):
+        if not _valid(character):
+            return index
+
+    return len(value)
+
+
+def _getter(indices):
+    '''Return function returning tuple of items at *indices* of a sequence.'''
+    if not indices:
+        return None
+
+    getter = operator.itemgetter(*indices)
+    if len(indices) == 1:
+        return lambda sequence: (getter(sequence),)
+
+    return getter
+
+
+class SegmentParser(object):
+    '''Parse paths for a pattern segment by segment.
+
+    Each segment of the pattern between literal separators is either fixed
+    text, or literal text around one placeholder, or around two placeholders
+    separated by literal text. With a start anchor only, the last segment
+    is matched against the start of the remaining path.
+
+    Fixed text segments and segments that are a single placeholder are
+    compared and extracted together, leaving only the remaining segments to
+    be examined individually.
+
+    '''
+
+    def __init__(self, template, segments, keys, bounded):
+        '''Initialise parser for *template*.
+
+        *segments* should be a list of ``(prefix, separator, suffix, count)``
+        where *count* is the number of placeholders in the segment and
+        *separator* the literal text between two placeholders. For fixed
+        text segments *prefix* holds the text.
+
+        *keys* should list the placeholder names in the order they appear.
+
+        If *bounded* is False then the last segment is matched against the
+        start of the remaining path.
+
+        '''
+        super(SegmentParser, self).__init__()
+        self.segments = segments
+        self.keys = keys
+        self.bounded = bounded
+
+        self._strict = (
+            template.duplicate_placeholder_mode == template.STRICT
+        )
+        self._unique = len(set(keys)) == len(keys)
+        self._flat = self._unique and not any('.' in key for key in keys)
+
+        # Segments that are a single placeholder are extracted first. With
+        # duplicate placeholders values must be compared in pattern order
+        # instead so all segments are then examined individually.
+        fixed = []
+        whole = []
+        remaining = []
+        whole_keys = []
+        remaining_keys = []
+        keys = iter(keys)
+        last = len(segments) - 1
+        for index, (prefix, separator, suffix, count) in enumerate(segments):
+            final = not bounded and index == last
+            segment_keys = [next(keys) for _ in range(count)]
+
+            if count == 0 and not final:
+                fixed.append(index)
+
+            elif (
+                count == 1 and not prefix and not suffix and not final
+                and self._unique
+            ):
+                whole.append(index)
+                whole_keys.extend(segment_keys)
+
+            else:
+                remaining.append(
+                    (index, prefix, separator, suffix, count, final)
+                )
+                remaining_keys.extend(segment_keys)
+
+        # Literal text before the first placeholder rejects most paths
+        # without splitting them.
+        start = []
+        for prefix, _, _, count in segments:
+            start.append(prefix)
+            if count:
+                break
+
+        self._start = '/'.join(start)
+
+        self._count = len(segments)
+        self._fixed = _getter(fixed)
+        self._fixed_values = tuple(segments[index][0] for index in fixed)
+        self._whole = _getter(whole)
+        self._remaining = remaining
+        self._keys = whole_keys + remaining_keys
+        self._nested = [(key, key.split('.')) for key in self._keys]
+
+    def parse(self, path):
+        '''Return data parsed from string *path* or None if not matched.
+
+        Raise :py:class:`~lucidity.error.ParseError` if duplicate
+        placeholders extracted different values in strict mode.
+
+        '''
+        if not path.startswith(self._start):
+            return None
+
+        if self.bounded:
+            # An end anchor also matches before a trailing newline.
+            if path.endswith('\n'):
+                path = path[:-1]
+
+            parts = path.split('/')
+        else:
+            parts = path.split('/', self._count - 1)
+
+        if len(parts) != self._count:
+            return None
+
+        if self._fixed is not None and self._fixed(parts) != self._fixed_values:
+            return None
+
+        if self._whole is not None:
+            values = list(self._whole(parts))
+        else:
+            values = []
+
+        for index, prefix, separator, suffix, count, final in self._remaining:
+            part = parts[index]
+
+            if final:
+                if not part.startswith(prefix):
+                    return None
+
+                if count:
+                    length = _leading(part[len(prefix):])
+                    values.append(part[len(prefix):len(prefix) + length])
+
+                continue
+
+            end = len(part) - len(suffix)
+            if (
+                end - len(prefix) < count + len(separator) * (count - 1)
+                or not part.startswith(prefix)
+                or not part.endswith(suffix)
+            ):
+                return None
+
+            middle = part[len(prefix):end]
+            if count == 1:
+                values.append(middle)
+                continue
+
+            # The first placeholder is greedy so splits at the last possible
+            # occurrence of the separator.
+            split = middle.rfind(separator, 1, len(middle) - 1)
+            if split == -1:
+                return None
+
+            values.append(middle[:split])
+            values.append(middle[split + len(separator):])
+
+        # Separators between two placeholders only contain valid characters
+        # so checking the values checks the text between prefix and suffix.
+        if not all(values) or not _valid(''.join(values)):
+            return None
+
+        if self._flat:
+            return dict(zip(self._keys, values))
+
+        data = {}
+        flat = {}
+        for (key, parts), value in zip(self._nested, values):
+            if not self._unique:
+                if key in flat:
+                    if self._strict and flat[key] != value:
+                        raise error.ParseError(
+                            'Different extracted values for placeholder '
+                            '{0!r} detected. Values were {1!r} and {2!r}.'
+                            .format(key, flat[key], value)
+                        )
+
+                flat[key] = value
+
+            target = data
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+
+            target[parts[-1]] = value
+
+        return data
+
+
+def create_parser(template, pattern):
+    '''Return :class:`SegmentParser` for *template* with expanded *pattern*.
+
+    Return None if *pattern* does not qualify, in which case the regular
+    expression should be used.
+
+    '''
+    if template.anchor not in (template.ANCHOR_START, template.ANCHOR_BOTH):
+        return None
+
+    bounded = template.anchor == template.ANCHOR_BOTH
+
+    # Split tokens into segments at literal separators.
+    segments = [[]]
+    keys = []
+    for literal, placeholder, expression in template._tokens(pattern):
+        if placeholder is not None:
+            if expression != DEFAULT_EXPRESSION:
+                return None
+
+            segments[-1].append((None, placeholder))
+            keys.append(placeholder)
+            continue
+
+        # Literal newlines would interact with the end anchor.
+        if '\n' in literal:
+            return None
+
+        parts = literal.split('/')
+        if parts[0]:
+            segments[-1].append((parts[0], None))
+        for part in parts[1:]:
+            segments.append([])
+            if part:
+                segments[-1].append((part, None))
+
+    # Nested keys must not clash with other keys.
+    for key in keys:
+        for other in keys:
+            if other.startswith(key + '.'):
+                return None
+
+    compiled = []
+    for index, tokens in enumerate(segments):
+        final = not bounded and index == len(segments) - 1
+        placeholders = [
+            position for position, (_, placeholder) in enumerate(tokens)
+            if placeholder is not None
+        ]
+
+        if not placeholders:
+            compiled.append((''.join(text for text, _ in tokens), '', '', 0))
+            continue
+
+        first = placeholders[0]
+        last = placeholders[-1]
+        prefix = ''.join(text for text, _ in tokens[:first])
+        suffix = ''.join(text for text, _ in tokens[last + 1:])
+
+        if len(placeholders) == 1:
+            if final and suffix:
+                return None
+
+            compiled.append((prefix, '', suffix, 1))
+            continue
+
+        if len(placeholders) != 2 or final or last - first != 2:
+            return None
+
+        # Literal text between placeholders must be allowed by the
+        # expression so that all text between prefix and suffix is too.
+        separator = tokens[first + 1][0]
+        if not _valid(separator):
+            return None
+
+        compiled.append((prefix, separator, suffix, 2))
+
+    return SegmentParser(template, compiled, keys, bounded)
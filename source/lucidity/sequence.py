@@ -0,0 +1,346 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Collapse parsed paths into numbered sequences.'''
+
+import bisect
+import heapq
+from collections import OrderedDict
+
+try:
+    from math import gcd as _gcd
+except ImportError:
+    from fractions import gcd as _gcd
+
+
+class Sequence(object):
+    '''A range of paths that differ only in one numeric placeholder.'''
+
+    __slots__ = (
+        'template', 'data', 'key', 'start', 'end', 'step', 'padding', 'holes'
+    )
+
+    def __init__(self, template, data, key, start, end, step=1, padding=0,
+                 holes=None):
+        '''Initialise sequence for *template* varying in *key*.
+
+        *data* should be the parsed data shared by every path in the sequence,
+        excluding *key*.
+
+        *start*, *end* and *step* describe the inclusive range of frame
+        numbers, with any numbers in the range that were not present listed
+        in *holes*. Holes are kept as a sorted list.
+
+        *padding* is the zero padded width of frame numbers, or 0 if frame
+        numbers are not padded.
+
+        '''
+        super(Sequence, self).__init__()
+        self.template = template
+        self.data = data
+        self.key = key
+        self.start = start
+        self.end = end
+        self.step = step
+        self.padding = padding
+        self.holes = sorted(holes or [])
+
+    def __repr__(self):
+        '''Return unambiguous representation of sequence.'''
+        return (
+            '{0}(template={1!r}, key={2!r}, start={3}, end={4}, step={5}, '
+            'padding={6}, holes={7!r})'.format(
+                self.__class__.__name__, self.template.name, self.key,
+                self.start, self.end, self.step, self.padding, self.holes
+            )
+        )
+
+    def __len__(self):
+        '''Return number of frames present in sequence.'''
+        return (self.end - self.start) // self.step + 1 - len(self.holes)
+
+    def __iter__(self):
+        '''Iterate over frames present in sequence.'''
+        holes = iter(self.holes)
+        hole = next(holes, None)
+        for frame in xrange(self.start, self.end + 1, self.step):
+            if frame == hole:
+                hole = next(holes, None)
+            else:
+                yield frame
+
+    def __contains__(self, frame):
+        '''Return whether *frame* is present in sequence.'''
+        return (
+            self.start <= frame <= self.end
+            and (frame - self.start) % self.step == 0
+            and not _contains(self.holes, frame)
+        )
+
+    def value(self, frame):
+        '''Return placeholder value for *frame* respecting padding.'''
+        return '{0:0{1}d}'.format(frame, self.padding)
+
+    def items(self):
+        '''Yield ``(data, template)`` for each frame in sequence.
+
+        The structure of *data* matches the result of parsing the original
+        path.
+
+        '''
+        parts = self.key.split('.')
+        for frame in self:
+            data = _copy(self.data)
+            target = data
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+
+            target[parts[-1]] = self.value(frame)
+            yield (data, self.template)
+
+    def paths(self):
+        '''Yield formatted path for each frame in sequence.'''
+        for data, template in self.items():
+            yield template.format(data)
+
+
+class _Group(object):
+    '''Frames collected for a pending sequence.
+
+    Frames are stored as runs of evenly spaced numbers, so that memory does
+    not grow with the length of a sequence when frames arrive in order.
+    Frames arriving out of order are kept individually.
+
+    '''
+
+    __slots__ = ('template', 'data', 'runs', 'extra', 'padding', 'length')
+
+    def __init__(self, template, data):
+        '''Initialise empty group for *template* and shared *data*.'''
+        self.template = template
+        self.data = data
+
+        # Runs as ``[first, last, step]`` in ascending order, with a step of 0
+        # for a single frame, and a sorted list of out of order frames.
+        self.runs = []
+        self.extra = []
+
+        # Zero padded width if known, and shortest unpadded value otherwise.
+        self.padding = None
+        self.length = None
+
+    def accepts(self, value):
+        '''Return whether frame *value* could belong to this group.'''
+        padded = _padding(value)
+        if padded:
+            if self.padding is not None:
+                return padded == self.padding
+
+            return self.length is None or self.length >= padded
+
+        return self.padding is None or len(value) >= self.padding
+
+    def add(self, value):
+        '''Add frame *value* to group.'''
+        padded = _padding(value)
+        if padded:
+            self.padding = padded
+        elif self.length is None or len(value) < self.length:
+            self.length = len(value)
+
+        frame = int(value)
+        runs = self.runs
+        if runs and frame <= runs[-1][1]:
+            if not self._contains(frame):
+                bisect.insort(self.extra, frame)
+            return
+
+        if runs:
+            run = runs[-1]
+            if run[2] == 0:
+                run[1] = frame
+                run[2] = frame - run[0]
+                return
+
+            if frame - run[1] == run[2]:
+                run[1] = frame
+                return
+
+        runs.append([frame, frame, 0])
+
+    def _contains(self, frame):
+        '''Return whether *frame* has been added.'''
+        if _contains(self.extra, frame):
+            return True
+
+        index = bisect.bisect_right(self.runs, [frame, float('inf'), 0]) - 1
+        if index < 0:
+            return False
+
+        first, last, step = self.runs[index]
+        if frame > last:
+            return False
+
+        return frame == first or (step and (frame - first) % step == 0)
+
+    def frames(self):
+        '''Yield frames added in ascending order.'''
+        runs = (
+            xrange(first, last + 1, step or 1) for first, last, step in self.runs
+        )
+        for frame in heapq.merge(self.extra, *runs):
+            yield frame
+
+    def sequence(self, key):
+        '''Return :class:`Sequence` for collected frames.'''
+        start = self.runs[0][0]
+        end = self.runs[-1][1]
+        if self.extra:
+            start = min(start, self.extra[0])
+
+        # Step is the largest that divides the distance of every frame from
+        # the start, which only depends on run boundaries and steps.
+        step = 0
+        count = len(self.extra)
+        for first, last, run_step in self.runs:
+            step = _gcd(step, _gcd(first - start, run_step))
+            count += (last - first) // (run_step or 1) + 1
+
+        for frame in self.extra:
+            step = _gcd(step, frame - start)
+
+        step = step or 1
+
+        holes = []
+        if count != (end - start) // step + 1:
+            frames = self.frames()
+            present = next(frames, None)
+            for frame in xrange(start, end + 1, step):
+                if frame == present:
+                    present = next(frames, None)
+                else:
+                    holes.append(frame)
+
+        return Sequence(
+            self.template, self.data, key, start, end, step=step,
+            padding=self.padding or 0, holes=holes
+        )
+
+
+def collapse(results, key='frame', limit=1000):
+    '''Collapse parse *results* into :class:`Sequence` instances.
+
+    *results* should be an iterable of ``(data, template)`` pairs, such as
+    returned by :py:meth:`~lucidity.schema.Schema.parse_all`. Results from
+    the same template whose data differs only in the numeric placeholder
+    *key* are grouped into a single sequence. *key* may use dot notation for
+    nested placeholders.
+
+    Frame values with different zero padding are kept in separate sequences.
+
+    At most *limit* sequences are held pending at once, with the oldest
+    yielded first when the limit is exceeded. Sorted results therefore
+    collapse fully in bounded memory, whilst unsorted results may yield more
+    than one sequence for the same data.
+
+    Results whose template does not contain *key*, or whose value for *key* is
+    not a non-negative integer, are yielded unchanged.
+
+    '''
+    pending = OrderedDict()
+    template_keys = {}
+    parts = key.split('.')
+
+    for result in results:
+        data, template = result
+
+        keys = template_keys.get(template)
+        if keys is None:
+            keys = template_keys[template] = template.keys()
+
+        value = _lookup(data, parts)
+        if key not in keys or not isinstance(value, basestring) or (
+            not value.isdigit()
+        ):
+            yield result
+            continue
+
+        shared = _copy(data, exclude=parts)
+        identity = (template, _freeze(shared))
+
+        groups = pending.get(identity)
+        if groups is None:
+            groups = pending[identity] = []
+
+            if len(pending) > limit:
+                _, evicted = pending.popitem(last=False)
+                for group in evicted:
+                    yield group.sequence(key)
+
+        for group in groups:
+            if group.accepts(value):
+                break
+        else:
+            group = _Group(template, shared)
+            groups.append(group)
+
+        group.add(value)
+
+    for groups in pending.values():
+        for group in groups:
+            yield group.sequence(key)
+
+
+def _contains(values, value):
+    '''Return whether sorted list *values* contains *value*.'''
+    index = bisect.bisect_left(values, value)
+    return index < len(values) and values[index] == value
+
+
+def _padding(value):
+    '''Return zero padded width of *value* or 0 if not padded.'''
+    if len(value) > 1 and value.startswith('0'):
+        return len(value)
+
+    return 0
+
+
+def _lookup(data, parts):
+    '''Return value in nested *data* at key *parts* or None if missing.'''
+    value = data
+    for part in parts:
+        try:
+            value = value[part]
+        except (TypeError, KeyError):
+            return None
+
+    return value
+
+
+def _copy(data, exclude=None):
+    '''Return copy of nested *data* omitting key *parts* in *exclude*.'''
+    copied = {}
+    for key, value in data.items():
+        if exclude and key == exclude[0]:
+            if len(exclude) == 1:
+                continue
+
+            if isinstance(value, dict):
+                copied[key] = _copy(value, exclude[1:])
+                continue
+
+        if isinstance(value, dict):
+            value = _copy(value)
+
+        copied[key] = value
+
+    return copied
+
+
+def _freeze(data):
+    '''Return hashable representation of nested *data*.'''
+    return tuple(sorted(
+        (key, _freeze(value) if isinstance(value, dict) else value)
+        for key, value in data.items()
+    ))
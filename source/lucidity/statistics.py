@@ -0,0 +1,196 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Per template parse statistics and adaptive ordering.'''
+
+import heapq
+
+from .analysis import ExclusionGraph
+
+
+class Statistics(object):
+    '''Counts of parse attempts, hits and time spent per template.'''
+
+    def __init__(self):
+        '''Initialise with no recorded attempts.'''
+        super(Statistics, self).__init__()
+        self._entries = {}
+
+    def __repr__(self):
+        '''Return unambiguous representation of statistics.'''
+        return '{0}(templates={1})'.format(
+            self.__class__.__name__, len(self._entries)
+        )
+
+    def record(self, template, hit, duration):
+        '''Record a parse attempt by *template*.
+
+        *hit* should be True if the attempt succeeded and *duration* the time
+        taken in seconds.
+
+        '''
+        entry = self._entries.get(template)
+        if entry is None:
+            entry = self._entries[template] = [0, 0, 0.0]
+
+        entry[0] += 1
+        if hit:
+            entry[1] += 1
+        entry[2] += duration
+
+    def attempts(self, template):
+        '''Return number of parse attempts recorded for *template*.'''
+        return self._entries.get(template, (0, 0, 0.0))[0]
+
+    def hits(self, template):
+        '''Return number of successful parses recorded for *template*.'''
+        return self._entries.get(template, (0, 0, 0.0))[1]
+
+    def time(self, template):
+        '''Return total seconds spent in parse attempts by *template*.'''
+        return self._entries.get(template, (0, 0, 0.0))[2]
+
+    def hit_rate(self, template):
+        '''Return fraction of attempts by *template* that succeeded.'''
+        attempts, hits, _ = self._entries.get(template, (0, 0, 0.0))
+        if not attempts:
+            return 0.0
+
+        return float(hits) / attempts
+
+    def summary(self):
+        '''Return list of dictionaries summarising each template.
+
+        Entries are ordered by descending hits.
+
+        '''
+        summary = []
+        for template, (attempts, hits, duration) in self._entries.items():
+            summary.append({
+                'name': template.name,
+                'attempts': attempts,
+                'hits': hits,
+                'time': duration,
+                'hit_rate': float(hits) / attempts if attempts else 0.0
+            })
+
+        summary.sort(key=lambda entry: (-entry['hits'], entry['name']))
+        return summary
+
+    def reset(self):
+        '''Discard all recorded statistics.'''
+        self._entries.clear()
+
+
+class AdaptiveOrder(object):
+    '''Order templates for first match parsing by recorded hit rate.
+
+    Moving a template ahead of another can only change the result of a first
+    match parse if both could match the same path. Templates are therefore
+    only reordered relative to each other when
+    :func:`~lucidity.analysis.mutually_exclusive` shows they cannot both
+    match. All other pairs keep their original relative order, so parsing
+    with the adaptive order always returns the same result as the original.
+
+    Creating the order is cheap and the original order is used until the
+    first recalculation. Exclusivity of every pair of templates is only
+    computed then, at a cost quadratic in the number of templates, reusing
+    any rows already computed by the :class:`~lucidity.analysis.ExclusionGraph`
+    supplied. Recalculation is skipped entirely while no template has been
+    hit.
+
+    '''
+
+    def __init__(self, templates, statistics, interval=1000, exclusions=None):
+        '''Initialise with original *templates* order and *statistics*.
+
+        The order is recalculated from *statistics* after every *interval*
+        calls to :meth:`templates`.
+
+        *exclusions* may be an :class:`~lucidity.analysis.ExclusionGraph` for
+        *templates* whose rows should be reused. If not supplied, a new graph
+        is created.
+
+        '''
+        super(AdaptiveOrder, self).__init__()
+        self.statistics = statistics
+        self.interval = interval
+
+        self._original = list(templates)
+        self._order = list(self._original)
+        self._calls = 0
+
+        if exclusions is None:
+            exclusions = ExclusionGraph(self._original)
+        self._exclusions = exclusions
+
+        # For each template, the indices of later templates that must stay
+        # after it and the number of earlier templates it must stay after.
+        # Computed on first recalculation.
+        self._successors = None
+        self._predecessor_counts = None
+
+    def templates(self):
+        '''Return templates in current adaptive order.'''
+        self._calls += 1
+        if self._calls >= self.interval:
+            self._calls = 0
+            self.update()
+
+        return self._order
+
+    def update(self):
+        '''Recalculate order from recorded statistics.
+
+        Among templates whose required predecessors are already placed, the
+        one with highest hit rate is placed next, with ties broken by most
+        hits and then original order.
+
+        '''
+        if not any(
+            self.statistics.hits(template) for template in self._original
+        ):
+            return
+
+        if self._successors is None:
+            self._build_constraints()
+
+        counts = list(self._predecessor_counts)
+        available = []
+        for index, count in enumerate(counts):
+            if count == 0:
+                heapq.heappush(available, self._priority(index))
+
+        order = []
+        while available:
+            _, _, index = heapq.heappop(available)
+            order.append(self._original[index])
+
+            for later in self._successors[index]:
+                counts[later] -= 1
+                if counts[later] == 0:
+                    heapq.heappush(available, self._priority(later))
+
+        self._order = order
+
+    def _build_constraints(self):
+        '''Compute which templates must keep their relative order.'''
+        self._successors = [[] for _ in self._original]
+        self._predecessor_counts = [0] * len(self._original)
+        for index, template in enumerate(self._original):
+            for later in range(index + 1, len(self._original)):
+                if not self._exclusions.excludes(
+                    template, self._original[later]
+                ):
+                    self._successors[index].append(later)
+                    self._predecessor_counts[later] += 1
+
+    def _priority(self, index):
+        '''Return heap priority for template at *index*.'''
+        template = self._original[index]
+        return (
+            -self.statistics.hit_rate(template),
+            -self.statistics.hits(template),
+            index
+        )
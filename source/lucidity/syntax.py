@@ -0,0 +1,152 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Structure of template patterns.
+
+A pattern is tokenised once into a :class:`Structure` of literal text and
+:class:`Placeholder` items. Parsing, formatting, expansion of references and
+introspection of a template are all derived from that structure rather than
+from separate passes over the pattern text.
+
+'''
+
+import re
+import weakref
+from collections import namedtuple
+
+# An empty placeholder name is matched so that it is rejected as invalid
+# rather than treated as literal text.
+_PLACEHOLDER_REGEX = re.compile(
+    r'{(?P<placeholder>.*?)(:(?P<expression>(\\}|.)+?))?}'
+)
+
+# Structures currently in use, shared between templates with equal patterns.
+_structures = weakref.WeakValueDictionary()
+
+
+class Placeholder(namedtuple('Placeholder', ['name', 'expression', 'text'])):
+    '''Placeholder in a pattern.
+
+    *name* is the placeholder name as written, including the leading ``@`` of
+    a template reference. *expression* is the custom expression as written,
+    with braces still escaped, or None if the placeholder has none. *text* is
+    the full placeholder text in the pattern.
+
+    '''
+
+    __slots__ = ()
+
+    @property
+    def reference(self):
+        '''Return name of referenced template or None if not a reference.'''
+        if self.name.startswith('@'):
+            return self.name[1:]
+
+        return None
+
+    def regular_expression(self, default):
+        '''Return expression to match, using *default* if none is set.'''
+        expression = self.expression
+        if expression is None:
+            expression = default
+
+        # Un-escape potentially escaped characters in expression.
+        return expression.replace('\{', '{').replace('\}', '}')
+
+
+class Structure(object):
+    '''Pattern tokenised into literal text and placeholders.
+
+    Use :func:`parse` to obtain the structure of a pattern so that equal
+    patterns share a single instance.
+
+    '''
+
+    __slots__ = (
+        'pattern', 'components', 'placeholders', 'keys', 'references',
+        '__weakref__'
+    )
+
+    def __init__(self, pattern):
+        '''Initialise by tokenising *pattern*.
+
+        :attr:`components` is a tuple of ``(literal, placeholder)`` pairs,
+        where *literal* is the text preceding a :class:`Placeholder` and
+        *placeholder* is None for any text after the last placeholder.
+
+        :attr:`keys` is the set of placeholder names and :attr:`references`
+        the set of names of referenced templates.
+
+        '''
+        super(Structure, self).__init__()
+        self.pattern = pattern
+
+        components = []
+        position = 0
+        for match in _PLACEHOLDER_REGEX.finditer(pattern):
+            components.append((
+                pattern[position:match.start()],
+                Placeholder(
+                    match.group('placeholder'), match.group('expression'),
+                    match.group(0)
+                )
+            ))
+            position = match.end()
+
+        if position < len(pattern):
+            components.append((pattern[position:], None))
+
+        self.components = tuple(components)
+        self.placeholders = tuple(
+            placeholder for _, placeholder in components
+            if placeholder is not None
+        )
+        self.keys = frozenset(
+            placeholder.name for placeholder in self.placeholders
+        )
+        self.references = frozenset(
+            placeholder.reference for placeholder in self.placeholders
+            if placeholder.reference is not None
+        )
+
+    def __repr__(self):
+        '''Return unambiguous representation of structure.'''
+        return '{0}({1!r})'.format(self.__class__.__name__, self.pattern)
+
+    def tokens(self, default):
+        '''Return list of ``(literal, placeholder, expression)``.
+
+        Each item is either literal text, with *placeholder* and *expression*
+        None, or a placeholder name and the expression to match, using
+        *default* where none is set, with *literal* None.
+
+        '''
+        tokens = []
+        for literal, placeholder in self.components:
+            if literal:
+                tokens.append((literal, None, None))
+
+            if placeholder is not None:
+                tokens.append((
+                    None, placeholder.name,
+                    placeholder.regular_expression(default)
+                ))
+
+        return tokens
+
+
+def parse(pattern):
+    '''Return :class:`Structure` of *pattern*.
+
+    Structures are shared while in use, so repeated calls for equal patterns
+    tokenise them only once.
+
+    '''
+    key = (type(pattern), pattern)
+    structure = _structures.get(key)
+    if structure is None:
+        structure = Structure(pattern)
+        _structures[key] = structure
+
+    return structure
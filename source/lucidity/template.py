@@ -3,24 +3,39 @@
 # :license: See LICENSE.txt.
 
 import abc
+import os
 import sys
 import re
-import functools
+import sre_parse
+import sre_constants
 from collections import defaultdict
+from itertools import izip_longest
+
+try:
+    from os import scandir as _scandir
+except ImportError:
+    try:
+        from scandir import scandir as _scandir
+    except ImportError:
+        _scandir = None
 
 from . import error
+from . import instrument
+from . import pool
+from . import record
+from . import segment
+from . import syntax
 
 # Type of a RegexObject for isinstance check.
 _RegexType = type(re.compile(''))
 
+# Types of path that a segment parser can parse.
+_STRING_TYPES = frozenset([str, unicode])
+
 
 class Template(object):
     '''A template.'''
 
-    _STRIP_EXPRESSION_REGEX = re.compile(r'{(.+?)(:(\\}|.)+?)}')
-    _PLAIN_PLACEHOLDER_REGEX = re.compile(r'{(.+?)}')
-    _TEMPLATE_REFERENCE_REGEX = re.compile(r'{@(?P<reference>.+?)}')
-
     ANCHOR_START, ANCHOR_END, ANCHOR_BOTH = (1, 2, 3)
 
     RELAXED, STRICT = (1, 2)
@@ -60,6 +75,12 @@ class Template(object):
         self._name = name
         self._pattern = pattern
         self._anchor = anchor
+        self._compiled = {}
+
+        # Structure of the pattern as written and of the most recently
+        # expanded pattern.
+        self._syntax = syntax.parse(pattern)
+        self._expanded_syntax = self._syntax
 
         # Check that supplied pattern is valid and able to be compiled.
         self._construct_regular_expression(self.pattern)
@@ -80,6 +101,11 @@ class Template(object):
         '''Return template pattern.'''
         return self._pattern
 
+    @property
+    def anchor(self):
+        '''Return anchor used when parsing.'''
+        return self._anchor
+
     def expanded_pattern(self):
         '''Return pattern with all referenced templates expanded recursively.
 
@@ -87,14 +113,42 @@ class Template(object):
         that cannot be resolved by currently set template_resolver.
 
         '''
-        return self._TEMPLATE_REFERENCE_REGEX.sub(
-            self._expand_reference, self.pattern
-        )
+        if instrument.hooks:
+            return instrument.call(
+                'expand', self._expand_pattern, (), {'template': self.name}
+            )
+
+        return self._expand_pattern()
 
-    def _expand_reference(self, match):
-        '''Expand reference represented by *match*.'''
-        reference = match.group('reference')
+    def _expand_pattern(self):
+        '''Return pattern with all referenced templates expanded recursively.'''
+        if not self._syntax.references:
+            return self.pattern
 
+        parts = []
+        for literal, placeholder in self._syntax.components:
+            parts.append(literal)
+            if placeholder is None:
+                continue
+
+            if placeholder.reference is None:
+                parts.append(placeholder.text)
+            else:
+                parts.append(self._expand_reference(placeholder.reference))
+
+        return ''.join(parts)
+
+    def _structure(self):
+        '''Return :py:class:`~lucidity.syntax.Structure` of expanded pattern.'''
+        expanded_pattern = self.expanded_pattern()
+        structure = self._expanded_syntax
+        if structure.pattern != expanded_pattern:
+            structure = self._expanded_syntax = syntax.parse(expanded_pattern)
+
+        return structure
+
+    def _expand_reference(self, reference):
+        '''Return expanded pattern of template named *reference*.'''
         if self.template_resolver is None:
             raise error.ResolveError(
                 'Failed to resolve reference {0!r} as no template resolver set.'
@@ -117,48 +171,374 @@ class Template(object):
         parsable by this template.
 
         '''
-        # Construct regular expression for expanded pattern.
-        regex = self._construct_regular_expression(self.expanded_pattern())
+        if instrument.hooks:
+            return instrument.call(
+                'parse', self._parse, (path,), {'template': self.name}
+            )
 
-        # Parse.
-        parsed = {}
+        return self._parse(path)
 
-        match = regex.search(path)
+    def _parse(self, path):
+        '''Return dictionary of data extracted from *path*.'''
+        if type(path) is str:
+            regex, literals, segments = self._byte_parser()
+        else:
+            regex, literals, segments = self._parser()
+
+        if segments is not None and type(path) in _STRING_TYPES:
+            data = segments.parse(path)
+            if data is not None:
+                return data
+
+        # Templates at risk of excessive backtracking first check that the
+        # literal text appears in order, rejecting most non matching paths
+        # without running the regular expression.
+        elif literals is None or _contains_in_order(path, literals):
+            match = regex.search(path)
+            if match:
+                return self._extract(match.groupdict())
+
+        raise error.ParseError(
+            'Path {0!r} did not match template pattern.'.format(path)
+        )
+
+    def match_prefix(self, path):
+        '''Return data bound so far if *path* could start a match.
+
+        *path* is treated as incomplete, such as a directory being walked or
+        text being typed, and is considered viable if appending further
+        characters to it could produce a path parsable by this template. A
+        path that already fully matches is also viable.
+
+        Return dictionary of data for placeholders bound by *path*. The last
+        placeholder may be bound to a partial value. Custom placeholder
+        expressions cannot be tested against partial values so a trailing
+        fragment that might belong to one is accepted without binding.
+
+        Templates not anchored at the start can match after any prefix so
+        every *path* is viable for them and no data is bound.
+
+        Raise :py:class:`~lucidity.error.ParseError` if *path* could not be
+        the beginning of a path parsable by this template.
+
+        '''
+        regex = self._prefix_regular_expression()
+        if regex is None:
+            return {}
+
+        match = regex.match(path)
         if match:
+            return self._extract(match.groupdict())
+
+        else:
+            raise error.ParseError(
+                'Path {0!r} is not a prefix of template pattern.'.format(path)
+            )
+
+    def glob(self, data=None, root=None):
+        '''Yield ``(path, data)`` for existing paths matching this template.
+
+        *data* may partially specify placeholder values in the same structure
+        accepted by :meth:`format`. Placeholders with a supplied value become
+        fixed path components so that only directories containing missing
+        values need to be listed.
+
+        Absolute patterns are searched from the filesystem root. Relative
+        patterns are searched under *root*, which defaults to the current
+        directory. When *root* is supplied it is joined to each yielded path.
+
+        Each candidate is verified with :meth:`parse` and only yielded if the
+        extracted data agrees with *data*. Placeholder expressions that can
+        match a path separator cannot be searched segment by segment so the
+        directory tree below the last fixed component is walked instead.
+
+        '''
+        if data is None:
             data = {}
-            for key, value in sorted(match.groupdict().items()):
-                # Strip number that was added to make group name unique.
-                key = key[:-3]
-
-                # If strict mode enabled for duplicate placeholders, ensure that
-                # all duplicate placeholders extract the same value.
-                if self.duplicate_placeholder_mode == self.STRICT:
-                    if key in parsed:
-                        if parsed[key] != value:
-                            raise error.ParseError(
-                                'Different extracted values for placeholder '
-                                '{0!r} detected. Values were {1!r} and {2!r}.'
-                                .format(key, parsed[key], value)
-                            )
-                    else:
-                        parsed[key] = value
-
-                # Expand dot notation keys into nested dictionaries.
-                target = data
-
-                parts = key.split(self._period_code)
-                for part in parts[:-1]:
-                    target = target.setdefault(part, {})
-
-                target[parts[-1]] = value
-
-            return data
+
+        expected = {}
+        for key in self.keys():
+            try:
+                expected[key] = str(self._format_value(key, data))
+            except error.FormatError:
+                continue
+
+        # Substitute known values and split pattern into path segments, each
+        # either a fixed name or a compiled expression to filter entries by.
+        segments = []
+        fixed, name, expression = True, '', ''
+        deep = False
+        for literal, placeholder in self._structure().components:
+            if placeholder is not None:
+                if placeholder.name in expected:
+                    literal += expected[placeholder.name]
+                    placeholder = None
+
+            chunks = literal.split('/')
+            for chunk in chunks[:-1]:
+                segments.append(
+                    (fixed, name + chunk, expression + re.escape(chunk))
+                )
+                fixed, name, expression = True, '', ''
+
+            name += chunks[-1]
+            expression += re.escape(chunks[-1])
+
+            if placeholder is not None:
+                placeholder_expression = placeholder.regular_expression(
+                    self._default_placeholder_expression
+                )
+
+                if _may_match_separator(placeholder_expression):
+                    deep = True
+                    break
+
+                fixed = False
+                expression += '(?:{0})'.format(placeholder_expression)
+
+        if not deep:
+            segments.append((fixed, name, expression))
+
+        matchers = []
+        for fixed, name, expression in segments:
+            if fixed:
+                matchers.append(name)
+            else:
+                matchers.append(re.compile('{0}$'.format(expression)))
+
+        if deep:
+            # Only fixed segments can be searched directly.
+            while matchers and not isinstance(matchers[-1], basestring):
+                matchers.pop()
+
+        if matchers and matchers[0] == '':
+            # Absolute pattern.
+            directory = '/'
+            relative = '/'
+            prefix = None
+            matchers.pop(0)
+
+        else:
+            directory = root if root is not None else os.curdir
+            relative = ''
+            prefix = root
+
+        for candidate in _glob_segments(directory, relative, matchers, deep):
+            try:
+                parsed = self.parse(candidate)
+            except error.ParseError:
+                continue
+
+            if any(
+                str(self._format_value(key, parsed)) != value
+                for key, value in expected.items()
+            ):
+                continue
+
+            if prefix is not None:
+                candidate = os.path.join(prefix, candidate)
+
+            yield candidate, parsed
+
+    def parse_record(self, path, pool=None):
+        '''Return compact record of data extracted from *path*.
+
+        The record is an instance of a :class:`~lucidity.record.Record` type
+        created for this template. It supports attribute and mapping access
+        in the same structure as :meth:`parse` and can be converted to that
+        structure with :meth:`~lucidity.record.Record.to_dict`.
+
+        If *pool* is supplied it should be a dictionary used to intern
+        extracted values, so that values repeated across many paths share a
+        single string instance.
+
+        Raise :py:class:`~lucidity.error.ParseError` if *path* is not
+        parsable by this template.
+
+        '''
+        regex = self._regular_expression()
+
+        match = regex.search(path)
+        if match:
+            values = self._extract_values(match.groupdict())
+            if pool is not None:
+                for key, value in values.items():
+                    values[key] = pool.setdefault(value, value)
+
+            return self._record_type()(values)
 
         else:
             raise error.ParseError(
                 'Path {0!r} did not match template pattern.'.format(path)
             )
 
+    def _extract(self, groups):
+        '''Return data dictionary from regular expression *groups*.
+
+        See :meth:`_extract_values` for details.
+
+        '''
+        data = {}
+        for key, value in self._extract_values(groups).items():
+            # Expand dot notation keys into nested dictionaries.
+            target = data
+
+            parts = key.split('.')
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+
+            target[parts[-1]] = value
+
+        return data
+
+    def _extract_values(self, groups):
+        '''Return flat mapping of placeholder to value from *groups*.
+
+        *groups* should map group names, as constructed by
+        :meth:`_convert`, to extracted values. Groups that did not
+        participate in the match (a value of None) are ignored. Nested
+        placeholders are returned using dot notation.
+
+        Raise :py:class:`~lucidity.error.ParseError` if duplicate
+        placeholders extracted different values in strict mode.
+
+        '''
+        parsed = {}
+        for key, value in sorted(groups.items()):
+            if value is None:
+                continue
+
+            # Strip number that was added to make group name unique.
+            key = key[:-3].replace(self._period_code, '.')
+
+            # If strict mode enabled for duplicate placeholders, ensure that
+            # all duplicate placeholders extract the same value.
+            if self.duplicate_placeholder_mode == self.STRICT:
+                if key in parsed:
+                    if parsed[key] != value:
+                        raise error.ParseError(
+                            'Different extracted values for placeholder '
+                            '{0!r} detected. Values were {1!r} and {2!r}.'
+                            .format(key, parsed[key], value)
+                        )
+
+                    continue
+
+            parsed[key] = value
+
+        return parsed
+
+    def _regular_expression(self):
+        '''Return compiled regular expression for expanded pattern.'''
+        return self._compile(
+            'regular_expression', self._construct_regular_expression
+        )
+
+    def _parser(self):
+        '''Return ``(regex, literals, segments)`` to parse expanded pattern.
+
+        *literals* is the list of literal text to check for before matching
+        *regex*, or None if no check is needed.
+
+        *segments* is a :py:class:`~lucidity.segment.SegmentParser` to try
+        before *regex*, or None if the pattern does not qualify.
+
+        '''
+        return self._compile('parser', self._construct_parser)
+
+    def _byte_parser(self):
+        '''Return ``(regex, literals, segments)`` to parse byte string paths.
+
+        Same as :meth:`_parser` except that a unicode pattern is encoded as
+        UTF-8 first, so that byte string paths are parsed without decoding
+        them and values are extracted as byte strings.
+
+        '''
+        parser = self._parser()
+        if not isinstance(parser[0].pattern, unicode):
+            return parser
+
+        return self._compile('byte_parser', self._construct_byte_parser)
+
+    def _prefix_regular_expression(self):
+        '''Return compiled prefix regular expression for expanded pattern.
+
+        Return None if the template is not anchored at the start.
+
+        '''
+        return self._compile(
+            'prefix_regular_expression',
+            self._construct_prefix_regular_expression
+        )
+
+    def _split_regular_expressions(self):
+        '''Return expressions for expanded pattern split at last separator.
+
+        See :meth:`_construct_split_regular_expressions` for details.
+
+        '''
+        return self._compile(
+            'split_regular_expressions',
+            self._construct_split_regular_expressions
+        )
+
+    def _record_type(self):
+        '''Return record type for expanded pattern.'''
+        # Record types refer back to their template so cannot be shared.
+        return self._compile(
+            'record_type', self._construct_record_type, shared=False
+        )
+
+    def _compile(self, name, construct, shared=True):
+        '''Return object *name* constructed from expanded pattern.
+
+        *construct* is called with the expanded pattern when no object has
+        been constructed yet or a referenced template or setting, such as
+        :attr:`duplicate_placeholder_mode`, has changed since. The result is
+        cached so that repeated operations avoid reconstruction.
+
+        If *shared* is True then the object is also looked up in the
+        :py:data:`~lucidity.pool.shared` pool first, so that templates with
+        the same expanded pattern and settings share a single instance.
+
+        '''
+        expanded_pattern = self.expanded_pattern()
+        key = self._pool_key(name, expanded_pattern)
+        cached = self._compiled.get(name)
+        if cached is None or cached[0] != key:
+            def constructor():
+                if instrument.hooks:
+                    return instrument.call(
+                        'compile', construct, (expanded_pattern,),
+                        {'template': self.name, 'artefact': name}
+                    )
+
+                return construct(expanded_pattern)
+
+            if shared:
+                entry = pool.shared.get(key, constructor)
+            else:
+                entry = pool.Entry(constructor())
+
+            cached = (key, entry)
+            self._compiled[name] = cached
+
+        return cached[1].value
+
+    def _pool_key(self, name, expanded_pattern):
+        '''Return key identifying object *name* for *expanded_pattern*.
+
+        The key includes every setting that affects construction, as well as
+        the pattern type as equal byte and unicode patterns construct objects
+        producing different types.
+
+        '''
+        return (
+            self.__class__, name, type(expanded_pattern), expanded_pattern,
+            self._anchor, self._default_placeholder_expression,
+            self.duplicate_placeholder_mode
+        )
+
     def format(self, data):
         '''Return a path formatted by applying *data* to this template.
 
@@ -166,19 +546,108 @@ class Template(object):
         supply enough information to fill the template fields.
 
         '''
+        if instrument.hooks:
+            return instrument.call(
+                'format', self._formatter(), (data,), {'template': self.name}
+            )
 
-        format_specification = self._construct_format_specification(
-            self.expanded_pattern()
-        )
+        return self._formatter()(data)
 
-        return self._PLAIN_PLACEHOLDER_REGEX.sub(
-            functools.partial(self._format, data=data),
-            format_specification
-        )
+    def format_many(self, data, stream=None, separator='\n'):
+        '''Format many records of *data* using this template.
+
+        *data* should be either an iterable of dictionaries, each accepted by
+        :meth:`format`, or a mapping of placeholder key, using dot notation
+        for nested placeholders, to a sequence of values with one value per
+        record.
+
+        The template is compiled once for all records. A record that cannot be
+        formatted does not stop the batch. Instead the error is reported as
+        data.
+
+        If *stream* is None, return an iterator yielding ``(path, error)`` for
+        each record in order, where one of *path* or *error* is None.
+
+        Otherwise write each formatted path followed by *separator* to
+        *stream* and return a list of ``(index, error)`` for records that could
+        not be formatted.
+
+        '''
+        formatter = self._formatter()
+        results = _format_records(formatter, _iter_records(data))
+
+        if stream is None:
+            return results
+
+        errors = []
+        for index, (path, format_error) in enumerate(results):
+            if format_error is not None:
+                errors.append((index, format_error))
+            else:
+                stream.write(path + separator)
 
-    def _format(self, match, data):
-        '''Return value from data for *match*.'''
-        placeholder = match.group(1)
+        return errors
+
+    def _formatter(self):
+        '''Return compiled function formatting data for expanded pattern.'''
+        return self._compile('formatter', self._construct_formatter)
+
+    def _construct_formatter(self, pattern):
+        '''Return function formatting data for *pattern*.
+
+        The pattern is split once into literal text and placeholder key parts
+        so that formatting only needs to look up values and join them.
+
+        '''
+        literals = []
+        placeholders = []
+        trailing = ''
+        for literal, placeholder in syntax.parse(pattern).components:
+            if placeholder is None:
+                trailing = literal
+                continue
+
+            literals.append(literal)
+            placeholders.append(
+                (placeholder.name, tuple(placeholder.name.split('.')))
+            )
+
+        def formatter(data):
+            '''Return path formatted from *data*.'''
+            parts = []
+            for literal, (placeholder, keys) in zip(literals, placeholders):
+                parts.append(literal)
+
+                try:
+                    value = data
+                    for key in keys:
+                        value = value[key]
+
+                except (TypeError, KeyError):
+                    raise error.FormatError(
+                        'Could not format data {0!r} due to missing key '
+                        '{1!r}.'.format(data, placeholder)
+                    )
+
+                parts.append(value)
+
+            parts.append(trailing)
+            try:
+                return ''.join(parts)
+
+            except UnicodeDecodeError:
+                # Byte string values that are not ASCII, such as those parsed
+                # from byte string paths, cannot be joined with unicode
+                # literal text so format a byte string instead.
+                return ''.join(
+                    part.encode('utf-8') if isinstance(part, unicode)
+                    else part for part in parts
+                )
+
+        return formatter
+
+    def _format_value(self, placeholder, data):
+        '''Return value from *data* for dotted *placeholder*.'''
         parts = placeholder.split('.')
 
         try:
@@ -197,48 +666,92 @@ class Template(object):
 
     def keys(self):
         '''Return unique set of placeholders in pattern.'''
-        format_specification = self._construct_format_specification(
-            self.expanded_pattern()
-        )
-        return set(self._PLAIN_PLACEHOLDER_REGEX.findall(format_specification))
+        return set(self._structure().keys)
 
     def references(self):
         '''Return unique set of referenced templates in pattern.'''
-        format_specification = self._construct_format_specification(
-            self.pattern
-        )
-        return set(self._TEMPLATE_REFERENCE_REGEX.findall(format_specification))
+        return set(self._syntax.references)
 
-    def _construct_format_specification(self, pattern):
-        '''Return format specification from *pattern*.'''
-        return self._STRIP_EXPRESSION_REGEX.sub('{\g<1>}', pattern)
+    def _construct_parser(self, pattern):
+        '''Return ``(regex, literals, segments)`` to parse *pattern*.'''
+        regex = self._construct_regular_expression(pattern)
+
+        tokens = self._tokens(pattern)
+        literals = None
+        if _backtracking_risks(tokens):
+            literals = [
+                literal for literal, _, _ in tokens if literal is not None
+            ]
+
+        return regex, literals, segment.create_parser(self, pattern)
+
+    def _construct_byte_parser(self, pattern):
+        '''Return ``(regex, literals, segments)`` to parse byte strings.'''
+        return self._construct_parser(pattern.encode('utf-8'))
 
     def _construct_regular_expression(self, pattern):
-        '''Return a regular expression to represent *pattern*.'''
-        # Escape non-placeholder components.
-        expression = re.sub(
-            r'(?P<placeholder>{(.+?)(:(\\}|.)+?)?})|(?P<other>.+?)',
-            self._escape,
-            pattern
-        )
+        '''Return a regular expression to represent *pattern*.
 
-        # Replace placeholders with regex pattern.
-        expression = re.sub(
-            r'{(?P<placeholder>.+?)(:(?P<expression>(\\}|.)+?))?}',
-            functools.partial(
-                self._convert, placeholder_count=defaultdict(int)
-            ),
-            expression
-        )
+        If *pattern* is at risk of excessive backtracking then placeholders
+        whose expression repeats characters that what follows cannot start
+        with are matched atomically. Giving back characters could never lead
+        to a match, so this only avoids futile backtracking into them when a
+        later part of the pattern fails.
+
+        '''
+        atomic = None
+        tokens = self._tokens(pattern)
+        if _backtracking_risks(tokens):
+            atomic = _atomic_placeholders(tokens)
+
+        expression = self._construct_expression(pattern, atomic=atomic)
 
         if self._anchor is not None:
+            # Concatenate rather than format so that non ASCII characters in
+            # unicode patterns are preserved.
             if bool(self._anchor & self.ANCHOR_START):
-                expression = '^{0}'.format(expression)
+                expression = '^' + expression
 
             if bool(self._anchor & self.ANCHOR_END):
-                expression = '{0}$'.format(expression)
+                expression += '$'
 
-        # Compile expression.
+        return self._compile_expression(expression)
+
+    def _construct_expression(self, pattern, placeholder_count=None,
+                              atomic=None):
+        '''Return unanchored regular expression string for *pattern*.
+
+        *placeholder_count* should be a `defaultdict(int)` used to number
+        placeholder groups. Pass the same instance when constructing
+        expressions for consecutive parts of a pattern so that group names
+        remain unique across the parts.
+
+        *atomic* may be a list with a flag for each placeholder in order,
+        set if the placeholder should be matched atomically.
+
+        '''
+        if placeholder_count is None:
+            placeholder_count = defaultdict(int)
+
+        atomic = iter(atomic or ())
+
+        # Escape literal text and replace placeholders with regex pattern.
+        parts = []
+        for literal, placeholder in syntax.parse(pattern).components:
+            parts.append(re.escape(literal))
+            if placeholder is not None:
+                parts.append(
+                    self._convert(placeholder, placeholder_count, atomic)
+                )
+
+        return ''.join(parts)
+
+    def _compile_expression(self, expression):
+        '''Return compiled regular *expression*.
+
+        Raise :exc:`ValueError` if *expression* is invalid.
+
+        '''
         try:
             compiled = re.compile(expression)
         except re.error as error:
@@ -255,14 +768,145 @@ class Template(object):
 
         return compiled
 
-    def _convert(self, match, placeholder_count):
-        '''Return a regular expression to represent *match*.
+    def _construct_split_regular_expressions(self, pattern):
+        '''Return expressions matching *pattern* split at last separator.
+
+        Return ``(count, directory, tail)`` where *count* is the number of
+        path separators up to and including the last separator in *pattern*,
+        *directory* is a compiled expression that must match all of the path
+        before that separator and *tail* is a compiled expression that must
+        match from the position after it, using :meth:`re.RegexObject.match`
+        with a start position.
+
+        Parsing a path this way gives the same result as the full regular
+        expression only if no placeholder can match a separator and the
+        pattern is anchored at the start. Return None if that is not the case
+        or *pattern* contains no separator.
+
+        '''
+        if self._anchor is None or not self._anchor & self.ANCHOR_START:
+            return None
+
+        position = None
+        count = 0
+        offset = 0
+        for literal, placeholder in syntax.parse(pattern).components:
+            index = literal.rfind('/')
+            if index != -1:
+                position = offset + index
+                count += literal.count('/')
+
+            offset += len(literal)
+
+            if placeholder is not None:
+                expression = placeholder.regular_expression(
+                    self._default_placeholder_expression
+                )
+
+                # Lookarounds could inspect text either side of the split.
+                if _may_match_separator(expression) or '(?' in expression:
+                    return None
+
+                offset += len(placeholder.text)
+
+        if position is None:
+            return None
+
+        placeholder_count = defaultdict(int)
+        directory = self._construct_expression(
+            pattern[:position], placeholder_count
+        )
+        tail = self._construct_expression(
+            pattern[position + 1:], placeholder_count
+        )
+
+        if self._anchor & self.ANCHOR_END:
+            tail = '{0}$'.format(tail)
+
+        return (
+            count,
+            self._compile_expression('^{0}\\Z'.format(directory)),
+            self._compile_expression(tail)
+        )
+
+    def _construct_record_type(self, pattern):
+        '''Return record type for placeholders in *pattern*.'''
+        return record.create_record_type(self, syntax.parse(pattern).keys)
+
+    def _construct_prefix_regular_expression(self, pattern):
+        '''Return a regular expression matching prefixes of *pattern*.
+
+        Each component of the pattern is wrapped so that the path may end
+        before it, inside it or after it, with the remaining components nested
+        inside. Return None if the template is not anchored at the start.
+
+        '''
+        if self._anchor is None or not self._anchor & self.ANCHOR_START:
+            return None
+
+        # Build components first so that placeholder group names are numbered
+        # in the same order as in the full regular expression.
+        components = []
+        placeholder_count = defaultdict(int)
+        for literal, placeholder in syntax.parse(pattern).components:
+            if literal:
+                components.append((False, literal))
+
+            if placeholder is not None:
+                # Custom expressions cannot be tested against a partial value
+                # so accept any trailing text in their place.
+                if placeholder.expression is None:
+                    partial = r'\Z'
+                else:
+                    partial = r'.*\Z'
+
+                components.append((
+                    True,
+                    (self._convert(placeholder, placeholder_count), partial)
+                ))
+
+        expression = ''
+        if self._anchor & self.ANCHOR_END:
+            expression = '$'
+
+        for is_placeholder, component in reversed(components):
+            if is_placeholder:
+                placeholder, partial = component
+                expression = '(?:{0}{1}|{2})'.format(
+                    placeholder, expression, partial
+                )
+
+            else:
+                # A literal may be cut short after any character.
+                partials = [
+                    re.escape(component[:index])
+                    for index in range(len(component) - 1, 0, -1)
+                ]
+                partials.append('')
+                expression = '(?:{0}{1}|(?:{2})\\Z)'.format(
+                    re.escape(component), expression, '|'.join(partials)
+                )
+
+        try:
+            return re.compile('^{0}'.format(expression))
+        except re.error:
+            _, value, traceback = sys.exc_info()
+            message = 'Invalid pattern: {0}'.format(value)
+            raise ValueError, message, traceback  #@IgnorePep8
+
+    def _convert(self, placeholder, placeholder_count, atomic=None):
+        '''Return a regular expression to represent *placeholder*.
+
+        *placeholder* should be a :py:class:`~lucidity.syntax.Placeholder`.
 
         *placeholder_count* should be a `defaultdict(int)` that will be used to
         store counts of unique placeholder names.
 
+        *atomic* should be an iterator of flags, one consumed per placeholder,
+        indicating whether to match the placeholder atomically.
+
         '''
-        placeholder_name = match.group('placeholder')
+        placeholder_name = placeholder.name
 
         # Support at symbol (@) as referenced template indicator. Currently,
         # this symbol not a valid character for a group name in the standard
@@ -284,22 +928,27 @@ class Template(object):
             placeholder_count[placeholder_name]
         )
 
-        expression = match.group('expression')
-        if expression is None:
-            expression = self._default_placeholder_expression
+        expression = placeholder.regular_expression(
+            self._default_placeholder_expression
+        )
 
-        # Un-escape potentially escaped characters in expression.
-        expression = expression.replace('\{', '{').replace('\}', '}')
+        # The re module does not support atomic groups. Emulate one by
+        # capturing in a lookahead, which is never backtracked into, and then
+        # consuming the captured text with a back reference.
+        if atomic is not None and next(atomic, False):
+            return r'(?=(?P<{0}>{1}))(?P={0})'.format(
+                placeholder_name, expression
+            )
 
         return r'(?P<{0}>{1})'.format(placeholder_name, expression)
 
-    def _escape(self, match):
-        '''Escape matched 'other' group value.'''
-        groups = match.groupdict()
-        if groups['other'] is not None:
-            return re.escape(groups['other'])
+    def _tokens(self, pattern):
+        '''Return list of ``(literal, placeholder, expression)`` for *pattern*.
 
-        return groups['placeholder']
+        See :py:meth:`~lucidity.syntax.Structure.tokens` for details.
+
+        '''
+        return syntax.parse(pattern).tokens(self._default_placeholder_expression)
 
 
 class Resolver(object):
@@ -323,3 +972,435 @@ class Resolver(object):
             return callable(getattr(subclass, 'get', None))
 
         return NotImplemented
+
+
+def _glob_segments(directory, relative, matchers, deep):
+    '''Yield relative paths under *directory* matching *matchers*.
+
+    *relative* is the template path corresponding to *directory*. Each
+    matcher is either a fixed name or a compiled expression that entry names
+    must match. If *deep* is True then all paths below the last matcher are
+    yielded.
+
+    '''
+    if not matchers:
+        if not deep:
+            return
+
+        for base, directories, filenames in os.walk(directory):
+            base_relative = relative + os.path.relpath(
+                base, directory
+            ).replace(os.sep, '/')
+            if base_relative.endswith('/.'):
+                base_relative = base_relative[:-1]
+            elif base_relative == '.':
+                base_relative = ''
+            else:
+                base_relative += '/'
+
+            for name in directories + filenames:
+                yield base_relative + name
+
+        return
+
+    matcher = matchers[0]
+    remaining = matchers[1:]
+    last = not remaining and not deep
+
+    if isinstance(matcher, basestring):
+        path = os.path.join(directory, matcher)
+        if last:
+            if os.path.lexists(path):
+                yield relative + matcher
+
+        elif os.path.isdir(path):
+            for candidate in _glob_segments(
+                path, relative + matcher + '/', remaining, deep
+            ):
+                yield candidate
+
+        return
+
+    for name, is_directory in _list_directory(directory):
+        if not matcher.match(name):
+            continue
+
+        if last:
+            yield relative + name
+
+        elif is_directory:
+            for candidate in _glob_segments(
+                os.path.join(directory, name), relative + name + '/',
+                remaining, deep
+            ):
+                yield candidate
+
+
+def _list_directory(directory):
+    '''Yield ``(name, is_directory)`` for entries in *directory*.
+
+    Use :func:`os.scandir` where available to avoid a stat call per entry.
+
+    '''
+    try:
+        if _scandir is not None:
+            for entry in _scandir(directory):
+                try:
+                    is_directory = entry.is_dir()
+                except OSError:
+                    is_directory = False
+
+                yield entry.name, is_directory
+
+        else:
+            for name in os.listdir(directory):
+                yield name, os.path.isdir(os.path.join(directory, name))
+
+    except OSError:
+        return
+
+
+def _may_match_separator(expression):
+    '''Return whether regular *expression* could match a path separator.
+
+    Character classes are inspected conservatively so unknown constructs
+    are assumed to match a separator.
+
+    '''
+    try:
+        parsed = sre_parse.parse(expression)
+    except (sre_constants.error, TypeError):
+        return True
+
+    return _subpattern_may_match_separator(parsed)
+
+
+def _subpattern_may_match_separator(subpattern):
+    '''Return whether parsed *subpattern* could match a path separator.'''
+    separator = ord('/')
+    for opcode, argument in subpattern:
+        opcode = str(opcode).upper()
+
+        if opcode == 'LITERAL':
+            if argument == separator:
+                return True
+
+        elif opcode == 'NOT_LITERAL':
+            if argument != separator:
+                return True
+
+        elif opcode == 'ANY':
+            return True
+
+        elif opcode == 'IN':
+            if _set_may_match_separator(argument):
+                return True
+
+        elif opcode in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'):
+            if _subpattern_may_match_separator(argument[-1]):
+                return True
+
+        elif opcode == 'SUBPATTERN':
+            if _subpattern_may_match_separator(argument[-1]):
+                return True
+
+        elif opcode == 'BRANCH':
+            if any(
+                _subpattern_may_match_separator(branch)
+                for branch in argument[1]
+            ):
+                return True
+
+        elif opcode in ('AT', 'ASSERT', 'ASSERT_NOT'):
+            continue
+
+        else:
+            return True
+
+    return False
+
+
+def _set_may_match_separator(items):
+    '''Return whether parsed character set *items* include a separator.'''
+    separator = ord('/')
+    negate = False
+    matched = False
+    for opcode, argument in items:
+        opcode = str(opcode).upper()
+
+        if opcode == 'NEGATE':
+            negate = True
+
+        elif opcode == 'LITERAL':
+            matched = matched or argument == separator
+
+        elif opcode == 'RANGE':
+            matched = matched or argument[0] <= separator <= argument[1]
+
+        elif opcode == 'CATEGORY':
+            matched = matched or str(argument).upper() in (
+                'CATEGORY_NOT_DIGIT', 'CATEGORY_NOT_SPACE',
+                'CATEGORY_NOT_WORD', 'CATEGORY_UNI_NOT_DIGIT',
+                'CATEGORY_UNI_NOT_SPACE', 'CATEGORY_UNI_NOT_WORD'
+            )
+
+        else:
+            return True
+
+    return matched != negate
+
+
+# Characters tested when comparing the characters expressions can match.
+_SAMPLE_CHARACTERS = [chr(code) for code in range(256)] + [
+    u'\u00e9', u'\u4e2d'
+]
+
+
+def _repeat_character(expression):
+    '''Return ``(test, minimum, maximum)`` for a repeated character *expression*.
+
+    *expression* must repeat a single character or character class, such as
+    ``[\w_.\-]+`` or ``\d{4}``. *test* returns whether a character can be
+    matched and *minimum* and *maximum* are the bounds of repetition.
+
+    Return None for other expressions.
+
+    '''
+    try:
+        parsed = list(sre_parse.parse(expression))
+    except (sre_constants.error, TypeError):
+        return None
+
+    if len(parsed) != 1:
+        return None
+
+    opcode, argument = parsed[0]
+    if str(opcode).upper() != 'MAX_REPEAT':
+        return None
+
+    minimum, maximum, item = argument
+    item = list(item)
+    if len(item) != 1 or str(item[0][0]).upper() not in (
+        'LITERAL', 'NOT_LITERAL', 'ANY', 'IN'
+    ):
+        return None
+
+    count = max(minimum, 1)
+    regex = re.compile('(?:{0})\\Z'.format(expression))
+
+    def test(character):
+        return regex.match(character * count) is not None
+
+    return test, minimum, maximum
+
+
+def _overlap(test_a, test_b):
+    '''Return whether character tests *test_a* and *test_b* share a match.'''
+    for character in _SAMPLE_CHARACTERS:
+        if test_a(character) and test_b(character):
+            return True
+
+    return False
+
+
+def _atomic_placeholders(tokens):
+    '''Return flag for each placeholder in *tokens* to match atomically.
+
+    A placeholder can be matched atomically when its expression repeats a
+    character class and the next token cannot start with any character in
+    that class.
+
+    '''
+    flags = []
+    for index, (_, placeholder, expression) in enumerate(tokens):
+        if placeholder is None:
+            continue
+
+        repeat = _repeat_character(expression)
+        if repeat is None or index + 1 == len(tokens):
+            flags.append(False)
+            continue
+
+        test = repeat[0]
+        literal, _, following = tokens[index + 1]
+        if literal is not None:
+            flags.append(not test(literal[0]))
+            continue
+
+        following = _repeat_character(following)
+        flags.append(
+            following is not None and following[1] > 0
+            and not _overlap(test, following[0])
+        )
+
+    return flags
+
+
+def _backtracking_risks(tokens):
+    '''Return list of descriptions of backtracking risks in *tokens*.
+
+    Risks are unbounded repetitions nested in a repetition, and adjacent
+    placeholders with unbounded repetitions of overlapping characters where
+    either can match a path separator. Both can make a failing match take
+    time polynomial or exponential in the length of the path.
+
+    '''
+    risks = []
+    for index, (_, placeholder, expression) in enumerate(tokens):
+        if placeholder is None:
+            continue
+
+        try:
+            parsed = sre_parse.parse(expression)
+        except (sre_constants.error, TypeError):
+            continue
+
+        if _nested_repeat(parsed, False):
+            risks.append(
+                'Placeholder {0!r} has nested unbounded repetition in '
+                'expression {1!r}.'.format(placeholder, expression)
+            )
+
+        repeat = _repeat_character(expression)
+        if repeat is None or repeat[2] != sre_constants.MAXREPEAT:
+            continue
+
+        test = repeat[0]
+        for literal, other, other_expression in tokens[index + 1:]:
+            if literal is not None:
+                # The expression could also match the literal text.
+                if all(test(character) for character in literal):
+                    continue
+
+                break
+
+            other_repeat = _repeat_character(other_expression)
+            if (
+                other_repeat is not None
+                and other_repeat[2] == sre_constants.MAXREPEAT
+                and _overlap(test, other_repeat[0])
+                and (
+                    _may_match_separator(expression)
+                    or _may_match_separator(other_expression)
+                )
+            ):
+                risks.append(
+                    'Placeholders {0!r} and {1!r} can match the same text '
+                    'with expressions {2!r} and {3!r}.'.format(
+                        placeholder, other, expression, other_expression
+                    )
+                )
+
+            break
+
+    return risks
+
+
+def _nested_repeat(subpattern, repeated):
+    '''Return whether *subpattern* nests an unbounded repetition.
+
+    *repeated* should be True if *subpattern* is itself repeated.
+
+    '''
+    for opcode, argument in subpattern:
+        opcode = str(opcode).upper()
+
+        if opcode in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'):
+            minimum, maximum, item = argument
+            if repeated and maximum == sre_constants.MAXREPEAT:
+                return True
+
+            if _nested_repeat(item, repeated or maximum > 1):
+                return True
+
+        elif opcode == 'SUBPATTERN':
+            if _nested_repeat(argument[-1], repeated):
+                return True
+
+        elif opcode == 'BRANCH':
+            for branch in argument[1]:
+                if _nested_repeat(branch, repeated):
+                    return True
+
+    return False
+
+
+def _contains_in_order(path, literals):
+    '''Return whether *literals* appear in *path* in order.'''
+    position = 0
+    for literal in literals:
+        position = path.find(literal, position)
+        if position == -1:
+            return False
+
+        position += len(literal)
+
+    return True
+
+
+def _iter_records(data):
+    '''Yield data dictionaries from records or columns in *data*.
+
+    See :meth:`Template.format_many` for accepted forms of *data*.
+
+    If columns differ in length, yield a :exc:`~lucidity.error.FormatError`
+    in place of each record beyond the end of the shortest column so that
+    the mismatch is reported per record rather than silently dropped.
+
+    '''
+    if not isinstance(data, dict):
+        for record in data:
+            yield record
+
+        return
+
+    columns = [
+        (tuple(key.split('.')), values) for key, values in data.items()
+    ]
+    if not columns:
+        return
+
+    missing = object()
+    for index, row in enumerate(
+        izip_longest(*[values for _, values in columns], fillvalue=missing)
+    ):
+        if any(value is missing for value in row):
+            yield error.FormatError(
+                'Record {0} is missing values for columns {1}.'.format(
+                    index, sorted(
+                        '.'.join(parts)
+                        for (parts, _), value in zip(columns, row)
+                        if value is missing
+                    )
+                )
+            )
+            continue
+
+        record = {}
+        for (parts, _), value in zip(columns, row):
+            target = record
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+
+            target[parts[-1]] = value
+
+        yield record
+
+
+def _format_records(formatter, records):
+    '''Yield ``(path, error)`` formatting each of *records* by *formatter*.'''
+    for record in records:
+        if isinstance(record, error.FormatError):
+            yield (None, record)
+            continue
+
+        try:
+            path = formatter(record)
+        except error.FormatError as format_error:
+            yield (None, format_error)
+        except TypeError as type_error:
+            yield (None, error.FormatError(
+                'Could not format data {0!r}: {1}'.format(record, type_error)
+            ))
+        else:
+            yield (path, None)
@@ -0,0 +1,509 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+'''Benchmark parse, format, schema load and discovery at scale.
+
+Run from the repository root with::
+
+    python test/benchmark/benchmark.py --scale small
+
+Each benchmark runs in a separate process so that the reported peak memory
+is not affected by earlier benchmarks. Results can be saved with ``--save``
+and later compared against with ``--baseline``, in which case the exit code
+is non-zero if any benchmark regressed by more than ``--threshold``.
+
+Schemas and paths are generated from a fixed seed so runs are comparable.
+
+'''
+
+import os
+import sys
+import gc
+import json
+import random
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from timeit import default_timer as timer
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), '..', '..', 'source')
+)
+
+import lucidity
+from lucidity.corpus import Generator, VALID
+from lucidity.vendor import yaml
+
+
+#: Benchmark cases per scale as ``(benchmark, templates, paths)``.
+SCALES = {
+    'small': [
+        ('template_parse', 1, 10000),
+        ('template_format', 1, 10000),
+        ('schema_parse', 10, 1000),
+        ('schema_parse', 100, 1000),
+        ('schema_parse_mixed', 100, 1000),
+        ('schema_parse_all', 100, 1000),
+        ('schema_parse_all_naive', 100, 1000),
+        ('schema_format', 10, 1000),
+        ('schema_load', 10, 0),
+        ('schema_load', 100, 0),
+        ('discover', 100, 0)
+    ],
+    'medium': [
+        ('template_parse', 1, 1000000),
+        ('template_format', 1, 1000000),
+        ('schema_parse', 10, 100000),
+        ('schema_parse', 100, 100000),
+        ('schema_parse', 1000, 10000),
+        ('schema_parse_mixed', 100, 100000),
+        ('schema_parse_all', 1000, 2000),
+        ('schema_parse_all_naive', 1000, 2000),
+        ('schema_format', 100, 100000),
+        ('schema_load', 100, 0),
+        ('schema_load', 1000, 0),
+        ('discover', 1000, 0)
+    ],
+    'large': [
+        ('template_parse', 1, 10000000),
+        ('template_format', 1, 10000000),
+        ('schema_parse', 10, 10000000),
+        ('schema_parse', 100, 1000000),
+        ('schema_parse', 1000, 100000),
+        ('schema_parse', 5000, 10000),
+        ('schema_parse_mixed', 1000, 100000),
+        ('schema_parse_all', 5000, 2000),
+        ('schema_parse_all_naive', 5000, 2000),
+        ('schema_format', 1000, 1000000),
+        ('schema_load', 1000, 0),
+        ('schema_load', 5000, 0),
+        ('discover', 5000, 0)
+    ]
+}
+
+#: Paths generated and processed at a time to bound memory use.
+CHUNK_SIZE = 10000
+
+#: Templates registered per generated mount point.
+MOUNT_POINT_SIZE = 50
+
+_ANCHORS = (
+    ['start'] * 12 + ['both'] * 5 + ['end'] * 2 + [None]
+)
+
+_SEGMENTS = [
+    '{name}', '{task}', '{variant}', 'v{version:\d+}', 'publish', 'work'
+]
+
+
+def synthetic_schema(count, seed=0):
+    '''Return schema data for *count* templates generated from *seed*.
+
+    The data is in the form accepted by
+    :py:meth:`~lucidity.schema.Schema.from_dict` and mixes anchors,
+    template references and STRICT duplicate placeholders.
+
+    '''
+    generator = random.Random(seed)
+    data = {
+        'references': {
+            'job': '/jobs/{job.code}',
+            'asset': '{@job}/assets/{asset.type}/{asset.name}',
+            'shot': '{@job}/shots/{sequence}/{shot:\w+\d+}'
+        },
+        'paths': {}
+    }
+
+    for index in range(count):
+        root = generator.choice(['{@job}', '{@asset}', '{@shot}', '/library'])
+        segments = generator.sample(_SEGMENTS, generator.randint(1, 3))
+        pattern = '{0}/kind{1}/{2}'.format(root, index, '/'.join(segments))
+
+        entry = {'pattern': pattern}
+
+        anchor = generator.choice(_ANCHORS)
+        if anchor is not None:
+            entry['anchor'] = anchor
+
+        if index % 5 == 0:
+            entry['pattern'] += '/{file}/{file}.{extension:[a-z]+}'
+            entry['mode'] = 'strict'
+
+        data['paths']['template{0}'.format(index)] = entry
+
+    return data
+
+
+def build_schema(data):
+    '''Return schema built from *data*.
+
+    Templates without an anchor are not expressible in schema data so are
+    constructed directly and added after loading the rest.
+
+    '''
+    anchored = dict(data)
+    anchored['paths'] = dict(
+        (name, entry) for name, entry in data['paths'].items()
+        if 'anchor' in entry
+    )
+    schema = lucidity.Schema.from_dict(anchored)
+
+    for name, entry in data['paths'].items():
+        if 'anchor' in entry:
+            continue
+
+        mode = lucidity.Template.RELAXED
+        if entry.get('mode') == 'strict':
+            mode = lucidity.Template.STRICT
+
+        schema.add_template(
+            lucidity.Template(
+                name, entry['pattern'], anchor=None,
+                duplicate_placeholder_mode=mode
+            )
+        )
+
+    return schema
+
+
+def sample_chunks(templates, count, seed=0, near_miss=0.0, non_matching=0.0):
+    '''Yield lists of ``(data, path)`` totalling *count* samples.
+
+    Samples are generated by a :py:class:`~lucidity.corpus.Generator` for
+    *templates* with *data* None for near miss and non matching paths.
+
+    '''
+    generator = Generator(
+        templates, seed=seed, near_miss=near_miss, non_matching=non_matching
+    )
+    remaining = count
+    while remaining > 0:
+        size = min(CHUNK_SIZE, remaining)
+        chunk = []
+        for kind, _, path, data in generator.samples(size):
+            if kind != VALID:
+                data = None
+            chunk.append((data, path))
+
+        remaining -= size
+        yield chunk
+
+
+def benchmark_template_parse(templates, count):
+    '''Return seconds taken parsing *count* paths with a single template.'''
+    template = templates[0]
+    parse = template.parse
+    elapsed = 0.0
+    for chunk in sample_chunks([template], count):
+        paths = [path for _, path in chunk]
+        start = timer()
+        for path in paths:
+            parse(path)
+        elapsed += timer() - start
+
+    return elapsed, count
+
+
+def benchmark_template_format(templates, count):
+    '''Return seconds taken formatting *count* paths with a single template.'''
+    template = templates[0]
+    format = template.format
+    elapsed = 0.0
+    for chunk in sample_chunks([template], count):
+        data = [item for item, _ in chunk]
+        start = timer()
+        for item in data:
+            format(item)
+        elapsed += timer() - start
+
+    return elapsed, count
+
+
+def benchmark_schema_parse(schema, count):
+    '''Return seconds taken parsing *count* paths against *schema*.'''
+    elapsed = 0.0
+    for chunk in sample_chunks(schema.templates, count):
+        paths = [path for _, path in chunk]
+        start = timer()
+        for path in paths:
+            schema.parse(path)
+        elapsed += timer() - start
+
+    return elapsed, count
+
+
+def benchmark_schema_parse_mixed(schema, count):
+    '''Return seconds taken parsing *count* paths against *schema*.
+
+    A fifth of the paths are near misses and a tenth do not match.
+
+    '''
+    elapsed = 0.0
+    chunks = sample_chunks(
+        schema.templates, count, near_miss=0.2, non_matching=0.1
+    )
+    for chunk in chunks:
+        paths = [path for _, path in chunk]
+        start = timer()
+        for path in paths:
+            try:
+                schema.parse(path)
+            except lucidity.ParseError:
+                pass
+        elapsed += timer() - start
+
+    return elapsed, count
+
+
+def benchmark_schema_parse_all(schema, count):
+    '''Return seconds taken parsing *count* paths with all matches.
+
+    Compare with :func:`benchmark_schema_parse_all_naive` to check that the
+    default :py:meth:`~lucidity.schema.Schema.parse_all` is no slower than
+    trying every template in turn.
+
+    '''
+    elapsed = 0.0
+    for chunk in sample_chunks(schema.templates, count):
+        paths = [path for _, path in chunk]
+        start = timer()
+        for path in paths:
+            schema.parse_all(path)
+        elapsed += timer() - start
+
+    return elapsed, count
+
+
+def benchmark_schema_parse_all_naive(schema, count):
+    '''Return seconds taken parsing *count* paths trying every template.'''
+    templates = schema.templates
+    elapsed = 0.0
+    for chunk in sample_chunks(templates, count):
+        paths = [path for _, path in chunk]
+        start = timer()
+        for path in paths:
+            matches = []
+            for template in templates:
+                try:
+                    matches.append((template.parse(path), template))
+                except lucidity.ParseError:
+                    pass
+        elapsed += timer() - start
+
+    return elapsed, count
+
+
+def benchmark_schema_format(schema, count):
+    '''Return seconds taken formatting *count* paths against *schema*.'''
+    elapsed = 0.0
+    for chunk in sample_chunks(schema.templates, count):
+        data = [item for item, _ in chunk]
+        start = timer()
+        for item in data:
+            schema.format(item)
+        elapsed += timer() - start
+
+    return elapsed, count
+
+
+def benchmark_schema_load(data, directory):
+    '''Return seconds taken loading schema *data* from YAML.'''
+    path = os.path.join(directory, 'schema.yaml')
+    with open(path, 'w') as file_object:
+        yaml.safe_dump(data, file_object)
+
+    start = timer()
+    lucidity.Schema.from_yaml(path)
+    return timer() - start, len(data['paths'])
+
+
+def benchmark_discover(schema, directory):
+    '''Return seconds taken discovering templates of *schema*.
+
+    Templates are written with expanded patterns to mount points of
+    :data:`MOUNT_POINT_SIZE` templates each.
+
+    '''
+    templates = sorted(schema.templates, key=lambda template: template.name)
+    for offset in range(0, len(templates), MOUNT_POINT_SIZE):
+        lines = ['import lucidity', '', '', 'def register():', '    return [']
+        for template in templates[offset:offset + MOUNT_POINT_SIZE]:
+            lines.append('        lucidity.Template({0!r}, {1!r}),'.format(
+                template.name, template.expanded_pattern()
+            ))
+        lines.append('    ]')
+
+        path = os.path.join(
+            directory, 'mount_point_{0:05d}.py'.format(offset)
+        )
+        with open(path, 'w') as file_object:
+            file_object.write('\n'.join(lines) + '\n')
+
+    start = timer()
+    lucidity.discover_templates([directory])
+    return timer() - start, len(templates)
+
+
+def peak_memory():
+    '''Return peak resident memory of current process in kilobytes.'''
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak //= 1024
+
+    return peak
+
+
+def run_case(benchmark, template_count, path_count, queue):
+    '''Run a single case and put result dictionary on *queue*.'''
+    data = synthetic_schema(template_count)
+    directory = tempfile.mkdtemp(prefix='lucidity_benchmark_')
+    gc.collect()
+
+    try:
+        if benchmark == 'schema_load':
+            elapsed, operations = benchmark_schema_load(data, directory)
+
+        else:
+            schema = build_schema(data)
+            if benchmark == 'discover':
+                elapsed, operations = benchmark_discover(schema, directory)
+            elif benchmark.startswith('template_'):
+                templates = sorted(
+                    schema.templates, key=lambda template: template.name
+                )
+                function = globals()['benchmark_{0}'.format(benchmark)]
+                elapsed, operations = function(templates, path_count)
+            else:
+                function = globals()['benchmark_{0}'.format(benchmark)]
+                elapsed, operations = function(schema, path_count)
+
+    finally:
+        shutil.rmtree(directory)
+
+    queue.put({
+        'seconds': elapsed,
+        'operations': operations,
+        'throughput': operations / elapsed if elapsed else None,
+        'memory': peak_memory()
+    })
+
+
+def run(cases):
+    '''Run *cases* each in a separate process and return results.'''
+    results = {}
+    for benchmark, template_count, path_count in cases:
+        name = '{0}[templates={1},paths={2}]'.format(
+            benchmark, template_count, path_count
+        )
+
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=run_case,
+            args=(benchmark, template_count, path_count, queue)
+        )
+        process.start()
+        process.join()
+        if queue.empty():
+            sys.stderr.write('{0} failed.\n'.format(name))
+            continue
+
+        result = queue.get()
+
+        results[name] = result
+        sys.stdout.write(
+            '{0:<50} {1:>14.1f} ops/s {2:>10} KB\n'.format(
+                name, result['throughput'] or 0.0, result['memory']
+            )
+        )
+        sys.stdout.flush()
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    '''Return list of regressions in *results* relative to *baseline*.
+
+    A regression is throughput lower, or peak memory higher, than the
+    baseline by more than the *threshold* fraction.
+
+    '''
+    regressions = []
+    for name, result in sorted(results.items()):
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+
+        if result['throughput'] and reference['throughput']:
+            if result['throughput'] < reference['throughput'] * (1 - threshold):
+                regressions.append('{0}: throughput {1:.1f} < {2:.1f}'.format(
+                    name, result['throughput'], reference['throughput']
+                ))
+
+        if result['memory'] and reference['memory']:
+            if result['memory'] > reference['memory'] * (1 + threshold):
+                regressions.append('{0}: memory {1} KB > {2} KB'.format(
+                    name, result['memory'], reference['memory']
+                ))
+
+    return regressions
+
+
+def main(arguments=None):
+    '''Run benchmarks from command line *arguments*.'''
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        '--scale', choices=sorted(SCALES), default='small',
+        help='Size of generated schemas and path corpora.'
+    )
+    parser.add_argument(
+        '--only', action='append', default=[],
+        help='Only run named benchmark. Can be given multiple times.'
+    )
+    parser.add_argument(
+        '--save', help='Write results as JSON to this path.'
+    )
+    parser.add_argument(
+        '--baseline', help='Compare results against JSON at this path.'
+    )
+    parser.add_argument(
+        '--threshold', type=float, default=0.1,
+        help='Allowed fractional regression against baseline.'
+    )
+    namespace = parser.parse_args(arguments)
+
+    cases = [
+        case for case in SCALES[namespace.scale]
+        if not namespace.only or case[0] in namespace.only
+    ]
+    results = run(cases)
+
+    if namespace.save:
+        with open(namespace.save, 'w') as file_object:
+            json.dump(results, file_object, indent=4, sort_keys=True)
+
+    if namespace.baseline:
+        with open(namespace.baseline) as file_object:
+            baseline = json.load(file_object)
+
+        regressions = compare(results, baseline, namespace.threshold)
+        for regression in regressions:
+            sys.stderr.write('Regression: {0}\n'.format(regression))
+
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,196 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import pytest
+
+import lucidity
+from lucidity import Template, analysis
+from lucidity.analysis import (
+    mutually_exclusive, ExclusionGraph, ambiguous_pairs, backtracking_risks
+)
+
+
+@pytest.mark.parametrize(('pattern_a', 'anchor_a', 'pattern_b', 'anchor_b',
+                          'expected'), [
+    ('/jobs/{job}', Template.ANCHOR_START,
+     '/shots/{shot}', Template.ANCHOR_START, True),
+    ('/jobs/{job}', Template.ANCHOR_START,
+     '/jobs/{job}/assets', Template.ANCHOR_START, False),
+    ('/jobs/{job}', Template.ANCHOR_END,
+     '/shots/{shot}', Template.ANCHOR_START, False),
+    ('{name}.ma', Template.ANCHOR_END, '{name}.mb', Template.ANCHOR_END, True),
+    ('{name}.ma', Template.ANCHOR_BOTH, '{name}.ma', Template.ANCHOR_END,
+     False),
+    ('/static', None, '/other', None, False),
+    ('/jobs/{job}/assets/{asset}', Template.ANCHOR_START,
+     '/jobs/{job}/shots/{shot}', Template.ANCHOR_START, True),
+    ('/jobs/{job}/v{version:\d+}', Template.ANCHOR_BOTH,
+     '/jobs/{job}/vabc', Template.ANCHOR_BOTH, True),
+    ('/jobs/{job}/v{version:\d+}', Template.ANCHOR_BOTH,
+     '/jobs/{job}/v001', Template.ANCHOR_BOTH, False),
+    ('/jobs/{job}/{asset}', Template.ANCHOR_BOTH,
+     '/jobs/{job}', Template.ANCHOR_BOTH, True),
+    ('/jobs/{job}/{asset}', Template.ANCHOR_START,
+     '/jobs/{job}', Template.ANCHOR_BOTH, True),
+    ('/jobs/{job}/{asset}', Template.ANCHOR_START,
+     '/jobs/{job}', Template.ANCHOR_START, False),
+    ('/a/{x}_v/{y}', Template.ANCHOR_START,
+     '/a/{x}_w/{y}', Template.ANCHOR_START, True),
+    ('/jobs/{path:.+}/cache', Template.ANCHOR_START,
+     '/jobs/{job}/assets', Template.ANCHOR_START, False),
+    ('/jobs/{job:\w+(?=/x)}/assets', Template.ANCHOR_START,
+     '/jobs/x', Template.ANCHOR_BOTH, False)
+], ids=[
+    'different literal start',
+    'shared literal start',
+    'different anchors',
+    'different literal end',
+    'shared literal end',
+    'unanchored',
+    'different literal segment',
+    'literal segment not matching expression',
+    'literal segment matching expression',
+    'different segment counts',
+    'fewer segments than required',
+    'open segment count',
+    'different segment suffix',
+    'expression matching separator',
+    'expression with lookahead'
+])
+def test_mutually_exclusive(pattern_a, anchor_a, pattern_b, anchor_b,
+                            expected):
+    '''Determine whether templates cannot match the same path.'''
+    template_a = Template('a', pattern_a, anchor=anchor_a)
+    template_b = Template('b', pattern_b, anchor=anchor_b)
+    assert mutually_exclusive(template_a, template_b) is expected
+    assert mutually_exclusive(template_b, template_a) is expected
+
+
+def test_not_mutually_exclusive_with_self():
+    '''Template is never exclusive with itself.'''
+    template = Template('a', '/static')
+    assert mutually_exclusive(template, template) is False
+
+
+def test_analysis_is_memoized(monkeypatch):
+    '''Analyse each template and expression once per expanded pattern.'''
+    calls = []
+    original = analysis._construct_self_contained
+
+    def construct_self_contained(expression):
+        calls.append(expression)
+        return original(expression)
+
+    monkeypatch.setattr(
+        analysis, '_construct_self_contained', construct_self_contained
+    )
+    monkeypatch.setattr(analysis, '_self_contained_cache', {})
+
+    schema = lucidity.Schema([
+        Template('job', '/jobs/{job}'),
+        Template('shot', '{@job}/shots/{shot:sh\\d+}'),
+        Template('asset', '{@job}/assets/{asset:\\w+}')
+    ])
+    shot = schema['shot']
+    asset = schema['asset']
+
+    segments = analysis._segments(shot)
+    assert mutually_exclusive(shot, asset) is True
+    assert mutually_exclusive(asset, shot) is True
+    assert analysis._segments(shot) is segments
+    assert sorted(calls) == sorted(['[\\w_.\\-]+', 'sh\\d+', '\\w+'])
+
+    # Analysis reflects changes to referenced templates.
+    schema.add_template(Template('job', '/shots/{job}'))
+    assert analysis._segments(shot) is not segments
+    assert analysis._literals(shot)[0] == '/shots/'
+
+
+@pytest.fixture
+def templates():
+    '''Return candidate templates.'''
+    return [
+        Template('model', '/jobs/{job}/assets/model/{lod}'),
+        Template('asset', '/jobs/{job}/assets/{kind}/{lod}'),
+        Template('shot', '/jobs/{job}/shots/{shot}'),
+        Template('library', '/library/{item}')
+    ]
+
+
+def test_exclusion_graph(templates):
+    '''Compute templates exclusive with each template.'''
+    model, asset, shot, library = templates
+    graph = ExclusionGraph(templates)
+
+    assert graph.exclusive(model) == frozenset([shot, library])
+    assert graph.exclusive(library) == frozenset([model, asset, shot])
+
+    built = ExclusionGraph(templates)
+    built.build()
+    for template in templates:
+        assert built.exclusive(template) == graph.exclusive(template)
+
+    assert graph.overlapping_pairs() == [(model, asset)]
+
+
+def test_ambiguous_pairs(templates):
+    '''Report template pairs with a path both can parse.'''
+    model, asset, _, _ = templates
+    pairs = ambiguous_pairs(templates)
+
+    assert len(pairs) == 1
+    template_a, template_b, path = pairs[0]
+    assert (template_a, template_b) == (model, asset)
+    assert model.parse(path)
+    assert asset.parse(path)
+
+
+def test_no_ambiguous_pairs():
+    '''Report no pairs when overlap is not demonstrated.'''
+    templates = [
+        Template('a', '/{name:[a-z]+}', anchor=Template.ANCHOR_BOTH),
+        Template('b', '/{name:[0-9]+}', anchor=Template.ANCHOR_BOTH)
+    ]
+    assert ExclusionGraph(templates).overlapping_pairs() == [
+        (templates[0], templates[1])
+    ]
+    assert ambiguous_pairs(templates) == []
+
+
+def test_parse_iter_skips_exclusive(templates):
+    '''Skip templates exclusive with an earlier match.'''
+    path = '/jobs/monty/assets/model/high'
+    graph = ExclusionGraph(templates)
+
+    with lucidity.instrument.Collector(key='template') as collector:
+        results = list(lucidity.parse_iter(path, templates, exclusions=graph))
+
+    assert results == list(lucidity.parse_iter(path, templates))
+    assert [template.name for _, template in results] == ['model', 'asset']
+
+    attempted = set(
+        entry['template'] for entry in collector.summary()
+        if entry['event'] == 'parse'
+    )
+    assert attempted == set(['model', 'asset'])
+
+
+@pytest.mark.parametrize(('pattern', 'expected'), [
+    ('/jobs/{job}/assets/{asset}', 0),
+    ('/jobs/{job}/{name}_v{version:\d+}', 0),
+    ('/jobs/{path:.+}{name}', 1),
+    ('/jobs/{path:.+}/{name}', 1),
+    ('/jobs/{path:[^/]+}/{name}', 0),
+    ('/jobs/{name:(\w+_?)+}', 1)
+], ids=[
+    'separated placeholders',
+    'adjacent placeholders within segment',
+    'adjacent placeholder matching separator',
+    'placeholder matching separator and literal',
+    'placeholder not matching literal',
+    'nested repetition'
+])
+def test_backtracking_risks(pattern, expected):
+    '''Report parts of pattern at risk of excessive backtracking.'''
+    assert len(backtracking_risks(Template('test', pattern))) == expected
@@ -0,0 +1,193 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import os
+import time
+import threading
+
+import pytest
+
+import lucidity
+from lucidity import background
+from lucidity.background import Task, Cancelled
+
+
+TEST_TEMPLATE_PATH = os.path.join(
+    os.path.dirname(__file__), '..', 'fixture', 'template'
+)
+
+TEST_SCHEMA_PATH = os.path.join(
+    os.path.dirname(__file__), '..', 'fixture', 'schema', 'schema_simple.yaml'
+)
+
+
+@pytest.fixture
+def templates():
+    '''Return templates to parse against.'''
+    return [
+        lucidity.Template('shot', '/jobs/{job}/shots/{shot}'),
+        lucidity.Template('job', '/jobs/{job}')
+    ]
+
+
+def test_task_result():
+    '''Return result of background function.'''
+    called = []
+    task = Task(lambda value, other=None: (value, other), 1, other=2)
+    task.add_done_callback(called.append)
+
+    assert task.result(timeout=5) == (1, 2)
+    assert task.done()
+    assert not task.running()
+    assert task.exception() is None
+    assert called == [task]
+
+    # Callbacks added once done are called immediately.
+    task.add_done_callback(called.append)
+    assert called == [task, task]
+
+
+def test_task_exception():
+    '''Raise exception from background function.'''
+    def fail():
+        raise ValueError('Failed.')
+
+    task = Task(fail)
+    with pytest.raises(ValueError):
+        task.result(timeout=5)
+
+    assert isinstance(task.exception(), ValueError)
+
+
+def test_task_cancel():
+    '''Cancel running task.'''
+    release = threading.Event()
+    task = Task(release.wait)
+    called = []
+    task.add_done_callback(called.append)
+
+    assert task.cancel()
+    assert task.cancelled()
+    assert task.done()
+    assert called == [task]
+
+    with pytest.raises(Cancelled):
+        task.result()
+
+    release.set()
+
+
+def test_task_timeout():
+    '''Fail to get result before task finishes.'''
+    release = threading.Event()
+    task = Task(release.wait)
+    with pytest.raises(RuntimeError):
+        task.result(timeout=0.01)
+
+    release.set()
+    task.result(timeout=5)
+    assert not task.cancel()
+
+
+def test_discover_templates():
+    '''Discover templates in background.'''
+    task = background.discover_templates([TEST_TEMPLATE_PATH])
+    assert sorted(template.name for template in task.result(timeout=5)) == (
+        sorted(
+            template.name for template in
+            lucidity.discover_templates([TEST_TEMPLATE_PATH])
+        )
+    )
+
+
+def test_load_schema():
+    '''Load schema in background.'''
+    schema = background.load_schema(TEST_SCHEMA_PATH).result(timeout=5)
+    assert isinstance(schema, lucidity.Schema)
+    assert schema.templates
+
+
+def test_parse_many(templates):
+    '''Iterate results parsed in background.'''
+    paths = ['/jobs/a/shots/{0}'.format(index) for index in range(50)]
+    paths.append('/other')
+
+    job = background.parse_many(paths, templates, batch_size=7)
+    results = list(job)
+
+    assert [path for path, _, _ in results] == paths
+    assert results[0][1] == {'job': 'a', 'shot': '0'}
+    assert results[0][2].name == 'shot'
+    assert results[-1] == ('/other', None, None)
+    assert list(job) == []
+
+
+def test_parse_many_all_matches(templates):
+    '''Iterate all matches parsed in background.'''
+    job = background.parse_many(
+        ['/jobs/a/shots/b'], templates, all_matches=True
+    )
+    ((path, matches),) = list(job)
+    assert path == '/jobs/a/shots/b'
+    assert sorted(template.name for _, template in matches) == ['job', 'shot']
+
+
+def test_parse_many_poll(templates):
+    '''Poll for results without blocking.'''
+    paths = ['/jobs/{0}'.format(index) for index in range(100)]
+    job = background.parse_many(paths, templates, batch_size=10)
+
+    results = []
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        results.extend(job.poll())
+        if job.done() and len(results) == len(paths):
+            break
+
+        time.sleep(0.001)
+
+    assert [path for path, _, _ in results] == paths
+    assert job.poll() == []
+
+
+def test_parse_many_cancel(templates):
+    '''Stop parsing when cancelled.'''
+    def paths():
+        index = 0
+        while True:
+            yield '/jobs/{0}'.format(index)
+            index += 1
+
+    job = background.parse_many(paths(), templates, batch_size=10)
+    iterator = iter(job)
+    next(iterator)
+
+    called = []
+    job.add_done_callback(called.append)
+    assert job.cancel()
+    assert job.cancelled()
+
+    # Remaining queued results may be taken before iteration stops.
+    for _ in iterator:
+        pass
+
+    deadline = time.time() + 5
+    while not job.done() and time.time() < deadline:
+        time.sleep(0.001)
+
+    assert job.done()
+    assert called == [job]
+
+
+def test_parse_many_error():
+    '''Raise error that stopped parsing.'''
+    def paths():
+        yield '/jobs/a'
+        raise ValueError('Failed.')
+
+    job = background.parse_many(
+        paths(), [lucidity.Template('job', '/jobs/{job}')]
+    )
+    with pytest.raises(ValueError):
+        list(job)
@@ -0,0 +1,95 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import pytest
+
+import lucidity
+from lucidity import Template
+from lucidity.batch import BatchParser, parse_many
+
+
+PATHS = [
+    '/jobs/monty/assets/model/high',
+    '/jobs/monty/assets/model/high/sandbox',
+    '/jobs/monty/assets/model/low',
+    '/jobs/monty/assets/rig/anim',
+    '/jobs/monty/assets/rig/anim.v001',
+    '/jobs/circus/assets/model/high',
+    '/jobs/circus/assets/model/high_v001',
+    '/jobs/circus/other',
+    '/jobs',
+    ''
+]
+
+
+@pytest.mark.parametrize(('pattern', 'anchor', 'mode'), [
+    ('/jobs/{job}/assets/model/{lod}', Template.ANCHOR_START, Template.RELAXED),
+    ('/jobs/{job}/assets/model/{lod}', Template.ANCHOR_BOTH, Template.RELAXED),
+    ('/jobs/{job}/assets/model/{lod}', Template.ANCHOR_END, Template.RELAXED),
+    ('/jobs/{job}/assets/model/{lod}', None, Template.RELAXED),
+    ('/jobs/{job}/assets/{task}/{lod}_v{version:\d+}', Template.ANCHOR_BOTH,
+     Template.RELAXED),
+    ('/jobs/{job}/assets/{job}/{lod}', Template.ANCHOR_START,
+     Template.STRICT),
+    ('/jobs/{job}/assets/{path:.+}', Template.ANCHOR_START, Template.RELAXED),
+    ('/jobs/{job}', Template.ANCHOR_START, Template.RELAXED),
+    ('{root}', Template.ANCHOR_BOTH, Template.RELAXED)
+], ids=[
+    'anchor start',
+    'anchor both',
+    'anchor end',
+    'anchor none',
+    'custom expression',
+    'strict duplicates',
+    'expression matching separator',
+    'split at start',
+    'no separator'
+])
+def test_equivalent_to_parse(pattern, anchor, mode):
+    '''Parse with same results as template.'''
+    template = Template(
+        'test', pattern, anchor=anchor, duplicate_placeholder_mode=mode
+    )
+    parser = BatchParser([template], size=2)
+
+    for path in PATHS:
+        try:
+            expected = template.parse(path)
+        except lucidity.ParseError:
+            with pytest.raises(lucidity.ParseError):
+                parser.parse(path)
+        else:
+            assert parser.parse(path) == (expected, template)
+
+
+def test_parse_iter():
+    '''Yield all matching templates in order.'''
+    templates = [
+        Template('model', '/jobs/{job}/assets/model/{lod}'),
+        Template('sandbox', '/jobs/{job}/assets/model/{lod}/sandbox'),
+        Template('rig', '/jobs/{job}/assets/rig/{rig_type}')
+    ]
+    parser = BatchParser(templates)
+    result = parser.parse_iter('/jobs/monty/assets/model/high/sandbox')
+    assert [template.name for _, template in result] == ['model', 'sandbox']
+
+
+def test_parse_many():
+    '''Yield first match or None for each path.'''
+    templates = [
+        Template('model', '/jobs/{job}/assets/model/{lod}'),
+        Template('rig', '/jobs/{job}/assets/rig/{rig_type}')
+    ]
+    result = list(parse_many(PATHS[:4] + ['/other'], templates))
+
+    assert [
+        (path, data, template and template.name)
+        for path, data, template in result
+    ] == [
+        (PATHS[0], {'job': 'monty', 'lod': 'high'}, 'model'),
+        (PATHS[1], {'job': 'monty', 'lod': 'high'}, 'model'),
+        (PATHS[2], {'job': 'monty', 'lod': 'low'}, 'model'),
+        (PATHS[3], {'job': 'monty', 'rig_type': 'anim'}, 'rig'),
+        ('/other', None, None)
+    ]
@@ -0,0 +1,129 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import pytest
+
+from lucidity.cache import Cache, canonical
+from lucidity.error import ParseError
+
+
+class Timer(object):
+    '''Controllable timer.'''
+
+    def __init__(self):
+        '''Initialise at time zero.'''
+        self.now = 0
+
+    def __call__(self):
+        '''Return current time.'''
+        return self.now
+
+
+def test_get_and_set():
+    '''Store and retrieve values counting hits and misses.'''
+    cache = Cache()
+    assert cache.get('key') == (False, None)
+
+    cache.set('key', 'value')
+    assert cache.get('key') == (True, 'value')
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_eviction():
+    '''Evict least recently used entry when full.'''
+    cache = Cache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.get('c') == (True, 3)
+    assert cache.evictions == 1
+    assert len(cache) == 2
+
+
+def test_expiry():
+    '''Expire entries after ttl.'''
+    timer = Timer()
+    cache = Cache(ttl=10, timer=timer)
+    cache.set('key', 'value')
+
+    timer.now = 9
+    assert cache.get('key') == (True, 'value')
+
+    timer.now = 10
+    assert cache.get('key') == (False, None)
+    assert len(cache) == 0
+
+
+def test_call():
+    '''Memoize function result returning copies.'''
+    cache = Cache()
+    calls = []
+
+    def function():
+        calls.append(True)
+        return ({'a': {'b': 'value'}}, 'template')
+
+    first = cache.call('key', function)
+    first[0]['a']['b'] = 'modified'
+    second = cache.call('key', function)
+
+    assert second == ({'a': {'b': 'value'}}, 'template')
+    assert len(calls) == 1
+    assert cache.info() == {
+        'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1, 'maxsize': 1024
+    }
+
+
+def test_call_error():
+    '''Memoize expected errors.'''
+    cache = Cache()
+    calls = []
+
+    def function():
+        calls.append(True)
+        raise ParseError('failed')
+
+    for _ in range(2):
+        with pytest.raises(ParseError) as exception:
+            cache.call('key', function, errors=(ParseError,))
+
+        assert str(exception.value) == 'failed'
+
+    assert len(calls) == 1
+
+
+def test_call_unhashable_key():
+    '''Call function without caching for unhashable key.'''
+    cache = Cache()
+    assert cache.call(['key'], lambda: 'value') == 'value'
+    assert len(cache) == 0
+
+
+def test_canonical():
+    '''Produce equal canonical forms for equal data.'''
+    assert canonical({'a': {'b': 1}, 'c': 2}) == canonical(
+        {'c': 2, 'a': {'b': 1}}
+    )
+    assert canonical({'a': [1]}) != canonical({'a': (1,)})
+
+    with pytest.raises(TypeError):
+        canonical({'a': set()})
+
+
+def test_clear_prefix():
+    '''Clear only entries with keys starting with prefix.'''
+    cache = Cache()
+    cache.set(('a', 1), 1)
+    cache.set(('a', 2), 2)
+    cache.set(('b', 1), 3)
+    cache.set('a', 4)
+
+    cache.clear(prefix=('a',))
+    assert len(cache) == 2
+    assert cache.get(('b', 1)) == (True, 3)
+    assert cache.get('a') == (True, 4)
@@ -0,0 +1,225 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import os
+import sys
+import json
+from StringIO import StringIO
+
+import pytest
+
+from lucidity import cli
+
+
+TEST_TEMPLATE_PATH = os.path.join(
+    os.path.dirname(__file__), '..', 'fixture', 'template'
+)
+
+SOURCE = '''
+paths:
+  shot:
+    pattern: "/jobs/{job}/shots/{shot}"
+    anchor: both
+  job:
+    pattern: "/jobs/{job}"
+    anchor: both
+  entry:
+    pattern: "/{root}/{name}/shots/{shot}"
+    anchor: both
+'''
+
+TARGET = '''
+paths:
+  shot:
+    pattern: "/archive/{job}/{shot}"
+'''
+
+
+@pytest.fixture
+def schemas(tmpdir):
+    '''Return paths to source and target YAML schemas.'''
+    source = tmpdir.join('source.yaml')
+    source.write(SOURCE)
+    target = tmpdir.join('target.yaml')
+    target.write(TARGET)
+    return str(source), str(target)
+
+
+def run(arguments, stdin, monkeypatch, capsys):
+    '''Run command line with *arguments* and *stdin*.
+
+    Return ``(code, results)`` where *results* are the decoded output lines.
+
+    '''
+    monkeypatch.setattr(sys, 'stdin', StringIO(stdin))
+    code = cli.main(arguments)
+    output = capsys.readouterr()[0]
+    return code, [json.loads(line) for line in output.splitlines()]
+
+
+@pytest.mark.parametrize(('options', 'expected'), [
+    ([], [
+        {'path': '/jobs/a', 'template': 'job', 'data': {'job': 'a'}}
+    ]),
+    (['--misses'], [
+        {'path': '/jobs/a', 'template': 'job', 'data': {'job': 'a'}},
+        {'path': '/other', 'template': None, 'data': None}
+    ])
+], ids=[
+    'first match',
+    'misses'
+])
+def test_parse(schemas, options, expected, monkeypatch, capsys):
+    '''Parse paths from standard input.'''
+    code, results = run(
+        ['parse', '--schema', schemas[0]] + options,
+        '/jobs/a\n/other\n\n', monkeypatch, capsys
+    )
+    assert code == 0
+    assert results == expected
+
+
+def test_parse_all(schemas, monkeypatch, capsys):
+    '''Parse paths against all templates.'''
+    code, results = run(
+        ['parse', '--schema', schemas[0], '--all'], '/jobs/a/shots/b\n',
+        monkeypatch, capsys
+    )
+    assert code == 0
+    assert sorted(results, key=lambda result: result['template']) == [
+        {'path': '/jobs/a/shots/b', 'template': 'entry',
+         'data': {'root': 'jobs', 'name': 'a', 'shot': 'b'}},
+        {'path': '/jobs/a/shots/b', 'template': 'shot',
+         'data': {'job': 'a', 'shot': 'b'}}
+    ]
+
+
+def test_parse_null_separated_files(schemas, tmpdir, monkeypatch, capsys):
+    '''Parse NUL separated paths from files.'''
+    listing = tmpdir.join('listing')
+    listing.write('/jobs/a\0/jobs/b\0', mode='wb')
+
+    code, results = run(
+        ['parse', '-s', schemas[0], '-0', str(listing), str(listing)], '',
+        monkeypatch, capsys
+    )
+    assert code == 0
+    assert [result['path'] for result in results] == [
+        '/jobs/a', '/jobs/b', '/jobs/a', '/jobs/b'
+    ]
+
+
+def test_parse_workers(schemas, monkeypatch, capsys):
+    '''Parse paths across worker processes preserving order.'''
+    paths = ['/jobs/{0}'.format(index) for index in range(100)]
+    code, results = run(
+        ['parse', '-s', schemas[0], '--workers', '2', '--chunk-size', '7'],
+        '\n'.join(paths), monkeypatch, capsys
+    )
+    assert code == 0
+    assert [result['path'] for result in results] == paths
+
+
+def test_parse_discover(monkeypatch, capsys):
+    '''Parse paths against discovered templates.'''
+    code, results = run(
+        ['parse', '--discover', TEST_TEMPLATE_PATH], '/a/pattern\n',
+        monkeypatch, capsys
+    )
+    assert code == 0
+    assert results == [{'path': '/a/pattern', 'template': 'a', 'data': {}}]
+
+
+def test_parse_invalid_utf8(schemas, monkeypatch, capsys):
+    '''Output paths that are not valid UTF-8.'''
+    code, results = run(
+        ['parse', '-s', schemas[0], '--misses'], '/\xff\n', monkeypatch, capsys
+    )
+    assert code == 0
+    assert results == [{'path': u'/�', 'template': None, 'data': None}]
+
+
+@pytest.mark.parametrize(('options', 'expected'), [
+    (['--template', 'job'], [
+        {'data': {'job': 'a', 'shot': 'b'}, 'template': 'job',
+         'path': '/jobs/a'},
+        {'data': {'shot': 'c'}, 'template': None, 'path': None}
+    ]),
+    (['--template', 'shot'], [
+        {'data': {'job': 'a', 'shot': 'b'}, 'template': 'shot',
+         'path': '/jobs/a/shots/b'},
+        {'data': {'shot': 'c'}, 'template': None, 'path': None}
+    ])
+], ids=[
+    'job',
+    'shot'
+])
+def test_format(schemas, options, expected, monkeypatch, capsys):
+    '''Format JSON records from standard input.'''
+    code, results = run(
+        ['format', '-s', schemas[0], '--misses'] + options,
+        '{"job": "a", "shot": "b"}\n{"shot": "c"}\n', monkeypatch, capsys
+    )
+    assert code == 0
+    assert results == expected
+
+
+def test_format_invalid_records(schemas, monkeypatch, capsys):
+    '''Report invalid JSON records and continue with the rest.'''
+    code, results = run(
+        ['format', '-s', schemas[0], '--template', 'job'],
+        '{"job": "a"\n["job"]\n{"job": "b"}\n', monkeypatch, capsys
+    )
+    assert code == 0
+    assert [result['path'] for result in results] == [None, None, '/jobs/b']
+    assert [result.get('record') for result in results[:2]] == [
+        '{"job": "a"', '["job"]'
+    ]
+    assert results[0]['error'].startswith('Invalid JSON: ')
+    assert results[1]['error'] == 'Expected a JSON object.'
+
+
+def test_format_non_string_values(schemas, monkeypatch, capsys):
+    '''Report records with values that cannot be formatted and continue.'''
+    code, results = run(
+        ['format', '-s', schemas[0], '--template', 'shot'],
+        '{"job": "a", "shot": 3}\n{"job": "a", "shot": "b"}\n',
+        monkeypatch, capsys
+    )
+    assert code == 0
+    assert [result['path'] for result in results] == [
+        None, '/jobs/a/shots/b'
+    ]
+    assert results[0]['record'] == '{"job": "a", "shot": 3}'
+    assert results[0]['error'].startswith('Could not format data: ')
+
+
+def test_remap(schemas, monkeypatch, capsys):
+    '''Remap paths to target schema.'''
+    code, results = run(
+        ['remap', '-s', schemas[0], '--target', schemas[1], '--all',
+         '--misses'],
+        '/jobs/a/shots/b\n/jobs/a\n', monkeypatch, capsys
+    )
+    assert code == 0
+    assert results == [
+        {'path': '/jobs/a/shots/b', 'template': 'shot',
+         'data': {'job': 'a', 'shot': 'b'}, 'target': '/archive/a/b'},
+        {'path': '/jobs/a', 'template': None, 'data': None, 'target': None}
+    ]
+
+
+@pytest.mark.parametrize('arguments', [
+    ['format', '--template', 'missing'],
+    ['parse', 'missing.txt']
+], ids=[
+    'missing template',
+    'missing input'
+])
+def test_failure(schemas, arguments, monkeypatch, capsys):
+    '''Report failures with non zero exit code.'''
+    arguments = arguments[:1] + ['-s', schemas[0]] + arguments[1:]
+    monkeypatch.setattr(sys, 'stdin', StringIO('{}\n'))
+    assert cli.main(arguments) == 1
+    assert capsys.readouterr()[1].startswith('lucidity: ')
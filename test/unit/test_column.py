@@ -0,0 +1,93 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+import lucidity
+from lucidity.column import parse_columns, parse_columns_iter
+
+
+@pytest.fixture
+def templates():
+    '''Return candidate templates.'''
+    return [
+        lucidity.Template('model', '/jobs/{job.code}/assets/model/{lod}'),
+        lucidity.Template('rig', '/jobs/{job.code}/assets/rig/{rig_type}')
+    ]
+
+
+PATHS = [
+    '/jobs/monty/assets/model/high',
+    '/not/matching',
+    '/jobs/circus/assets/rig/anim'
+]
+
+
+def test_parse_columns(templates):
+    '''Parse paths into lists of columns.'''
+    columns = parse_columns(PATHS, templates, arrays=False)
+
+    assert len(columns) == 3
+    assert columns.templates == templates
+    assert columns.template == [0, -1, 1]
+    assert columns.miss == [False, True, False]
+    assert columns.keys() == ['job.code', 'lod', 'rig_type']
+    assert columns['job.code'] == ['monty', None, 'circus']
+    assert columns['lod'] == ['high', None, None]
+    assert columns['rig_type'] == [None, None, 'anim']
+
+
+def test_parse_columns_empty(templates):
+    '''Parse no paths into empty columns.'''
+    columns = parse_columns([], templates, arrays=False)
+    assert len(columns) == 0
+    assert columns['lod'] == []
+
+
+def test_parse_columns_iter(templates):
+    '''Parse paths into chunks of columns.'''
+    chunks = list(parse_columns_iter(PATHS, templates, 2, arrays=False))
+    assert [chunk.template for chunk in chunks] == [[0, -1], [1]]
+
+
+def test_parse_columns_strict_mismatch():
+    '''Fall through to later template on invalid duplicates.'''
+    templates = [
+        lucidity.Template(
+            'strict', '/{a}/{a}',
+            duplicate_placeholder_mode=lucidity.Template.STRICT
+        ),
+        lucidity.Template('relaxed', '/{a}/{b}')
+    ]
+    columns = parse_columns(['/x/y'], templates, arrays=False)
+    assert columns.template == [1]
+    assert columns['b'] == ['y']
+
+
+def test_parse_columns_arrays(templates):
+    '''Parse paths into NumPy array columns.'''
+    numpy = pytest.importorskip('numpy')
+    columns = parse_columns(PATHS, templates, arrays=True)
+
+    assert columns.template.dtype == numpy.int32
+    assert columns.miss.tolist() == [False, True, False]
+    assert columns['lod'].tolist() == ['high', None, None]
+
+
+def test_optional_modules_loaded_on_use():
+    '''Import NumPy and other optional modules only when used.'''
+    source = os.path.dirname(os.path.dirname(lucidity.__file__))
+    script = (
+        'import sys\n'
+        'sys.path.insert(0, {0!r})\n'
+        'import lucidity\n'
+        'print(sorted(name for name in ("numpy", "sqlite3", "mmap") '
+        'if name in sys.modules))\n'
+    ).format(source)
+    output = subprocess.check_output([sys.executable, '-c', script])
+    assert output.strip() == '[]'
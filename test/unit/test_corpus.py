@@ -0,0 +1,127 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import re
+from StringIO import StringIO
+
+import pytest
+
+import lucidity
+from lucidity.corpus import Generator, generate, VALID, NEAR_MISS, NON_MATCHING
+
+
+@pytest.fixture
+def templates():
+    '''Return candidate templates.'''
+    return [
+        lucidity.Template(
+            'shot', '/jobs/{job.code}/shots/{shot:sh\d+}/v{version:\d{3\}}',
+            anchor=lucidity.Template.ANCHOR_BOTH
+        ),
+        lucidity.Template(
+            'asset', '/assets/{name:[a-z][a-z0-9]*}/{name}.{ext:(abc|ma)}',
+            duplicate_placeholder_mode=lucidity.Template.STRICT
+        ),
+        lucidity.Template('library', '/library/{item:[^/]+}')
+    ]
+
+
+@pytest.mark.parametrize(('expression', 'regex'), [
+    ('[\w_.\-]+', None),
+    ('\d{4\}', '\d{4}'),
+    ('[^/_]+', None),
+    ('(abc|def)x?', None),
+    ('(?P<a>[a-c])-(?P=a)', None),
+    ('[A-Fa-f0-9]{2,3\}', '[A-Fa-f0-9]{2,3}'),
+    ('v\d+(?!x)', None)
+], ids=[
+    'default',
+    'fixed repeat',
+    'negated set',
+    'branch',
+    'backreference',
+    'ranges',
+    'lookahead'
+])
+def test_sampled_values_match_expression(expression, regex):
+    '''Sample values matching placeholder expression.'''
+    template = lucidity.Template('test', '{value:' + expression + '}')
+    if regex is None:
+        regex = expression
+
+    generator = Generator([template], seed=0)
+    for _ in range(50):
+        value = generator.data(template)['value']
+        assert re.match('(?:{0})\\Z'.format(regex), value)
+
+
+def test_valid_paths(templates):
+    '''Generate valid paths parsable by their template.'''
+    generator = Generator(templates, seed=0)
+    for kind, template, path, data in generator.samples(200):
+        assert kind == VALID
+        assert template.parse(path) == data
+
+
+def test_reproducible(templates):
+    '''Generate same paths for same seed.'''
+    first = list(Generator(templates, seed=5, near_miss=0.5).paths(50))
+    second = list(Generator(templates, seed=5, near_miss=0.5).paths(50))
+    third = list(Generator(templates, seed=6, near_miss=0.5).paths(50))
+    assert first == second
+    assert first != third
+
+    assert list(generate(templates, 50, seed=5, near_miss=0.5)) == first
+
+
+def test_proportions(templates):
+    '''Generate requested proportions of each kind of path.'''
+    generator = Generator(templates, seed=0, near_miss=0.3, non_matching=0.2)
+    counts = {VALID: 0, NEAR_MISS: 0, NON_MATCHING: 0}
+    for kind, _, _, _ in generator.samples(2000):
+        counts[kind] += 1
+
+    assert 0.45 < counts[VALID] / 2000.0 < 0.55
+    assert 0.25 < counts[NEAR_MISS] / 2000.0 < 0.35
+    assert 0.15 < counts[NON_MATCHING] / 2000.0 < 0.25
+
+
+def test_verify(templates):
+    '''Generate misses that no template parses when verifying.'''
+    generator = Generator(
+        templates, seed=0, near_miss=0.5, non_matching=0.5, verify=True
+    )
+    for kind, template, path, data in generator.samples(200):
+        assert kind in (NEAR_MISS, NON_MATCHING)
+        for candidate in templates:
+            with pytest.raises(lucidity.ParseError):
+                candidate.parse(path)
+
+
+def test_write(templates, tmpdir):
+    '''Write generated paths to stream and file.'''
+    stream = StringIO()
+    Generator(templates, seed=1).write(stream, 25)
+    lines = stream.getvalue().split('\n')
+    assert len(lines) == 26
+    assert lines[-1] == ''
+
+    target = tmpdir.join('corpus.txt')
+    Generator(templates, seed=1).write(str(target), 25)
+    assert target.read() == stream.getvalue()
+
+
+@pytest.mark.parametrize(('kwargs', 'templates'), [
+    ({'near_miss': 0.7, 'non_matching': 0.7}, [lucidity.Template('a', '/a')]),
+    ({'near_miss': -0.1}, [lucidity.Template('a', '/a')]),
+    ({}, [])
+], ids=[
+    'proportions over one',
+    'negative proportion',
+    'no templates'
+])
+def test_invalid_arguments(kwargs, templates):
+    '''Fail to create generator with invalid arguments.'''
+    with pytest.raises(ValueError):
+        Generator(templates, **kwargs)
@@ -0,0 +1,238 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import socket
+import threading
+
+import pytest
+
+import lucidity
+from lucidity import daemon
+from lucidity.daemon import Server, Client
+
+
+@pytest.fixture
+def schema():
+    '''Return schema to serve.'''
+    schema = lucidity.Schema([
+        lucidity.Template(
+            'shot', '/jobs/{job}/shots/{shot}',
+            anchor=lucidity.Template.ANCHOR_BOTH
+        ),
+        lucidity.Template(
+            'job', '/jobs/{job}', anchor=lucidity.Template.ANCHOR_BOTH
+        )
+    ])
+    schema.add_reference(lucidity.Template('root', '/jobs'))
+    schema.add_template(lucidity.Template(
+        'project', '{@root}/{project}/root',
+        anchor=lucidity.Template.ANCHOR_BOTH
+    ))
+    return schema
+
+
+@pytest.fixture
+def address(tmpdir):
+    '''Return socket address.'''
+    return str(tmpdir.join('lucidity.sock'))
+
+
+@pytest.fixture
+def server(request, schema, address):
+    '''Return running server for *schema*.'''
+    server = Server(address, schema)
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={'poll_interval': 0.01}
+    )
+    thread.daemon = True
+    thread.start()
+
+    def cleanup():
+        server.shutdown()
+        server.server_close()
+
+    request.addfinalizer(cleanup)
+    return server
+
+
+def test_parse(server, address):
+    '''Parse through server.'''
+    with Client(address) as client:
+        data, template = client.parse('/jobs/monty/shots/sh01')
+        assert client.connected
+
+    assert data == {'job': 'monty', 'shot': 'sh01'}
+    assert template.name == 'shot'
+    assert template.anchor == lucidity.Template.ANCHOR_BOTH
+    assert template.parse('/jobs/monty/shots/sh01') == data
+
+
+def test_parse_all(server, address):
+    '''Parse all matches through server.'''
+    with Client(address) as client:
+        matches = client.parse_all('/jobs/monty/root')
+
+    assert len(matches) == 1
+    data, template = matches[0]
+    assert data == {'project': 'monty'}
+    assert template.name == 'project'
+    assert template.pattern == '/jobs/{project}/root'
+
+
+def test_parse_many(server, address):
+    '''Parse many paths through server in batches.'''
+    paths = ['/jobs/{0}/shots/a'.format(index) for index in range(5)]
+    paths.append('/other')
+
+    with Client(address, batch_size=2) as client:
+        results = list(client.parse_many(paths))
+
+    assert [path for path, _, _ in results] == paths
+    assert results[0][1] == {'job': '0', 'shot': 'a'}
+    assert results[-1] == ('/other', None, None)
+
+
+def test_format(server, address):
+    '''Format through server.'''
+    with Client(address) as client:
+        path, template = client.format({'project': 'monty'})
+        assert path == '/jobs/monty/root'
+        assert template.name == 'project'
+
+        assert sorted(
+            template.name for _, template in
+            client.format_all({'job': 'monty', 'shot': 'sh01'})
+        ) == ['job', 'shot']
+
+
+@pytest.mark.parametrize(('operation', 'argument', 'exception'), [
+    ('parse', '/other', lucidity.ParseError),
+    ('format', {}, lucidity.FormatError)
+], ids=[
+    'parse',
+    'format'
+])
+def test_errors(server, address, operation, argument, exception):
+    '''Raise errors reported by server and keep connection usable.'''
+    with Client(address) as client:
+        with pytest.raises(exception):
+            getattr(client, operation)(argument)
+
+        assert client.connected
+        assert client.parse('/jobs/monty')[0] == {'job': 'monty'}
+
+
+def test_unknown_schema(server, address):
+    '''Fail to use schema not served.'''
+    with Client(address, schema='missing') as client:
+        with pytest.raises(lucidity.NotFound):
+            client.parse('/jobs/monty')
+
+
+def test_fallback(schema, address):
+    '''Fall back to local schema when server is unavailable.'''
+    loaded = []
+
+    def load():
+        loaded.append(True)
+        return schema
+
+    client = Client(address, fallback=load)
+    assert client.parse('/jobs/monty')[0] == {'job': 'monty'}
+    assert client.format({'job': 'monty'})[0] == '/jobs/monty'
+    assert not client.connected
+    assert loaded == [True]
+
+
+def test_fallback_results_match_server(server, schema, address):
+    '''Return results of the same form from server and fallback.'''
+    with Client(address) as client:
+        served = client.parse('/jobs/monty/shots/sh010')
+
+    fallback = Client(address + '.missing', fallback=schema)
+    local = fallback.parse('/jobs/monty/shots/sh010')
+    assert not fallback.connected
+
+    assert local[0] == served[0]
+    assert [type(value) for value in local[0].values()] == [unicode, unicode]
+    assert local[1].name == served[1].name
+    assert local[1] is not schema['shot']
+    assert type(fallback.format({'job': 'monty'})[0]) is unicode
+
+
+def test_invalid_byte_string(server, address):
+    '''Fail only the call with a byte string that is not UTF-8.'''
+    with Client(address, fallback=lucidity.Schema()) as client:
+        with pytest.raises(ValueError):
+            client.parse('/jobs/\xff')
+
+        assert client.parse('/jobs/monty')[0] == {'job': 'monty'}
+        assert client.connected
+
+
+def test_default_placeholder_expression(request, address):
+    '''Reconstruct templates with their default placeholder expression.'''
+    schema = lucidity.Schema([lucidity.Template(
+        'job', '/jobs/{job}', anchor=lucidity.Template.ANCHOR_BOTH,
+        default_placeholder_expression='[a-z]+'
+    )])
+    server = Server(address, schema)
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={'poll_interval': 0.01}
+    )
+    thread.daemon = True
+    thread.start()
+
+    def cleanup():
+        server.shutdown()
+        server.server_close()
+
+    request.addfinalizer(cleanup)
+
+    with Client(address) as client:
+        _, template = client.parse('/jobs/monty')
+
+    with pytest.raises(lucidity.ParseError):
+        template.parse('/jobs/monty_1')
+
+
+def test_unavailable(address):
+    '''Fail when server is unavailable and no fallback given.'''
+    with pytest.raises(socket.error):
+        Client(address).parse('/jobs/monty')
+
+
+def test_stale_socket(schema, address):
+    '''Replace stale socket left by server no longer running.'''
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(address)
+    stale.close()
+
+    server = Server(address, schema)
+    try:
+        with pytest.raises(ValueError):
+            Server(address, schema)
+    finally:
+        server.server_close()
+
+
+def test_existing_file(schema, address):
+    '''Refuse to replace a file that is not a socket.'''
+    with open(address, 'w') as handle:
+        handle.write('data')
+
+    with pytest.raises(ValueError):
+        Server(address, schema)
+
+    with open(address) as handle:
+        assert handle.read() == 'data'
+
+
+def test_invalid_frame(server, address):
+    '''Report oversized frame.'''
+    connection = daemon.connect(address)
+    connection.sendall(daemon._HEADER.pack(daemon.MAX_FRAME_SIZE + 1))
+    response = daemon.receive(connection)
+    connection.close()
+    assert response['error'] == 'ValueError'
@@ -0,0 +1,199 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import pytest
+
+import lucidity
+from lucidity.database import Index
+
+
+@pytest.fixture
+def templates():
+    '''Return templates to index.'''
+    return [
+        lucidity.Template(
+            'version', '/jobs/{job.code}/{sequence}/{asset}/v{version}',
+            anchor=lucidity.Template.ANCHOR_BOTH
+        ),
+        lucidity.Template(
+            'asset', '/jobs/{job.code}/{sequence}/{asset}',
+            anchor=lucidity.Template.ANCHOR_BOTH
+        )
+    ]
+
+
+@pytest.fixture
+def paths():
+    '''Return paths to index.'''
+    return [
+        '/jobs/monty/sq01/cat/v001',
+        '/jobs/monty/sq01/cat/v002',
+        '/jobs/monty/sq01/dog/v001',
+        '/jobs/monty/sq02/cat/v001',
+        '/jobs/circus/sq01/cat/v001',
+        '/jobs/monty/sq01/cat',
+        '/jobs/mont/sq01/cat/v001',
+        '/other'
+    ]
+
+
+@pytest.fixture
+def index(templates, paths):
+    '''Return index of parsed *paths*.'''
+    index = Index(templates=templates)
+    index.add(lucidity.batch.parse_many(paths, templates))
+    return index
+
+
+def test_add(index):
+    '''Index parse results skipping misses.'''
+    assert index.templates() == ['asset', 'version']
+    assert len(list(index.query())) == 7
+
+
+@pytest.mark.parametrize(('data', 'template', 'root', 'expected'), [
+    ({'asset': 'cat', 'sequence': 'sq01'}, 'version', None, [
+        '/jobs/circus/sq01/cat/v001',
+        '/jobs/monty/sq01/cat/v001',
+        '/jobs/monty/sq01/cat/v002',
+        '/jobs/mont/sq01/cat/v001'
+    ]),
+    ({'job': {'code': 'monty'}, 'asset': 'cat'}, None, None, [
+        '/jobs/monty/sq01/cat',
+        '/jobs/monty/sq01/cat/v001',
+        '/jobs/monty/sq01/cat/v002',
+        '/jobs/monty/sq02/cat/v001'
+    ]),
+    ({'job.code': 'monty', 'version': '002'}, None, None, [
+        '/jobs/monty/sq01/cat/v002'
+    ]),
+    ({'version': 1}, None, None, []),
+    ({'missing': 'value'}, None, None, []),
+    (None, 'version', '/jobs/monty/sq01', [
+        '/jobs/monty/sq01/cat/v001',
+        '/jobs/monty/sq01/cat/v002',
+        '/jobs/monty/sq01/dog/v001'
+    ])
+], ids=[
+    'single template',
+    'nested data',
+    'dotted keys',
+    'non string value',
+    'missing placeholder',
+    'root'
+])
+def test_query(index, data, template, root, expected):
+    '''Query indexed paths by partial data.'''
+    results = index.query(data, template=template, root=root)
+    assert sorted(path for path, _, _ in results) == sorted(expected)
+
+
+def test_query_data(index):
+    '''Return parsed data for queried paths.'''
+    results = list(index.query({'version': '002'}))
+    assert results == [(
+        '/jobs/monty/sq01/cat/v002',
+        {'job': {'code': 'monty'}, 'sequence': 'sq01', 'asset': 'cat',
+         'version': '002'},
+        'version'
+    )]
+
+
+def test_update(index, templates):
+    '''Update indexed paths under root.'''
+    paths = [
+        '/jobs/monty/sq01/cat/v002',
+        '/jobs/monty/sq01/cat/v003',
+        '/jobs/monty/sq01/cat'
+    ]
+    added, removed = index.update(
+        '/jobs/monty/sq01/cat', lucidity.batch.parse_many(paths, templates)
+    )
+    assert (added, removed) == (1, 1)
+
+    assert sorted(path for path, _, _ in index.query({'asset': 'cat'})) == [
+        '/jobs/circus/sq01/cat/v001',
+        '/jobs/mont/sq01/cat/v001',
+        '/jobs/monty/sq01/cat',
+        '/jobs/monty/sq01/cat/v002',
+        '/jobs/monty/sq01/cat/v003',
+        '/jobs/monty/sq02/cat/v001'
+    ]
+
+
+def test_remove(index):
+    '''Remove indexed paths under root.'''
+    assert index.remove('/jobs/monty/') == 5
+    assert sorted(path for path, _, _ in index.query()) == [
+        '/jobs/circus/sq01/cat/v001',
+        '/jobs/mont/sq01/cat/v001'
+    ]
+
+
+def test_discard(index):
+    '''Remove indexed paths keeping paths below them.'''
+    assert index.discard(['/jobs/monty/sq01/cat', '/missing']) == 1
+    assert len(list(index.query({'job.code': 'monty', 'asset': 'cat'}))) == 3
+
+
+def test_persistence(tmpdir, templates, paths):
+    '''Reopen persisted index.'''
+    filepath = str(tmpdir.join('index.db'))
+    with Index(filepath, templates) as index:
+        index.add(lucidity.batch.parse_many(paths, templates))
+
+    with Index(filepath) as index:
+        assert index.templates() == ['asset', 'version']
+        assert len(list(index.query({'asset': 'cat'}))) == 6
+
+    # Changing pattern of a template discards its rows.
+    changed = lucidity.Template('asset', '/jobs/{job.code}/{asset}')
+    with Index(filepath, [changed]) as index:
+        assert len(list(index.query(template='asset'))) == 0
+        assert len(list(index.query(template='version'))) == 6
+
+
+def test_byte_string_values(templates):
+    '''Index values that are not valid UTF-8.'''
+    template = lucidity.Template('file', '/files/{name:[^/]+}')
+    index = Index()
+    index.add([('/files/\xff', {'name': '\xff'}, template)])
+    assert list(index.query({'name': '\xff'})) == [
+        ('/files/\xff', {'name': '\xff'}, 'file')
+    ]
+
+
+def test_reserved_placeholder_names():
+    '''Index placeholders named like columns, tables and indexes.'''
+    templates = [
+        lucidity.Template('template', '/{path}/{job}'),
+        lucidity.Template('job', '/jobs/{job}')
+    ]
+    index = Index(templates=templates)
+    index.add([
+        ('/a/b', {'path': 'a', 'job': 'b'}, templates[0]),
+        ('/jobs/b', {'job': 'b'}, templates[1])
+    ])
+
+    assert list(index.query({'path': 'a'})) == [
+        ('/a/b', {'path': 'a', 'job': 'b'}, 'template')
+    ]
+    assert len(list(index.query({'job': 'b'}))) == 2
+
+
+def test_legacy_columns(tmpdir, templates, paths):
+    '''Recreate table stored with a different column layout.'''
+    filepath = str(tmpdir.join('index.db'))
+    with Index(filepath, templates) as index:
+        index.add(lucidity.batch.parse_many(paths, templates))
+        index._connection.execute('DROP TABLE "template:asset"')
+        index._connection.execute(
+            'CREATE TABLE "template:asset" (path TEXT PRIMARY KEY, '
+            '"asset" TEXT, "job.code" TEXT, "sequence" TEXT)'
+        )
+        index._connection.commit()
+
+    with Index(filepath, templates) as index:
+        index.add(lucidity.batch.parse_many(paths, templates))
+        assert len(list(index.query({'asset': 'cat'}, 'asset'))) == 1
@@ -0,0 +1,149 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import os
+import json
+
+import pytest
+
+import lucidity
+from lucidity import instrument
+from lucidity import pool
+from lucidity.instrument import Collector
+
+
+TEST_TEMPLATE_PATH = os.path.join(
+    os.path.dirname(__file__), '..', 'fixture', 'template'
+)
+
+
+@pytest.fixture
+def events(request):
+    '''Return list recording emitted events while test runs.'''
+    recorded = []
+
+    def hook(event, duration, details):
+        recorded.append((event, dict(details)))
+
+    # Compiled artefacts shared with templates from other tests would not
+    # be compiled again.
+    pool.shared.clear()
+
+    instrument.add_hook(hook)
+    request.addfinalizer(lambda: instrument.remove_hook(hook))
+    return recorded
+
+
+def test_no_hooks():
+    '''Operations run without any hooks registered.'''
+    assert instrument.hooks == []
+    template = lucidity.Template('test', '/{variable}')
+    assert template.parse('/value') == {'variable': 'value'}
+    assert template.format({'variable': 'value'}) == '/value'
+
+
+def test_parse_events(events):
+    '''Emit compile, expand and parse events when parsing.'''
+    template = lucidity.Template('test', '/{variable}')
+    template.parse('/value')
+
+    with pytest.raises(lucidity.ParseError):
+        template.parse('value')
+
+    names = [event for event, _ in events]
+    assert 'compile' in names
+    assert 'expand' in names
+
+    parses = [details for event, details in events if event == 'parse']
+    assert parses == [
+        {'template': 'test', 'success': True},
+        {'template': 'test', 'success': False}
+    ]
+
+    compiles = [details for event, details in events if event == 'compile']
+    assert compiles == [
+        {'template': 'test', 'artefact': 'parser', 'success': True}
+    ]
+
+
+def test_format_events(events):
+    '''Emit format events when formatting.'''
+    template = lucidity.Template('test', '/{variable}')
+    template.format({'variable': 'value'})
+
+    with pytest.raises(lucidity.FormatError):
+        template.format({})
+
+    formats = [details for event, details in events if event == 'format']
+    assert formats == [
+        {'template': 'test', 'success': True},
+        {'template': 'test', 'success': False}
+    ]
+
+
+def test_discover_events(events):
+    '''Emit discover event for each mount point loaded.'''
+    lucidity.discover_templates([TEST_TEMPLATE_PATH], recursive=False)
+
+    discovered = [details for event, details in events if event == 'discover']
+    assert discovered
+    assert all(details['success'] for details in discovered)
+    assert all(details['path'].endswith('.py') for details in discovered)
+
+
+def test_remove_unregistered_hook():
+    '''Fail to remove hook that was not registered.'''
+    with pytest.raises(ValueError):
+        instrument.remove_hook(lambda event, duration, details: None)
+
+
+def test_collector():
+    '''Aggregate events with collector.'''
+    pool.shared.clear()
+    template = lucidity.Template('test', '/{variable}')
+
+    with Collector() as collector:
+        assert collector in instrument.hooks
+        for _ in range(3):
+            template.parse('/value')
+
+        with pytest.raises(lucidity.ParseError):
+            template.parse('value')
+
+    assert collector not in instrument.hooks
+
+    summary = dict((entry['event'], entry) for entry in collector.summary())
+    assert summary['parse']['count'] == 4
+    assert summary['parse']['failures'] == 1
+    assert summary['parse']['max'] >= summary['parse']['mean'] >= 0
+    assert summary['compile']['count'] == 1
+
+    assert json.loads(collector.json()) == collector.summary()
+
+    table = collector.table().splitlines()
+    assert table[0].split()[:3] == ['event', 'count', 'failures']
+    assert len(table) == len(summary) + 1
+
+    collector.reset()
+    assert collector.summary() == []
+
+
+def test_collector_with_key():
+    '''Aggregate events per template with collector.'''
+    templates = [
+        lucidity.Template('a', '/a/{variable}'),
+        lucidity.Template('b', '/b/{variable}')
+    ]
+
+    with Collector(key='template') as collector:
+        lucidity.parse('/b/value', templates)
+
+    parses = sorted(
+        (entry['template'], entry['count'], entry['failures'])
+        for entry in collector.summary() if entry['event'] == 'parse'
+    )
+    assert parses == [('a', 1, 1), ('b', 1, 0)]
+    assert collector.table().splitlines()[0].split()[:2] == [
+        'event', 'template'
+    ]
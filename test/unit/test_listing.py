@@ -0,0 +1,146 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import pytest
+
+import lucidity
+from lucidity import Template
+from lucidity.listing import Listing, parse_listing
+
+
+PATHS = [
+    '/jobs/monty/assets/model/high',
+    '/jobs/monty/assets/model/high/sandbox',
+    '/jobs/monty/assets/rig/anim.v001',
+    '/jobs/\xff\xfe/assets/model/low',
+    '/jobs/circus/other',
+    'relative/jobs/circus/assets/model/high'
+]
+
+
+@pytest.fixture
+def listing(tmpdir):
+    '''Return path to newline separated listing of paths.'''
+    target = tmpdir.join('listing.txt')
+    target.write('\n'.join(PATHS) + '\n', mode='wb')
+    return str(target)
+
+
+@pytest.mark.parametrize(('pattern', 'anchor', 'mode'), [
+    ('/jobs/{job}/assets/{task}/{lod}', Template.ANCHOR_START,
+     Template.RELAXED),
+    ('/jobs/{job}/assets/{task}/{lod}', Template.ANCHOR_BOTH,
+     Template.RELAXED),
+    ('/jobs/{job}/assets/{task}/{lod}', Template.ANCHOR_END,
+     Template.RELAXED),
+    ('/jobs/{job}/assets/{task}/{lod}', None, Template.RELAXED),
+    (u'/jobs/{job:[^/]+}/assets/{task}/{lod}', Template.ANCHOR_BOTH,
+     Template.RELAXED),
+    ('/jobs/{job}/assets/{job}/{lod}', Template.ANCHOR_START,
+     Template.STRICT),
+    ('/jobs/{a:[a-z]+}{b:[a-z]*}/assets/{task}', Template.ANCHOR_START,
+     Template.RELAXED)
+], ids=[
+    'anchor start',
+    'anchor both',
+    'anchor end',
+    'anchor none',
+    'unicode pattern',
+    'strict duplicates',
+    'backtracking risk'
+])
+def test_equivalent_to_parse(listing, pattern, anchor, mode):
+    '''Parse listing with same results as template.'''
+    template = Template(
+        'test', pattern, anchor=anchor, duplicate_placeholder_mode=mode
+    )
+
+    expected = []
+    for path in PATHS:
+        try:
+            expected.append((path, template.parse(path)))
+        except lucidity.ParseError:
+            continue
+
+    results = [
+        (path, data) for _, path, data, _ in parse_listing(listing, [template])
+    ]
+    assert results == expected
+
+
+def test_first_match(listing):
+    '''Yield first matching template for each record.'''
+    templates = [
+        Template('rig', '/jobs/{job}/assets/rig/{name}'),
+        Template('asset', '/jobs/{job}/assets/{task}/{lod}'),
+        Template('job', '/jobs/{job}')
+    ]
+
+    results = [
+        template.name for _, _, _, template in parse_listing(listing, templates)
+    ]
+    assert results == ['asset', 'asset', 'rig', 'job']
+
+
+def test_separator(tmpdir):
+    '''Parse listing with NUL separated records.'''
+    target = tmpdir.join('listing.txt')
+    target.write('/jobs/a\0/jobs/b\n\0/other\0\0/jobs/c', mode='wb')
+
+    results = list(
+        parse_listing(str(target), [Template('job', '/jobs/{job}')], '\0')
+    )
+    assert [(offset, path) for offset, path, _, _ in results] == [
+        (0, '/jobs/a'), (8, '/jobs/b\n'), (25, '/jobs/c')
+    ]
+
+
+def test_resume(listing):
+    '''Resume parsing from checkpointed offset.'''
+    templates = [Template('asset', '/jobs/{job}/assets/{task}/{lod}')]
+
+    with Listing(listing) as reader:
+        expected = list(reader.parse(templates))
+
+        results = []
+        checkpoint = 0
+        for result in reader.parse(templates):
+            results.append(result)
+            checkpoint = reader.offset
+            if len(results) == 2:
+                break
+
+        assert reader.records(checkpoint).next()[1] == PATHS[2]
+
+        results.extend(reader.parse(templates, start=checkpoint))
+        assert results == expected
+        assert reader.offset == len(reader)
+
+
+def test_records(listing):
+    '''Yield offset and path of each record.'''
+    with Listing(listing) as reader:
+        records = list(reader.records())
+
+    assert [path for _, path in records] == PATHS
+    assert records[1][0] == len(PATHS[0]) + 1
+
+
+def test_empty(tmpdir):
+    '''Parse empty listing.'''
+    target = tmpdir.join('listing.txt')
+    target.write('')
+
+    with Listing(str(target)) as reader:
+        assert len(reader) == 0
+        assert list(reader.records()) == []
+        assert list(reader.parse([Template('job', '/jobs/{job}')])) == []
+
+
+def test_schema_parse_listing(listing):
+    '''Parse listing against schema templates.'''
+    schema = lucidity.Schema([
+        Template('asset', '/jobs/{job}/assets/{task}/{lod}')
+    ])
+    assert len(list(schema.parse_listing(listing))) == 3
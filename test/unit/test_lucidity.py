@@ -138,4 +138,63 @@ def test_get_missing_template(templates):
         lucidity.get_template('non-existent-template', templates)
 
     with pytest.raises(lucidity.NotFound):
-        lucidity.get_template('rig', [])
\ No newline at end of file
+        lucidity.get_template('rig', [])
+
+@pytest.mark.parametrize(('path', 'expected'), [
+    ('/jobs/monty/assets/', ['model', 'rig', 'model_sandbox']),
+    ('/jobs/monty/assets/mo', ['model', 'model_sandbox']),
+    ('/jobs/monty/assets/model/high/sand', ['model', 'model_sandbox']),
+    ('/other', [])
+], ids=[
+    'all viable',
+    'partial literal',
+    'beyond shorter template',
+    'none viable'
+])
+def test_match_prefix_iter(path, expected, templates):
+    '''Match partial path against multiple candidate templates.'''
+    result = lucidity.match_prefix_iter(path, templates)
+    assert [template.name for _, template in result] == expected
+
+
+def test_parse_with_cache(templates):
+    '''Memoize parse results in cache.'''
+    cache = lucidity.Cache()
+    for _ in range(2):
+        data, template = lucidity.parse(
+            '/jobs/monty/assets/rig/anim', templates, cache=cache
+        )
+        assert data == {'job': {'code': 'monty'}, 'rig_type': 'anim'}
+        assert template is templates[1]
+
+        with pytest.raises(lucidity.ParseError):
+            lucidity.parse('/not/matching', templates, cache=cache)
+
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_format_with_cache(templates):
+    '''Memoize format results in cache.'''
+    cache = lucidity.Cache()
+    for _ in range(2):
+        path, template = lucidity.format(
+            {'job': {'code': 'monty'}, 'lod': 'high'}, templates, cache=cache
+        )
+        assert path == '/jobs/monty/assets/model/high'
+
+        with pytest.raises(lucidity.FormatError):
+            lucidity.format({}, templates, cache=cache)
+
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_parse_with_statistics(templates):
+    '''Record statistics for parse attempts.'''
+    statistics = lucidity.statistics.Statistics()
+    lucidity.parse('/jobs/monty/assets/rig/anim', templates,
+                   statistics=statistics)
+
+    assert [statistics.attempts(template) for template in templates] == [
+        1, 1, 0
+    ]
+    assert [statistics.hits(template) for template in templates] == [0, 1, 0]
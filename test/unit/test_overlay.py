@@ -0,0 +1,221 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import pytest
+
+import lucidity
+from lucidity import Template, Schema, OverlaySchema
+
+
+@pytest.fixture
+def base():
+    '''Return studio base schema.'''
+    schema = Schema([
+        Template('job', '{@root}/{job}', anchor=Template.ANCHOR_BOTH),
+        Template(
+            'asset', '{@job}/assets/{asset}', anchor=Template.ANCHOR_BOTH
+        ),
+        Template(
+            'version', '{@asset}/v{version}', anchor=Template.ANCHOR_BOTH
+        ),
+        Template(
+            'shot', '{@job}/shots/{shot}', anchor=Template.ANCHOR_BOTH
+        ),
+        Template('texture', '/library/textures/{name}.{extension}')
+    ])
+    schema.add_reference(Template('root', '/jobs'))
+    return schema
+
+
+def merged(base, templates=(), references=()):
+    '''Return full schema merging *templates* and *references* into *base*.'''
+    schema = Schema()
+    for reference in base.references.values():
+        schema.add_reference(Template(reference.name, reference.pattern))
+
+    for reference in references:
+        schema.add_reference(Template(reference.name, reference.pattern))
+
+    for template in list(base.values()) + list(templates):
+        schema.add_template(
+            Template(template.name, template.pattern, anchor=template.anchor)
+        )
+
+    return schema
+
+
+def test_without_overrides(base):
+    '''Share all templates with base when nothing is overridden.'''
+    overlay = OverlaySchema(base)
+    assert overlay.shared() == set(base)
+    assert all(overlay[name] is base[name] for name in base)
+    assert overlay.parse('/jobs/monty/assets/cat/v001') == (
+        base.parse('/jobs/monty/assets/cat/v001')
+    )
+
+
+def test_override_template(base):
+    '''Copy only templates depending on an overridden template.'''
+    asset = Template(
+        'asset', '{@job}/library/{asset}', anchor=Template.ANCHOR_BOTH
+    )
+    overlay = OverlaySchema(base, templates=[asset])
+
+    assert overlay['asset'] is asset
+    assert overlay.shared() == set(['job', 'shot', 'texture'])
+    assert overlay['version'] is not base['version']
+
+    assert overlay.parse('/jobs/monty/library/cat/v001') == (
+        {'job': 'monty', 'asset': 'cat', 'version': '001'},
+        overlay['version']
+    )
+    assert overlay['version'].format(
+        {'job': 'monty', 'asset': 'cat', 'version': '001'}
+    ) == '/jobs/monty/library/cat/v001'
+
+    # Base is unchanged.
+    assert base['asset'].pattern == '{@job}/assets/{asset}'
+    assert base['version'].format(
+        {'job': 'monty', 'asset': 'cat', 'version': '001'}
+    ) == '/jobs/monty/assets/cat/v001'
+
+
+def test_override_reference(base):
+    '''Copy all templates depending on an overridden reference.'''
+    overlay = OverlaySchema(
+        base, references=[Template('root', '/projects')]
+    )
+    assert overlay.shared() == set(['texture'])
+    assert overlay.references['root'].pattern == '/projects'
+    assert overlay.parse('/projects/monty/shots/sh010')[1].name == 'shot'
+
+    with pytest.raises(lucidity.ParseError):
+        overlay.parse('/jobs/monty/shots/sh010')
+
+    assert base.parse('/jobs/monty/shots/sh010')[1] is base['shot']
+
+
+@pytest.mark.parametrize('path', [
+    '/projects/monty',
+    '/projects/monty/assets/cat',
+    '/projects/monty/assets/cat/v001',
+    '/projects/monty/shots/sh010',
+    '/projects/monty/shots/sh010/v001',
+    '/library/textures/brick.png',
+    '/jobs/monty/assets/cat'
+], ids=[
+    'job',
+    'asset',
+    'version',
+    'shot',
+    'overridden version',
+    'shared',
+    'miss'
+])
+def test_matches_merged_schema(base, path):
+    '''Parse the same as a fully merged schema.'''
+    templates = [
+        Template(
+            'version', '{@job}/shots/{shot}/v{version}',
+            anchor=Template.ANCHOR_BOTH
+        )
+    ]
+    references = [Template('root', '/projects')]
+
+    overlay = OverlaySchema(base, templates=templates, references=references)
+    full = merged(base, templates, references)
+
+    def result(schema):
+        return sorted(
+            (template.name, data) for data, template in schema.parse_all(path)
+        )
+
+    assert result(overlay) == result(full)
+
+
+def test_add_template_later(base):
+    '''Copy dependents when a template is overridden after creation.'''
+    overlay = OverlaySchema(base)
+    overlay.add_template(
+        Template('job', '/work/{job}', anchor=Template.ANCHOR_BOTH)
+    )
+
+    assert overlay.shared() == set(['texture'])
+    assert overlay.parse('/work/monty/assets/cat')[1].name == 'asset'
+    assert base['job'].pattern == '{@root}/{job}'
+
+
+def test_remove_template(base):
+    '''Remove template from overlay only.'''
+    overlay = OverlaySchema(base)
+    del overlay['texture']
+
+    assert 'texture' not in overlay
+    assert 'texture' in base
+    assert overlay.overrides() == set(['texture'])
+
+    with pytest.raises(KeyError):
+        del overlay['texture']
+
+
+def test_clear(base):
+    '''Remove all templates from overlay only.'''
+    overlay = OverlaySchema(base)
+    overlay.clear()
+    assert len(overlay) == 0
+
+    overlay.refresh()
+    assert len(overlay) == 0
+    assert len(base) == 5
+
+
+def test_refresh(base):
+    '''Reflect changes to base on refresh.'''
+    overlay = OverlaySchema(
+        base, references=[Template('root', '/projects')]
+    )
+    base.add_template(Template('sequence', '{@job}/sequences/{sequence}'))
+    assert 'sequence' not in overlay
+
+    overlay.refresh()
+    assert overlay.parse('/projects/monty/sequences/sq01')[1].name == (
+        'sequence'
+    )
+
+
+def test_from_dict(base):
+    '''Create overlay from dictionary of overrides.'''
+    overlay = OverlaySchema.from_dict(
+        {'references': {'root': '/projects'}}, base=base
+    )
+    assert overlay.parse('/projects/monty')[0] == {'job': 'monty'}
+
+
+def test_from_dict_referencing_base(base):
+    '''Create overlay with overrides referencing the base.'''
+    base.add_reference(Template('project', '/proj'))
+    overlay = OverlaySchema.from_dict(
+        {'paths': {'library': {'pattern': '{@project}/b/{y}'}}}, base=base
+    )
+
+    assert overlay.overrides() == set(['library'])
+    assert overlay.parse('/proj/b/thing') == (
+        {'y': 'thing'}, overlay['library']
+    )
+    assert 'library' not in base
+
+
+def test_from_dict_backtracking_warning(base, recwarn):
+    '''Warn for overrides at risk of backtracking once references expand.'''
+    base.add_reference(Template('tree', '/tree/{path:.+}'))
+    OverlaySchema.from_dict(
+        {'paths': {'leaf': {'pattern': '{@tree}{name}'}}}, base=base
+    )
+
+    warnings = [
+        warning for warning in recwarn.list
+        if issubclass(warning.category, lucidity.error.BacktrackingWarning)
+    ]
+    assert len(warnings) == 1
+    assert "'leaf'" in str(warnings[0].message)
@@ -0,0 +1,142 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import gc
+
+import pytest
+
+import lucidity
+from lucidity import pool
+from lucidity.pool import Pool
+
+
+@pytest.fixture
+def shared():
+    '''Return cleared shared pool.'''
+    pool.shared.clear()
+    return pool.shared
+
+
+def test_get():
+    '''Construct value once per key and count hits.'''
+    values = Pool()
+    constructed = []
+
+    def construct():
+        constructed.append(True)
+        return ('value',)
+
+    first = values.get('key', construct)
+    second = values.get('key', construct)
+
+    assert first is second
+    assert first.value == ('value',)
+    assert len(constructed) == 1
+    assert values.info() == {
+        'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'size': 1
+    }
+
+
+def test_hit_rate_without_lookups():
+    '''Report no hit rate before any lookup.'''
+    assert Pool().hit_rate() is None
+
+
+def test_weak_references():
+    '''Release value once no longer held.'''
+    values = Pool()
+    entry = values.get('key', lambda: None)
+    assert len(values) == 1
+
+    del entry
+    gc.collect()
+    assert len(values) == 0
+
+
+def test_clear():
+    '''Clear entries leaving counters and held values.'''
+    values = Pool()
+    entry = values.get('key', lambda: 'value')
+    values.clear()
+
+    assert len(values) == 0
+    assert values.misses == 1
+    assert entry.value == 'value'
+    assert values.get('key', lambda: 'other').value == 'other'
+
+
+def test_templates_share_compiled_artefacts(shared):
+    '''Share compiled artefacts between equivalent templates.'''
+    first = lucidity.Template('first', '/{job}/{asset}')
+    second = lucidity.Template('second', '/{job}/{asset}')
+
+    assert first.parse('/monty/cat') == second.parse('/monty/cat')
+    assert first._parser() is second._parser()
+    assert first._formatter() is second._formatter()
+    assert shared.hits >= 1
+
+
+@pytest.mark.parametrize('other', [
+    lucidity.Template(
+        'other', '/{job}/{asset}', anchor=lucidity.Template.ANCHOR_BOTH
+    ),
+    lucidity.Template(
+        'other', '/{job}/{asset}',
+        duplicate_placeholder_mode=lucidity.Template.STRICT
+    ),
+    lucidity.Template(
+        'other', '/{job}/{asset}', default_placeholder_expression='\w+'
+    ),
+    lucidity.Template('other', u'/{job}/{asset}')
+], ids=[
+    'anchor',
+    'duplicate placeholder mode',
+    'default placeholder expression',
+    'unicode pattern'
+])
+def test_differing_settings_are_not_shared(shared, other):
+    '''Compile separately for templates with differing settings.'''
+    template = lucidity.Template('template', '/{job}/{asset}')
+    assert template._parser() is not other._parser()
+
+
+def test_record_types_are_not_shared(shared):
+    '''Create record type per template.'''
+    first = lucidity.Template('first', '/{job}/{asset}')
+    second = lucidity.Template('second', '/{job}/{asset}')
+
+    assert first.parse_record('/monty/cat').template is first
+    assert second.parse_record('/monty/cat').template is second
+
+
+def test_changed_reference(shared):
+    '''Compile again when a referenced template changes.'''
+    schema = lucidity.Schema([
+        lucidity.Template('job', '/{job}'),
+        lucidity.Template('asset', '{@job}/{asset}')
+    ])
+    template = schema['asset']
+    assert template.parse('/monty/cat') == {'job': 'monty', 'asset': 'cat'}
+
+    schema.add_template(lucidity.Template('job', '/jobs/{job}'))
+    assert template.parse('/jobs/monty/cat') == {
+        'job': 'monty', 'asset': 'cat'
+    }
+
+
+def test_dropped_templates_are_released(shared):
+    '''Release compiled artefacts when templates are dropped.'''
+    templates = [
+        lucidity.Template('template', '/{job}/{asset}/' + str(index))
+        for index in range(10)
+    ]
+    for index, template in enumerate(templates):
+        template.parse('/monty/cat/' + str(index))
+
+    size = len(shared)
+    assert size >= 10
+
+    del templates, template
+    gc.collect()
+    assert len(shared) <= size - 10
@@ -0,0 +1,85 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import pickle
+
+import pytest
+
+import lucidity
+from lucidity.record import Record, create_record_type
+
+
+@pytest.fixture
+def record():
+    '''Return record for nested and flat placeholders.'''
+    template = lucidity.Template('model', '/jobs/{job.code}/model/{lod}')
+    record_type = create_record_type(template, ['job.code', 'lod'])
+    return record_type({'job.code': 'monty', 'lod': 'high'})
+
+
+def test_record_type(record):
+    '''Create record type for template.'''
+    assert isinstance(record, Record)
+    assert record.template.name == 'model'
+    assert record.fields == ('job.code', 'lod')
+    assert not hasattr(record, '__dict__')
+
+
+def test_mapping_access(record):
+    '''Access values as mapping.'''
+    assert record['lod'] == 'high'
+    assert record['job']['code'] == 'monty'
+    assert record['job.code'] == 'monty'
+    assert sorted(record.keys()) == ['job', 'lod']
+    assert 'job' in record
+    assert 'missing' not in record
+    assert record.get('missing', 'default') == 'default'
+
+    with pytest.raises(KeyError):
+        record['job']['missing']
+
+
+def test_attribute_access(record):
+    '''Access values as attributes.'''
+    assert record.lod == 'high'
+    assert record.job.code == 'monty'
+
+    with pytest.raises(AttributeError):
+        record.missing
+
+
+def test_read_only(record):
+    '''Fail to modify record.'''
+    with pytest.raises(AttributeError):
+        record.lod = 'low'
+
+    with pytest.raises(TypeError):
+        record['lod'] = 'low'
+
+
+def test_to_dict(record):
+    '''Convert record to nested dictionaries.'''
+    expected = {'job': {'code': 'monty'}, 'lod': 'high'}
+    assert record.to_dict() == expected
+    assert record == expected
+    assert record['job'].to_dict() == expected['job']
+
+
+def test_pickle(record):
+    '''Pickle record as dictionary.'''
+    assert pickle.loads(pickle.dumps(record)) == record.to_dict()
+
+
+@pytest.mark.parametrize('key', [
+    'keys',
+    'template'
+], ids=[
+    'method name',
+    'attribute name'
+])
+def test_clashing_placeholder(key):
+    '''Access placeholder clashing with record attribute by mapping.'''
+    template = lucidity.Template('test', '/{{{0}}}'.format(key))
+    record = template.parse_record('/value')
+    assert record[key] == 'value'
@@ -0,0 +1,216 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import os
+
+import pytest
+
+import lucidity
+from lucidity.database import Index
+from lucidity.scan import Scanner, ADDED, REMOVED, CHANGED
+
+
+def make_tree(root, paths):
+    '''Create directories for *paths* relative to *root*.'''
+    for path in paths:
+        os.makedirs(os.path.join(root, path))
+
+
+def age(root):
+    '''Set modification times of *root* and directories below into the past.'''
+    for directory, _, _ in os.walk(root):
+        os.utime(directory, (1000000000, 1000000000))
+
+
+def changes(scanner, root):
+    '''Return sorted changes from scanning *root* relative to *root*.'''
+    return sorted(
+        (change, os.path.relpath(path, root), data, name)
+        for change, path, data, name in scanner.scan(root)
+    )
+
+
+@pytest.fixture
+def templates():
+    '''Return templates to scan with.'''
+    return [
+        lucidity.Template(
+            'version', '{root}/{asset}/v{version}',
+            anchor=lucidity.Template.ANCHOR_END
+        ),
+        lucidity.Template(
+            'asset', '{root}/{asset}', anchor=lucidity.Template.ANCHOR_END
+        )
+    ]
+
+
+@pytest.fixture
+def root(tmpdir):
+    '''Return root directory of assets.'''
+    root = str(tmpdir.join('assets'))
+    make_tree(root, ['cat/v001', 'cat/v002', 'dog/v001'])
+    return root
+
+
+@pytest.fixture
+def scanner(templates):
+    '''Return scanner for an in memory index.'''
+    return Scanner(Index(), templates)
+
+
+def test_first_scan(scanner, root):
+    '''Report every matching entry as added on first scan.'''
+    results = changes(scanner, root)
+    assert [(change, path, name) for change, path, _, name in results] == [
+        (ADDED, 'cat', 'asset'),
+        (ADDED, 'cat/v001', 'version'),
+        (ADDED, 'cat/v002', 'version'),
+        (ADDED, 'dog', 'asset'),
+        (ADDED, 'dog/v001', 'version')
+    ]
+    assert results[1][2] == {
+        'root': 'assets', 'asset': 'cat', 'version': '001'
+    }
+
+    assert sorted(
+        os.path.relpath(path, root)
+        for path, _, _ in scanner.index.query()
+    ) == ['cat', 'cat/v001', 'cat/v002', 'dog', 'dog/v001']
+
+
+def test_rescan_reports_changes(scanner, root):
+    '''Report only added and removed entries on rescan.'''
+    list(scanner.scan(root))
+
+    make_tree(root, ['cat/v003', 'bird/v001'])
+    os.rmdir(os.path.join(root, 'dog/v001'))
+    os.rmdir(os.path.join(root, 'dog'))
+
+    results = changes(scanner, root)
+    assert [(change, path) for change, path, _, _ in results] == [
+        (ADDED, 'bird'),
+        (ADDED, 'bird/v001'),
+        (ADDED, 'cat/v003'),
+        (REMOVED, 'dog'),
+        (REMOVED, 'dog/v001')
+    ]
+
+    assert sorted(
+        os.path.relpath(path, root)
+        for path, _, _ in scanner.index.query()
+    ) == ['bird', 'bird/v001', 'cat', 'cat/v001', 'cat/v002', 'cat/v003']
+
+    assert changes(scanner, root) == []
+
+
+def test_rescan_skips_unchanged_directories(scanner, root, monkeypatch):
+    '''Only list directories modified since the last scan.'''
+    age(root)
+    list(scanner.scan(root))
+
+    make_tree(root, ['cat/v003'])
+    os.utime(
+        os.path.join(root, 'cat/v003'), (1000000000, 1000000000)
+    )
+
+    listed = []
+    original = os.listdir
+
+    def listdir(path):
+        listed.append(os.path.relpath(path, root))
+        return original(path)
+
+    monkeypatch.setattr(os, 'listdir', listdir)
+
+    assert changes(scanner, root) == [
+        (ADDED, 'cat/v003', {
+            'root': 'assets', 'asset': 'cat', 'version': '003'
+        }, 'version')
+    ]
+    assert sorted(listed) == ['cat', 'cat/v003']
+
+
+def test_recently_modified_directories_are_listed_again(
+    scanner, root, monkeypatch
+):
+    '''List directories modified close to the last scan again.'''
+    list(scanner.scan(root))
+
+    listed = []
+    original = os.listdir
+
+    def listdir(path):
+        listed.append(os.path.relpath(path, root))
+        return original(path)
+
+    monkeypatch.setattr(os, 'listdir', listdir)
+
+    assert changes(scanner, root) == []
+    assert len(listed) == 6
+
+
+def test_changed_templates(scanner, root, templates):
+    '''Parse everything again and report changes when templates change.'''
+    age(root)
+    list(scanner.scan(root))
+
+    templates[0] = lucidity.Template(
+        'version', '{root}/{asset}/v{version:\d+}',
+        anchor=lucidity.Template.ANCHOR_END
+    )
+    templates[1] = lucidity.Template(
+        'animal', '{root}/{animal}', anchor=lucidity.Template.ANCHOR_END
+    )
+    scanner = Scanner(scanner.index, templates)
+
+    results = changes(scanner, root)
+    assert [(change, path, name) for change, path, _, name in results] == [
+        (CHANGED, 'cat', 'animal'),
+        (CHANGED, 'dog', 'animal')
+    ]
+    assert results[0][2] == {'root': 'assets', 'animal': 'cat'}
+
+    assert sorted(
+        (os.path.relpath(path, root), name)
+        for path, _, name in scanner.index.query(template='animal')
+    ) == [('cat', 'animal'), ('dog', 'animal')]
+    assert list(scanner.index.query(template='asset')) == []
+
+
+def test_removed_root(scanner, root):
+    '''Report all entries removed when root is removed.'''
+    list(scanner.scan(root))
+
+    for directory in ('cat/v001', 'cat/v002', 'cat', 'dog/v001', 'dog', ''):
+        os.rmdir(os.path.join(root, directory))
+
+    results = changes(scanner, root)
+    assert [change for change, _, _, _ in results] == [REMOVED] * 5
+    assert list(scanner.index.query()) == []
+
+
+def test_persisted_snapshot(tmpdir, root, templates):
+    '''Resume from snapshot stored in index database.'''
+    filepath = str(tmpdir.join('index.db'))
+    age(root)
+
+    with Index(filepath) as index:
+        assert len(list(Scanner(index, templates).scan(root))) == 5
+
+    os.rmdir(os.path.join(root, 'cat/v002'))
+
+    with Index(filepath) as index:
+        scanner = Scanner(index, templates)
+        assert [
+            (change, os.path.relpath(path, root))
+            for change, path, _, _ in scanner.scan(root)
+        ] == [(REMOVED, 'cat/v002')]
+
+
+def test_schema_scan(root, templates):
+    '''Scan with templates of a schema.'''
+    schema = lucidity.Schema(templates)
+    index = Index()
+    assert len(list(schema.scan(index, root))) == 5
+    assert list(schema.scan(index, root)) == []
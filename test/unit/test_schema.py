@@ -38,6 +38,36 @@ def test_schema_from_yaml_simple():
     schema = lucidity.Schema.from_yaml(os.path.join(TEST_SCHEMA_ROOT, 'schema_simple.yaml'))
 
 
+@pytest.mark.parametrize(('data', 'expected'), [
+    ({'paths': {'test': {'pattern': '/{name}/{name}', 'mode': 'relaxed'}}},
+     lucidity.Template.RELAXED),
+    ({'paths': {'test': {'pattern': '/{name}/{name}', 'mode': 'strict'}}},
+     lucidity.Template.STRICT),
+    ({'defaults': {'mode': 'strict'},
+      'paths': {'test': {'pattern': '/{name}/{name}'}}},
+     lucidity.Template.STRICT)
+], ids=[
+    'relaxed',
+    'strict',
+    'strict default'
+])
+def test_schema_from_dict_mode(data, expected):
+    '''Set duplicate placeholder mode from dictionary.'''
+    schema = lucidity.Schema.from_dict(data)
+    assert schema['test'].duplicate_placeholder_mode == expected
+
+
+def test_schema_from_dict_strict_mode_parse():
+    '''Fail to parse mismatched duplicates with strict mode from dictionary.'''
+    schema = lucidity.Schema.from_dict({
+        'paths': {'test': {'pattern': '/{name}/{name}', 'mode': 'strict'}}
+    })
+    assert schema.parse('/a/a') == ({'name': 'a'}, schema['test'])
+
+    with pytest.raises(lucidity.ParseError):
+        schema.parse('/a/b')
+
+
 @pytest.mark.parametrize(('template_id', 'data', 'expected'), [
     ('optional1',   # #1 (1/1 optionals)
      {'project': {'name': 'foobar'}, 'variation': 'evil'},
@@ -99,4 +129,277 @@ def test_schema_from_yaml_referenced(template_id, data, expected):
 
     template = schema.get_template(template_id)
     path = template.format(data)
-    assert path == expected
\ No newline at end of file
+    assert path == expected
+
+def test_schema_match_prefix_all(templates):
+    '''Match partial path against all templates in schema.'''
+    schema = lucidity.Schema(templates)
+    result = schema.match_prefix_all('/jobs/monty/assets/r')
+    assert [(data, template.name) for data, template in result] == [
+        ({'job': {'code': 'monty'}}, 'rig')
+    ]
+
+
+def test_schema_find(tmpdir):
+    '''Find existing paths matching templates in schema.'''
+    for path in ['jobs/monty/assets/model/high', 'jobs/monty/assets/rig/anim',
+                 'jobs/other/assets/model/low']:
+        tmpdir.join(path).ensure()
+
+    schema = lucidity.Schema([
+        lucidity.Template('model', '/jobs/{job.code}/assets/model/{lod}'),
+        lucidity.Template('rig', '/jobs/{job.code}/assets/rig/{rig_type}')
+    ])
+    result = schema.find({'job': {'code': 'monty'}}, root=str(tmpdir))
+
+    # Relative paths are required to search under root.
+    assert list(result) == []
+
+    schema = lucidity.Schema([
+        lucidity.Template('model', 'jobs/{job.code}/assets/model/{lod}'),
+        lucidity.Template('rig', 'jobs/{job.code}/assets/rig/{rig_type}')
+    ])
+    result = schema.find({'job': {'code': 'monty'}}, root=str(tmpdir))
+    assert sorted(
+        (path, data, template.name) for path, data, template in result
+    ) == [
+        (str(tmpdir.join('jobs/monty/assets/model/high')),
+         {'job': {'code': 'monty'}, 'lod': 'high'}, 'model'),
+        (str(tmpdir.join('jobs/monty/assets/rig/anim')),
+         {'job': {'code': 'monty'}, 'rig_type': 'anim'}, 'rig')
+    ]
+
+
+def test_schema_parse_record(templates):
+    '''Parse path into compact record against templates in schema.'''
+    schema = lucidity.Schema(templates)
+    record, template = schema.parse_record('/jobs/monty/assets/rig/anim')
+    assert template.name == 'rig'
+    assert record.job.code == 'monty'
+    assert record.to_dict() == {'job': {'code': 'monty'}, 'rig_type': 'anim'}
+
+    with pytest.raises(lucidity.ParseError):
+        schema.parse_record('/not/matching')
+
+
+def test_schema_parse_columns(templates):
+    '''Parse paths into columns against templates in schema.'''
+    schema = lucidity.Schema(templates)
+    columns = schema.parse_columns(
+        ['/jobs/monty/assets/rig/anim', '/not/matching'], arrays=False
+    )
+    assert columns.miss == [False, True]
+    assert columns['rig_type'] == ['anim', None]
+
+
+def test_schema_format_many(templates):
+    '''Format many records against templates in schema.'''
+    schema = lucidity.Schema(templates)
+    results = list(schema.format_many([
+        {'job': {'code': 'monty'}, 'rig_type': 'anim'},
+        {'job': {'code': 'monty'}}
+    ]))
+
+    assert [(path, template and template.name) for path, template, _ in results] == [
+        ('/jobs/monty/assets/rig/anim', 'rig'), (None, None)
+    ]
+    assert isinstance(results[1][2], lucidity.FormatError)
+
+
+def test_schema_format_many_uneven_columns(templates):
+    '''Report error for records beyond the shortest column.'''
+    schema = lucidity.Schema(templates)
+    results = list(schema.format_many({
+        'job.code': ['monty', 'python'], 'rig_type': ['anim']
+    }))
+
+    assert [path for path, _, _ in results] == [
+        '/jobs/monty/assets/rig/anim', None
+    ]
+    assert isinstance(results[1][2], lucidity.FormatError)
+
+
+def test_schema_cache(templates):
+    '''Memoize results and invalidate when templates added.'''
+    cache = lucidity.Cache()
+    schema = lucidity.Schema(templates[:1], cache=cache)
+    path = '/jobs/monty/assets/rig/anim'
+
+    for _ in range(2):
+        with pytest.raises(lucidity.ParseError):
+            schema.parse(path)
+
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    schema.add_template(templates[1])
+    assert len(cache) == 0
+
+    data, template = schema.parse(path)
+    assert template.name == 'rig'
+
+    data['rig_type'] = 'modified'
+    assert schema.parse(path)[0]['rig_type'] == 'anim'
+    assert schema.parse_all(path) == schema.parse_all(path)
+    assert schema.format(data) == schema.format(data)
+    assert schema.format_all(data) == schema.format_all(data)
+    assert cache.hits == 5
+
+
+def test_schema_shared_cache():
+    '''Keep results of schemas sharing a cache separate.'''
+    cache = lucidity.Cache()
+    first = lucidity.Schema([lucidity.Template('a', '/{name}/{index}')], cache=cache)
+    second = lucidity.Schema([lucidity.Template('b', '/{name}/{index}')], cache=cache)
+
+    assert first.parse('/a/1')[1].name == 'a'
+    assert second.parse('/a/1')[1].name == 'b'
+    assert [template.name for _, template in second.parse_all('/a/1')] == ['b']
+    assert first.format({'name': 'a', 'index': '1'})[1].name == 'a'
+    assert second.format({'name': 'a', 'index': '1'})[1].name == 'b'
+    assert len(cache) == 5
+
+    # Changing one schema only clears its own entries.
+    first.add_template(lucidity.Template('c', '/c/{name}'))
+    assert len(cache) == 3
+    assert second.parse('/a/1')[1].name == 'b'
+    assert cache.hits == 1
+
+
+@pytest.mark.parametrize('mutate', [
+    lambda schema: schema.pop('rig'),
+    lambda schema: schema.popitem(),
+    lambda schema: schema.clear(),
+    lambda schema: schema.update(
+        rig=lucidity.Template('rig', '/jobs/{job.code}/rigs/{rig_type}')
+    ),
+    lambda schema: schema.setdefault(
+        'other', lucidity.Template('other', '/other/{other}')
+    )
+], ids=[
+    'pop',
+    'popitem',
+    'clear',
+    'update',
+    'setdefault'
+])
+def test_schema_cache_invalidated_by_dict_methods(mutate):
+    '''Invalidate memoized results when mutated through dict methods.'''
+    cache = lucidity.Cache()
+    schema = lucidity.Schema(
+        [lucidity.Template('rig', '/jobs/{job.code}/assets/rig/{rig_type}')],
+        cache=cache
+    )
+    schema.parse('/jobs/monty/assets/rig/anim')
+    assert len(cache) == 1
+
+    mutate(schema)
+    assert len(cache) == 0
+    assert all(isinstance(template, lucidity.Template) for template in schema.values())
+
+
+def test_schema_pop_default():
+    '''Return default when popping a missing template.'''
+    schema = lucidity.Schema()
+    assert schema.pop('missing', None) is None
+
+    with pytest.raises(KeyError):
+        schema.pop('missing')
+
+    with pytest.raises(KeyError):
+        schema.popitem()
+
+
+def test_schema_parse_many(templates):
+    '''Parse many paths against templates in schema.'''
+    schema = lucidity.Schema(templates)
+    result = schema.parse_many(['/jobs/monty/assets/rig/anim', '/not/matching'])
+    assert [
+        (path, data, template and template.name)
+        for path, data, template in result
+    ] == [
+        ('/jobs/monty/assets/rig/anim',
+         {'job': {'code': 'monty'}, 'rig_type': 'anim'}, 'rig'),
+        ('/not/matching', None, None)
+    ]
+
+
+def test_schema_adaptive(templates):
+    '''Parse with statistics and adaptive ordering.'''
+    statistics = lucidity.statistics.Statistics()
+    schema = lucidity.Schema(templates, statistics=statistics, adaptive=True)
+
+    for _ in range(3):
+        data, template = schema.parse('/jobs/monty/assets/rig/anim')
+        assert template.name == 'rig'
+
+    assert statistics.hits(schema['rig']) == 3
+    assert len(schema.parse_all('/jobs/monty/assets/rig/anim')) == 1
+    assert statistics.attempts(schema['rig']) == 4
+
+
+def test_schema_exclusion_graph(templates):
+    '''Skip exclusive templates in parse_all and report ambiguous pairs.'''
+    schema = lucidity.Schema(templates, exclusions=True)
+    graph = schema.exclusion_graph()
+    assert graph is schema.exclusion_graph()
+    assert graph.exclusive(schema['model']) == frozenset([schema['rig']])
+    assert schema.ambiguous_pairs() == []
+
+    schema.add_template(
+        lucidity.Template('any', '/jobs/{job.code}/assets/{kind}/{name}')
+    )
+    assert schema.exclusion_graph() is not graph
+
+    results = schema.parse_all('/jobs/monty/assets/rig/anim')
+    assert sorted(template.name for _, template in results) == ['any', 'rig']
+    assert len(schema.ambiguous_pairs()) == 2
+
+
+@pytest.mark.parametrize('exclusions', [False, True], ids=[
+    'default',
+    'exclusions'
+])
+def test_schema_parse_all_exclusions(templates, exclusions):
+    '''Use exclusion graph in parse_all only when enabled.'''
+    schema = lucidity.Schema(templates, exclusions=exclusions)
+    results = schema.parse_all('/jobs/monty/assets/rig/anim')
+
+    assert [template.name for _, template in results] == ['rig']
+    assert (schema._exclusion_graph is not None) is exclusions
+
+
+def test_schema_from_dict_backtracking_warning(recwarn):
+    '''Warn when loading template at risk of excessive backtracking.'''
+    lucidity.Schema.from_dict({
+        'paths': {
+            'safe': {'pattern': '/jobs/{job}/assets/{asset}'},
+            'risky': {'pattern': '/jobs/{path:.+}{name}'}
+        }
+    })
+
+    warnings = [
+        warning for warning in recwarn.list
+        if issubclass(warning.category, lucidity.error.BacktrackingWarning)
+    ]
+    assert len(warnings) == 1
+    assert "'risky'" in str(warnings[0].message)
+
+
+def test_schema_from_dict_unresolved_reference(recwarn):
+    '''Load template with unresolvable reference, failing only on use.'''
+    schema = lucidity.Schema.from_dict({
+        'paths': {
+            'a': {'pattern': '{@missing}/x'},
+            'risky': {'pattern': '/jobs/{path:.+}{name}'}
+        }
+    })
+    assert sorted(schema) == ['a', 'risky']
+
+    warnings = [
+        warning for warning in recwarn.list
+        if issubclass(warning.category, lucidity.error.BacktrackingWarning)
+    ]
+    assert len(warnings) == 1
+
+    with pytest.raises(lucidity.error.ResolveError):
+        schema['a'].parse('/root/x')
@@ -0,0 +1,177 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import pytest
+
+import lucidity
+from lucidity import segment
+from lucidity.corpus import Generator
+
+ANCHOR_START = lucidity.Template.ANCHOR_START
+ANCHOR_BOTH = lucidity.Template.ANCHOR_BOTH
+ANCHOR_END = lucidity.Template.ANCHOR_END
+
+
+def regex_parse(template, path):
+    '''Return data parsed from *path* by regular expression of *template*.
+
+    Return the class of any exception raised instead.
+
+    '''
+    regex = template._parser()[0]
+    try:
+        match = regex.search(path)
+        if match is None:
+            return lucidity.ParseError
+
+        return template._extract(match.groupdict())
+
+    except Exception as exception:
+        return type(exception)
+
+
+def segment_parse(template, path):
+    '''Return data parsed from *path* by *template*.
+
+    Return the class of any exception raised instead.
+
+    '''
+    try:
+        return template.parse(path)
+    except Exception as exception:
+        return type(exception)
+
+
+@pytest.mark.parametrize(('pattern', 'anchor', 'qualifies'), [
+    ('/jobs/{job}/{shot}', ANCHOR_BOTH, True),
+    ('/jobs/{job}/{shot}', ANCHOR_START, True),
+    ('/jobs/{job}/{shot}', ANCHOR_END, False),
+    ('/jobs/{job}/{shot}', None, False),
+    ('/jobs/{job:\w+}/{shot}', ANCHOR_BOTH, False),
+    ('/jobs/{job} {shot}', ANCHOR_BOTH, False),
+    ('/jobs/{job}.{shot}', ANCHOR_BOTH, True),
+    ('/jobs/{job}.{shot}', ANCHOR_START, False),
+    ('/jobs/{job}{shot}', ANCHOR_BOTH, False),
+    ('/jobs/{a}.{b}.{c}', ANCHOR_BOTH, False),
+    ('/jobs/{job}/v{version}.ma', ANCHOR_START, False),
+    ('/jobs/{job}/{job.code}', ANCHOR_BOTH, False),
+    ('/jobs/{job}\n', ANCHOR_BOTH, False)
+], ids=[
+    'both',
+    'start',
+    'end',
+    'unanchored',
+    'custom expression',
+    'separator not valid',
+    'separator valid',
+    'separator in final start segment',
+    'adjacent placeholders',
+    'three placeholders in segment',
+    'suffix in final start segment',
+    'clashing nested keys',
+    'literal newline'
+])
+def test_create_parser(pattern, anchor, qualifies):
+    '''Create segment parser only for qualifying patterns.'''
+    template = lucidity.Template('test', pattern, anchor=anchor)
+    parser = segment.create_parser(template, pattern)
+    assert (parser is not None) == qualifies
+
+
+@pytest.mark.parametrize(('pattern', 'anchor', 'mode', 'path'), [
+    ('/jobs/{job}/{shot}', ANCHOR_BOTH, None, '/jobs/a/b'),
+    ('/jobs/{job}/{shot}', ANCHOR_BOTH, None, '/jobs/a/b/c'),
+    ('/jobs/{job}/{shot}', ANCHOR_BOTH, None, '/jobs/a/'),
+    ('/jobs/{job}/{shot}', ANCHOR_BOTH, None, '/jobs/a/b\n'),
+    ('/jobs/{job}/{shot}', ANCHOR_BOTH, None, '/jobs/a/b\n\n'),
+    ('/jobs/{job}/{shot}', ANCHOR_BOTH, None, '/job/a/b'),
+    ('/jobs/{job}/{shot}', ANCHOR_BOTH, None, '/jobs/a b/c'),
+    ('/jobs/{job}/{shot}', ANCHOR_BOTH, None, u'/jobs/a/b'),
+    ('/jobs/{job}/{shot}', ANCHOR_BOTH, None, u'/jobs/\xe9/b'),
+    ('/jobs/{job}/{shot}', ANCHOR_START, None, '/jobs/a/b/c'),
+    ('/jobs/{job}/{shot}', ANCHOR_START, None, '/jobs/a/b c'),
+    ('/jobs/{job}/{shot}', ANCHOR_START, None, '/jobs/a/ b'),
+    ('/jobs/{job}/v{version}', ANCHOR_START, None, '/jobs/a/v001.ma'),
+    ('/jobs/{job}/v{version}', ANCHOR_START, None, '/jobs/a/x001'),
+    ('/{job}/{name}.{ext}', ANCHOR_BOTH, None, '/a/b.c.d'),
+    ('/{job}/{name}.{ext}', ANCHOR_BOTH, None, '/a/b.'),
+    ('/{job}/{name}.{ext}', ANCHOR_BOTH, None, '/a/.c'),
+    ('/{job}/{name}.{ext}', ANCHOR_BOTH, None, '/a/..'),
+    ('/{job}/{name}-v{ext}', ANCHOR_BOTH, None, '/a/b-v-v1'),
+    ('/{job}/show_{name}.{ext}_x', ANCHOR_BOTH, None, '/a/show_b.c_x'),
+    ('/{job}/show_{name}.{ext}_x', ANCHOR_BOTH, None, '/a/show__x'),
+    ('/{job.code}/{job.name}/{asset}', ANCHOR_BOTH, None, '/a/b/c'),
+    ('/{job}/{job}', ANCHOR_BOTH, lucidity.Template.RELAXED, '/a/b'),
+    ('/{job}/{job}', ANCHOR_BOTH, lucidity.Template.STRICT, '/a/b'),
+    ('/{job}/{job}', ANCHOR_BOTH, lucidity.Template.STRICT, '/a/a'),
+    ('/jobs/fixed', ANCHOR_BOTH, None, '/jobs/fixed'),
+    ('/jobs/fixed', ANCHOR_BOTH, None, '/jobs/fixe'),
+    ('{job}', ANCHOR_BOTH, None, '')
+], ids=[
+    'match',
+    'extra segment',
+    'empty value',
+    'trailing newline',
+    'two trailing newlines',
+    'literal mismatch',
+    'invalid character',
+    'unicode path',
+    'unicode character',
+    'start extra segment',
+    'start stops at invalid character',
+    'start empty value',
+    'start prefix',
+    'start prefix mismatch',
+    'greedy separator',
+    'separator without second value',
+    'separator without first value',
+    'separator only',
+    'multiple character separator',
+    'prefix and suffix around separator',
+    'prefix and suffix without values',
+    'nested keys',
+    'relaxed duplicates',
+    'strict duplicates differ',
+    'strict duplicates same',
+    'fixed',
+    'fixed mismatch',
+    'empty path'
+])
+def test_parse_matches_regular_expression(pattern, anchor, mode, path):
+    '''Parse identically to regular expression.'''
+    kwargs = {'anchor': anchor}
+    if mode is not None:
+        kwargs['duplicate_placeholder_mode'] = mode
+
+    template = lucidity.Template('test', pattern, **kwargs)
+    assert template._parser()[2] is not None
+    assert segment_parse(template, path) == regex_parse(template, path)
+
+
+@pytest.mark.parametrize('anchor', [ANCHOR_START, ANCHOR_BOTH], ids=[
+    'start', 'both'
+])
+def test_generated_paths(anchor):
+    '''Parse generated paths identically to regular expression.'''
+    templates = [
+        lucidity.Template(
+            'shot', '/jobs/{job.code}/shots/{shot}/v{version}', anchor=anchor
+        ),
+        lucidity.Template('file', '/files/{job}/{name}.{ext}', anchor=anchor),
+        lucidity.Template(
+            'asset', '/assets/{name}/{name}', anchor=anchor,
+            duplicate_placeholder_mode=lucidity.Template.STRICT
+        )
+    ]
+
+    generator = Generator(templates, seed=0, near_miss=0.5)
+    for _, _, path, _ in generator.samples(500):
+        for template in templates:
+            assert segment_parse(template, path) == regex_parse(template, path)
+
+
+def test_non_string_path():
+    '''Fall back to regular expression for paths that are not strings.'''
+    template = lucidity.Template('test', '/jobs/{job}')
+    assert template.parse(bytearray('/jobs/a')) == {'job': bytearray('a')}
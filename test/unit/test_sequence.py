@@ -0,0 +1,176 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import pytest
+
+import lucidity
+from lucidity.sequence import Sequence, collapse, _Group
+
+
+@pytest.fixture
+def template():
+    '''Return frame template.'''
+    return lucidity.Template(
+        'render', '/render/{shot}/{shot}.{frame}.{extension}',
+        anchor=lucidity.Template.ANCHOR_BOTH
+    )
+
+
+def parse(template, paths):
+    '''Return parse results for *paths* using *template*.'''
+    return [(template.parse(path), template) for path in paths]
+
+
+def test_collapse(template):
+    '''Collapse contiguous frames into a single sequence.'''
+    results = parse(template, [
+        '/render/sh010/sh010.{0:04d}.exr'.format(frame)
+        for frame in range(1, 11)
+    ])
+    sequences = list(collapse(results))
+
+    assert len(sequences) == 1
+    sequence = sequences[0]
+    assert sequence.template is template
+    assert sequence.data == {'shot': 'sh010', 'extension': 'exr'}
+    assert (sequence.start, sequence.end, sequence.step) == (1, 10, 1)
+    assert sequence.padding == 4
+    assert sequence.holes == []
+    assert len(sequence) == 10
+
+
+def test_collapse_holes_and_step(template):
+    '''Record step and missing frames.'''
+    results = parse(template, [
+        '/render/sh010/sh010.{0:04d}.exr'.format(frame)
+        for frame in (1, 3, 5, 9)
+    ])
+    sequence, = collapse(results)
+
+    assert (sequence.start, sequence.end, sequence.step) == (1, 9, 2)
+    assert sequence.holes == [7]
+    assert list(sequence) == [1, 3, 5, 9]
+    assert 7 not in sequence
+    assert 5 in sequence
+
+
+def test_collapse_separate_data(template):
+    '''Keep paths with different data in separate sequences.'''
+    results = parse(template, [
+        '/render/sh010/sh010.0001.exr',
+        '/render/sh010/sh010.0002.exr',
+        '/render/sh020/sh020.0001.exr',
+        '/render/sh010/sh010.0001.jpg'
+    ])
+    sequences = list(collapse(results))
+
+    assert [
+        (sequence.data['shot'], sequence.data['extension'], len(sequence))
+        for sequence in sequences
+    ] == [('sh010', 'exr', 2), ('sh020', 'exr', 1), ('sh010', 'jpg', 1)]
+
+
+@pytest.mark.parametrize(('frames', 'expected'), [
+    (['0999', '1000', '1001'], [(999, 1001, 4)]),
+    (['1', '2', '10'], [(1, 10, 0)]),
+    (['001', '0001'], [(1, 1, 3), (1, 1, 4)]),
+    (['5', '0007'], [(5, 5, 0), (7, 7, 4)])
+], ids=[
+    'unpadded values beyond padding',
+    'unpadded',
+    'conflicting padding',
+    'unpadded value shorter than padding'
+])
+def test_collapse_padding(frames, expected, template):
+    '''Group frames by compatible padding.'''
+    results = parse(template, [
+        '/render/sh010/sh010.{0}.exr'.format(frame) for frame in frames
+    ])
+    assert [
+        (sequence.start, sequence.end, sequence.padding)
+        for sequence in collapse(results)
+    ] == expected
+
+
+def test_collapse_pass_through(template):
+    '''Yield results that cannot form a sequence unchanged.'''
+    other = lucidity.Template('other', '/other/{name}')
+    results = parse(template, ['/render/sh010/sh010.final.exr'])
+    results.extend(parse(other, ['/other/value']))
+
+    assert list(collapse(results)) == results
+
+
+def test_collapse_limit(template):
+    '''Yield oldest pending sequence when limit exceeded.'''
+    results = parse(template, [
+        '/render/sh010/sh010.0001.exr',
+        '/render/sh020/sh020.0001.exr',
+        '/render/sh010/sh010.0002.exr'
+    ])
+    sequences = list(collapse(results, limit=1))
+    assert [
+        (sequence.data['shot'], list(sequence)) for sequence in sequences
+    ] == [('sh010', [1]), ('sh020', [1]), ('sh010', [2])]
+
+
+@pytest.mark.parametrize(('frames', 'step', 'holes'), [
+    ([5, 1, 3, 9, 3, 7], 2, []),
+    ([10, 4, 1, 7, 2], 1, [3, 5, 6, 8, 9]),
+    ([20, 10, 0, 30, 50], 10, [40])
+], ids=[
+    'duplicates',
+    'holes',
+    'step'
+])
+def test_collapse_unsorted(template, frames, step, holes):
+    '''Collapse frames arriving out of order.'''
+    results = parse(template, [
+        '/render/sh010/sh010.{0:04d}.exr'.format(frame) for frame in frames
+    ])
+    sequence, = collapse(results)
+
+    assert sequence.step == step
+    assert sequence.holes == holes
+    assert list(sequence) == sorted(set(frames))
+
+
+def test_sorted_frames_held_as_runs():
+    '''Hold sorted frames in bounded memory.'''
+    group = _Group(None, {})
+    for frame in range(0, 100000, 2):
+        group.add(str(frame))
+    group.add('100001')
+
+    assert group.runs == [[0, 99998, 2], [100001, 100001, 0]]
+    assert group.extra == []
+
+    sequence = group.sequence('frame')
+    assert (sequence.start, sequence.end, sequence.step) == (0, 100001, 1)
+    assert len(sequence) == 50001
+    assert 99999 not in sequence
+    assert 100001 in sequence
+
+
+def test_collapse_nested_key():
+    '''Collapse on a nested placeholder.'''
+    template = lucidity.Template('render', '/{shot.name}.{shot.frame}.exr')
+    results = parse(template, ['/a.1.exr', '/a.2.exr'])
+    sequence, = collapse(results, key='shot.frame')
+
+    assert sequence.data == {'shot': {'name': 'a'}}
+    assert list(sequence.items()) == results
+
+
+def test_sequence_paths(template):
+    '''Format paths for frames in sequence.'''
+    sequence = Sequence(
+        template, {'shot': 'sh010', 'extension': 'exr'}, 'frame', 8, 11,
+        padding=4, holes=[10]
+    )
+    assert list(sequence.paths()) == [
+        '/render/sh010/sh010.0008.exr',
+        '/render/sh010/sh010.0009.exr',
+        '/render/sh010/sh010.0011.exr'
+    ]
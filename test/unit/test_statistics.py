@@ -0,0 +1,122 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import pytest
+
+import lucidity
+from lucidity import analysis
+from lucidity.statistics import Statistics, AdaptiveOrder
+
+
+@pytest.fixture
+def templates():
+    '''Return candidate templates.'''
+    return [
+        lucidity.Template('model', '/jobs/{job}/assets/model/{lod}'),
+        lucidity.Template('any', '/jobs/{job}/assets/{kind}/{lod}'),
+        lucidity.Template('rig', '/jobs/{job}/assets/rig/{rig_type}'),
+        lucidity.Template('shot', '/shots/{shot}')
+    ]
+
+
+def test_record():
+    '''Record attempts, hits and time.'''
+    template = lucidity.Template('test', '/{variable}')
+    statistics = Statistics()
+    statistics.record(template, True, 0.5)
+    statistics.record(template, False, 0.25)
+
+    assert statistics.attempts(template) == 2
+    assert statistics.hits(template) == 1
+    assert statistics.time(template) == 0.75
+    assert statistics.hit_rate(template) == 0.5
+    assert statistics.summary() == [{
+        'name': 'test', 'attempts': 2, 'hits': 1, 'time': 0.75,
+        'hit_rate': 0.5
+    }]
+
+    statistics.reset()
+    assert statistics.attempts(template) == 0
+    assert statistics.hit_rate(template) == 0.0
+
+
+def test_adaptive_order(templates):
+    '''Reorder only mutually exclusive templates by hits.'''
+    statistics = Statistics()
+    for _ in range(3):
+        statistics.record(templates[3], True, 0.0)
+    for _ in range(2):
+        statistics.record(templates[2], True, 0.0)
+
+    order = AdaptiveOrder(templates, statistics, interval=2)
+    assert order.templates() == templates
+
+    # Second call triggers update. The rig template may overlap the generic
+    # template so must stay after it.
+    assert [template.name for template in order.templates()] == [
+        'shot', 'model', 'any', 'rig'
+    ]
+
+
+def test_adaptive_order_preserves_result(templates):
+    '''Return same first match as original order.'''
+    statistics = Statistics()
+    order = AdaptiveOrder(templates, statistics, interval=1)
+    paths = ['/jobs/a/assets/rig/anim'] * 5 + ['/jobs/a/assets/model/high']
+
+    for path in paths:
+        expected = lucidity.parse(path, templates)
+        assert lucidity.parse(
+            path, order.templates(), statistics=statistics
+        ) == expected
+
+
+def test_adaptive_order_by_hit_rate(templates):
+    '''Prefer higher hit rate over more hits.'''
+    statistics = Statistics()
+    for hit in [True, False, False, False]:
+        statistics.record(templates[0], hit, 0.0)
+    statistics.record(templates[3], True, 0.0)
+
+    order = AdaptiveOrder(templates, statistics, interval=1)
+    assert [template.name for template in order.templates()] == [
+        'shot', 'model', 'any', 'rig'
+    ]
+
+
+def test_adaptive_order_is_lazy(templates, monkeypatch):
+    '''Analyse pairs only on first recalculation with recorded hits.'''
+    calls = []
+    original = analysis.mutually_exclusive
+
+    def mutually_exclusive(template_a, template_b):
+        calls.append((template_a, template_b))
+        return original(template_a, template_b)
+
+    monkeypatch.setattr(analysis, 'mutually_exclusive', mutually_exclusive)
+
+    statistics = Statistics()
+    order = AdaptiveOrder(templates, statistics, interval=1)
+    assert order.templates() == templates
+    assert calls == []
+
+    statistics.record(templates[3], True, 0.0)
+    order.templates()
+    assert len(calls) == 6
+
+
+def test_adaptive_order_reuses_exclusion_rows(templates, monkeypatch):
+    '''Reuse rows already computed by exclusion graph.'''
+    graph = analysis.ExclusionGraph(templates)
+    for template in templates:
+        graph.exclusive(template)
+
+    monkeypatch.setattr(
+        analysis, 'mutually_exclusive', lambda *args: pytest.fail()
+    )
+
+    statistics = Statistics()
+    statistics.record(templates[3], True, 0.0)
+    order = AdaptiveOrder(templates, statistics, interval=1, exclusions=graph)
+    assert order.templates()[0] is templates[3]
@@ -0,0 +1,83 @@
+# :coding: utf-8
+# :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
+# :license: See LICENSE.txt.
+
+import pytest
+
+import lucidity
+from lucidity import syntax
+from lucidity.syntax import Placeholder
+
+
+@pytest.mark.parametrize(('pattern', 'expected'), [
+    ('/static/string', (('/static/string', None),)),
+    ('/{variable}', (('/', Placeholder('variable', None, '{variable}')),)),
+    ('{a}{b}/end', (
+        ('', Placeholder('a', None, '{a}')),
+        ('', Placeholder('b', None, '{b}')),
+        ('/end', None)
+    )),
+    ('/{a:\d+}/{b:\w\{3\}}', (
+        ('/', Placeholder('a', '\d+', '{a:\d+}')),
+        ('/', Placeholder('b', '\w\{3\}', '{b:\w\{3\}}'))
+    )),
+    ('{@root}/{job.code}', (
+        ('', Placeholder('@root', None, '{@root}')),
+        ('/', Placeholder('job.code', None, '{job.code}'))
+    ))
+], ids=[
+    'literal only',
+    'single placeholder',
+    'adjacent placeholders',
+    'custom expressions',
+    'reference and nested placeholder'
+])
+def test_components(pattern, expected):
+    '''Tokenise pattern into components.'''
+    assert syntax.parse(pattern).components == expected
+
+
+def test_keys_and_references():
+    '''Collect placeholder names and references.'''
+    structure = syntax.parse('{@root}/{job}/{job}/{asset:\w+}/{@version}')
+    assert structure.keys == frozenset(
+        ['@root', 'job', 'asset', '@version']
+    )
+    assert structure.references == frozenset(['root', 'version'])
+
+
+def test_tokens():
+    '''Return tokens with default and unescaped expressions.'''
+    structure = syntax.parse('/{a}/{b:\d\{2\}}')
+    assert structure.tokens('[\w]+') == [
+        ('/', None, None),
+        (None, 'a', '[\w]+'),
+        ('/', None, None),
+        (None, 'b', '\d{2}')
+    ]
+
+
+def test_shared_structure():
+    '''Share structure between equal patterns while in use.'''
+    structure = syntax.parse('/{job}/{asset}')
+    assert syntax.parse('/{job}/{asset}') is structure
+    assert syntax.parse(u'/{job}/{asset}') is not structure
+
+
+def test_template_introspection():
+    '''Derive template keys and references from structure.'''
+    schema = lucidity.Schema([
+        lucidity.Template('job', '/jobs/{job.code}'),
+        lucidity.Template('asset', '{@job}/{asset:\w+}')
+    ])
+    template = schema['asset']
+
+    assert template.references() == set(['job'])
+    assert template.keys() == set(['job.code', 'asset'])
+
+    # Returned sets are independent of the cached structure.
+    template.keys().add('other')
+    assert template.keys() == set(['job.code', 'asset'])
+
+    schema.add_template(lucidity.Template('job', '/{job.code}/{year}'))
+    assert template.keys() == set(['job.code', 'year', 'asset'])
@@ -2,6 +2,9 @@
 # :copyright: Copyright (c) 2013 Martin Pengelly-Phillips
 # :license: See LICENSE.txt.
 
+import time
+from StringIO import StringIO
+
 import pytest
 
 from lucidity import Template, Resolver
@@ -172,6 +175,56 @@ def test_invalid_parse_in_strict_mode(pattern, path, template_resolver):
     assert 'Different extracted values' in str(exception.value)
 
 
+def test_change_duplicate_placeholder_mode():
+    '''Respect duplicate placeholder mode changed after first parse.'''
+    template = Template('test', '/{a}/{a}')
+    assert template.parse('/x/y') == {'a': 'y'}
+
+    template.duplicate_placeholder_mode = Template.STRICT
+    with pytest.raises(ParseError):
+        template.parse('/x/y')
+
+    template.duplicate_placeholder_mode = Template.RELAXED
+    assert template.parse('/x/y') == {'a': 'y'}
+
+
+@pytest.mark.parametrize(('pattern', 'path', 'expected'), [
+    ('/static/string', '/static/string', {}),
+    ('/{variable}/{variable}', '/first/second', {'variable': 'second'}),
+    ('/{a.b.c}/static/{a.b.d}', '/first/static/second',
+     {'a': {'b': {'c': 'first', 'd': 'second'}}}),
+    ('{@nested}/reference', '/root/value/reference', {'variable': 'value'})
+], ids=[
+    'static string',
+    'duplicate variable',
+    'structured placeholders',
+    'nested reference'
+])
+def test_parse_record(pattern, path, expected, template_resolver):
+    '''Extract compact record from matching path.'''
+    template = Template('test', pattern, template_resolver=template_resolver)
+    record = template.parse_record(path)
+    assert record == expected
+    assert record.to_dict() == template.parse(path)
+
+
+def test_parse_record_interning():
+    '''Intern extracted values in supplied pool.'''
+    template = Template('test', '/{project}/{shot}')
+    pool = {}
+    first = template.parse_record(''.join(['/', 'project', '/a']), pool=pool)
+    second = template.parse_record(''.join(['/', 'project', '/b']), pool=pool)
+    assert first.project is second.project
+    assert type(first) is type(second)
+
+
+def test_non_matching_parse_record():
+    '''Fail to extract record from non-matching path.'''
+    template = Template('test', '/static/{variable}')
+    with pytest.raises(ParseError):
+        template.parse_record('/other/value')
+
+
 @pytest.mark.parametrize(('path', 'anchor', 'expected'), [
     ('/static/value/extra', Template.ANCHOR_START, True),
     ('/static/', Template.ANCHOR_START, False),
@@ -206,6 +259,151 @@ def test_anchor(path, anchor, expected):
         assert data == {'variable': 'value'}
 
 
+@pytest.mark.parametrize(('pattern', 'path', 'expected'), [
+    ('/static/string', '', {}),
+    ('/static/string', '/sta', {}),
+    ('/static/string', '/static/string', {}),
+    ('/static/string', '/static/string/extra', {}),
+    ('/single/{variable}', '/single/', {}),
+    ('/single/{variable}', '/single/val', {'variable': 'val'}),
+    ('/{a}/static/{b}', '/first/st', {'a': 'first'}),
+    ('/{a.b.c}/static/{a.b.d}', '/first/static/', {'a': {'b': {'c': 'first'}}}),
+    ('/static/{variable:\d\{4\}}/other', '/static/12', {}),
+    ('/static/{variable:\d\{4\}}/other', '/static/1234/o',
+     {'variable': '1234'}),
+    ('{@nested}/reference', '/root/value/ref', {'variable': 'value'})
+], ids=[
+    'empty path',
+    'partial literal',
+    'complete literal',
+    'beyond pattern',
+    'before placeholder',
+    'partial placeholder',
+    'partial literal after placeholder',
+    'structured placeholders',
+    'partial custom expression',
+    'complete custom expression',
+    'nested reference'
+])
+def test_matching_prefix(pattern, path, expected, template_resolver):
+    '''Match viable path prefix.'''
+    template = Template('test', pattern, template_resolver=template_resolver)
+    assert template.match_prefix(path) == expected
+
+
+@pytest.mark.parametrize(('pattern', 'path', 'anchor'), [
+    ('/static/string', '/stat/', Template.ANCHOR_START),
+    ('/static/string', '/static/string/extra', Template.ANCHOR_BOTH),
+    ('/single/{variable}/static', '/single/value/other', Template.ANCHOR_START)
+], ids=[
+    'mismatched literal',
+    'beyond pattern when anchored at both ends',
+    'mismatched literal after placeholder'
+])
+def test_non_matching_prefix(pattern, path, anchor):
+    '''Fail to match path that could not begin a match.'''
+    template = Template('test', pattern, anchor=anchor)
+    with pytest.raises(ParseError):
+        template.match_prefix(path)
+
+
+def test_prefix_in_strict_mode():
+    '''Fail to match prefix with invalid duplicates in strict mode.'''
+    template = Template(
+        'test', '/{variable}/{variable}/static',
+        duplicate_placeholder_mode=Template.STRICT
+    )
+    assert template.match_prefix('/a/a/st') == {'variable': 'a'}
+
+    with pytest.raises(ParseError):
+        template.match_prefix('/a/b/st')
+
+
+@pytest.mark.parametrize('anchor', [
+    Template.ANCHOR_END,
+    None
+], ids=[
+    'anchor_end',
+    'anchor_none'
+])
+def test_prefix_without_start_anchor(anchor):
+    '''Match any prefix when template not anchored at start.'''
+    template = Template('test', '/static/{variable}', anchor=anchor)
+    assert template.match_prefix('/other') == {}
+
+
+@pytest.fixture()
+def directory(tmpdir):
+    '''Return temporary directory populated with versioned files.'''
+    for path in [
+        'alpha/model/alpha_v001.ma',
+        'alpha/model/alpha_v002.ma',
+        'alpha/rig/alpha_v001.ma',
+        'beta/model/beta_v001.ma',
+        'beta/model/notes.txt',
+        'beta/model/beta_v001.ma.bak/readme'
+    ]:
+        tmpdir.join(path).ensure()
+
+    return str(tmpdir)
+
+
+@pytest.mark.parametrize(('pattern', 'data', 'expected'), [
+    ('{asset}/{task}/{asset}_v{version}.ma', {}, [
+        'alpha/model/alpha_v001.ma',
+        'alpha/model/alpha_v002.ma',
+        'alpha/rig/alpha_v001.ma',
+        'beta/model/beta_v001.ma'
+    ]),
+    ('{asset}/{task}/{asset}_v{version}.ma', {'asset': 'alpha'}, [
+        'alpha/model/alpha_v001.ma',
+        'alpha/model/alpha_v002.ma',
+        'alpha/rig/alpha_v001.ma'
+    ]),
+    ('{asset}/{task}/{asset}_v{version}.ma',
+     {'asset': 'alpha', 'task': 'model', 'version': '002'},
+     ['alpha/model/alpha_v002.ma']),
+    ('{asset}/{task}/{asset}_v{version}.ma', {'asset': 'gamma'}, []),
+    ('{asset}/model/{filename:.+}', {'asset': 'beta'}, [
+        'beta/model/beta_v001.ma',
+        'beta/model/notes.txt',
+        'beta/model/beta_v001.ma.bak',
+        'beta/model/beta_v001.ma.bak/readme'
+    ]),
+    ('{asset}/{task}/', {'task': 'rig'}, ['alpha/rig/'])
+], ids=[
+    'no data',
+    'partial data',
+    'complete data',
+    'missing directory',
+    'expression matching separator',
+    'trailing separator'
+])
+def test_glob(pattern, data, expected, directory):
+    '''Find existing paths matching template.'''
+    template = Template('test', pattern, anchor=Template.ANCHOR_BOTH)
+    result = list(template.glob(data, root=directory))
+
+    for path, parsed in result:
+        assert parsed == template.parse(path[len(directory) + 1:])
+
+    assert sorted(path for path, _ in result) == sorted(
+        directory + '/' + path for path in expected
+    )
+
+
+def test_glob_absolute(directory):
+    '''Find existing paths matching absolute template.'''
+    template = Template(
+        'test', directory + '/{asset}/rig/{filename}',
+        anchor=Template.ANCHOR_BOTH
+    )
+    assert list(template.glob()) == [
+        (directory + '/alpha/rig/alpha_v001.ma', {'filename': 'alpha_v001.ma',
+                                                  'asset': 'alpha'})
+    ]
+
+
 @pytest.mark.parametrize(('pattern', 'data', 'expected'), [
     ('/static/string', {}, '/static/string'),
     ('/single/{variable}', {'variable': 'value'}, '/single/value'),
@@ -256,6 +454,96 @@ def test_format_failure(pattern, data, template_resolver):
         template.format(data)
 
 
+@pytest.mark.parametrize(('pattern', 'path', 'expected'), [
+    (u'/jobs/{job}/{shot}', '/jobs/a/b', {'job': 'a', 'shot': 'b'}),
+    (u'/jobs/{job:[^/]+}/{shot}', '/jobs/\xff\xfe/b',
+     {'job': '\xff\xfe', 'shot': 'b'}),
+    (u'/j\xf6bs/{job}', '/j\xc3\xb6bs/a', {'job': 'a'}),
+    (u'/j\xf6bs/{job}', u'/j\xf6bs/a', {'job': u'a'}),
+    ('/jobs/{job:[^/]+}', '/jobs/\xff', {'job': '\xff'})
+], ids=[
+    'unicode pattern',
+    'invalid utf-8 value',
+    'non ascii literal',
+    'unicode path',
+    'byte string pattern'
+])
+def test_parse_byte_string_path(pattern, path, expected):
+    '''Parse byte string paths without decoding them.'''
+    template = Template('test', pattern, anchor=Template.ANCHOR_BOTH)
+    data = template.parse(path)
+    assert data == expected
+    for key, value in data.items():
+        assert type(value) is type(expected[key])
+
+
+def test_parse_byte_string_path_not_matching():
+    '''Fail to parse byte string path with invalid characters.'''
+    template = Template('test', u'/jobs/{job}', anchor=Template.ANCHOR_BOTH)
+    with pytest.raises(ParseError):
+        template.parse('/jobs/\xff')
+
+
+def test_format_byte_string_values():
+    '''Format byte string values parsed from byte string path.'''
+    template = Template('test', u'/jobs/{job:[^/]+}/{shot}')
+    path = '/jobs/\xff\xfe/b'
+    assert template.format(template.parse(path)) == path
+
+
+@pytest.mark.parametrize('data', [
+    [{'a': {'b': 'first'}, 'c': 'x'}, {'c': 'y'}, {'a': {'b': 3}, 'c': 'z'},
+     {'a': {'b': 'second'}, 'c': 'w'}],
+    {'a.b': ['first', None, 3, 'second'], 'c': ['x', 'y', 'z', 'w']}
+], ids=[
+    'records',
+    'columns'
+])
+def test_format_many(data):
+    '''Format many records reporting errors as data.'''
+    template = Template('test', '/{a.b}/{c}')
+    results = list(template.format_many(data))
+
+    assert [path for path, _ in results] == [
+        '/first/x', None, None, '/second/w'
+    ]
+    assert [type(format_error) for _, format_error in results] == [
+        type(None), FormatError, FormatError, type(None)
+    ]
+
+
+def test_format_many_to_stream():
+    '''Format many records writing paths to stream.'''
+    template = Template('test', '/{variable}')
+    stream = StringIO()
+    errors = template.format_many(
+        [{'variable': 'a'}, {}, {'variable': 'b'}], stream=stream
+    )
+
+    assert stream.getvalue() == '/a\n/b\n'
+    assert [index for index, _ in errors] == [1]
+    assert isinstance(errors[0][1], FormatError)
+
+
+def test_format_many_missing_column():
+    '''Report error for every record when column missing.'''
+    template = Template('test', '/{a}/{b}')
+    results = list(template.format_many({'a': ['x', 'y']}))
+    assert [path for path, _ in results] == [None, None]
+
+
+def test_format_many_uneven_columns():
+    '''Report error for each record beyond the shortest column.'''
+    template = Template('test', '/{a}/{b}')
+    results = list(template.format_many(
+        {'a': ['x', 'y', 'z'], 'b': ['1']}
+    ))
+
+    assert [path for path, _ in results] == ['/x/1', None, None]
+    assert isinstance(results[1][1], FormatError)
+    assert "['b']" in str(results[2][1])
+
+
 def test_repr():
     '''Represent template.'''
     assert (repr(Template('test', '/foo/{bar}/{baz:\d+}'))
@@ -367,3 +655,55 @@ def test_resolver_failure(operation, arguments):
     template = Template('test', '{@reference}', template_resolver={})
     with pytest.raises(ResolveError):
         getattr(template, operation)(*arguments)
+
+
+@pytest.mark.parametrize(('pattern', 'path', 'expected'), [
+    ('/jobs/{path:.+}{name}_{shot}/cache', '/jobs/a/b/name_sh010/cache',
+     {'path': 'a/b/nam', 'name': 'e', 'shot': 'sh010'}),
+    ('/jobs/{path:.+}{name}_{shot}/cache', '/jobs/a/b/name_sh010/other',
+     None),
+    ('/jobs/{path:.+}/{version:\d+}/{name}', '/jobs/a/b/001/file',
+     {'path': 'a/b', 'version': '001', 'name': 'file'}),
+    ('/jobs/{path:.+}/{version:\d+}/{name}', '/jobs/a/b/001', None)
+], ids=[
+    'match',
+    'missing literal',
+    'atomic placeholder',
+    'atomic placeholder mismatch'
+])
+def test_parse_with_backtracking_risk(pattern, path, expected):
+    '''Parse with template at risk of excessive backtracking.'''
+    template = Template('test', pattern, anchor=Template.ANCHOR_BOTH)
+    if expected is None:
+        with pytest.raises(ParseError):
+            template.parse(path)
+    else:
+        assert template.parse(path) == expected
+
+
+def test_parse_with_backtracking_risk_is_guarded():
+    '''Reject path missing literal text without matching expression.'''
+    template = Template(
+        'test', '/jobs/{path:.+}{name}_{shot}/cache',
+        anchor=Template.ANCHOR_BOTH
+    )
+    path = '/jobs/' + 'a_' * 2000
+
+    start = time.time()
+    with pytest.raises(ParseError):
+        template.parse(path)
+
+    assert time.time() - start < 0.5
+
+
+@pytest.mark.parametrize(('pattern', 'atomic'), [
+    ('/jobs/{job}/assets/{asset}', False),
+    ('/jobs/{path:.+}/{version:\d+}/{name}', True)
+], ids=[
+    'no risk',
+    'risk'
+])
+def test_atomic_placeholders(pattern, atomic):
+    '''Match placeholders atomically only in templates at risk.'''
+    template = Template('test', pattern)
+    assert ('(?=' in template._regular_expression().pattern) is atomic